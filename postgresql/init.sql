@@ -3,16 +3,68 @@
 CREATE TABLE IF NOT EXISTS crop_jobs (
     id SERIAL PRIMARY KEY,
     job_id VARCHAR(255) UNIQUE NOT NULL,
-    image_base64 TEXT NOT NULL,
+    image_base64 TEXT,
     landmarks_json JSONB NOT NULL,
-    segmentation_map_base64 TEXT NOT NULL,
+    segmentation_map_base64 TEXT,
+    image_sha256 CHAR(64),
+    landmarks_sha256 CHAR(64),
+    segmentation_map_sha256 CHAR(64),
     status VARCHAR(50) NOT NULL DEFAULT 'pending',
     created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW(),
     completed_at TIMESTAMP WITHOUT TIME ZONE,
     svg_base64 TEXT, 
-    mask_contours_json JSONB
+    mask_contours_json JSONB,
+    svg_sha256 CHAR(64),
+    svg_gzip_sha256 CHAR(64),
+    svg_br_sha256 CHAR(64),
+    lease_expires_at TIMESTAMP WITHOUT TIME ZONE,
+    attempts INTEGER NOT NULL DEFAULT 0
 );
 
+-- Content-addressed blobs (images, segmentation maps, SVG results) of BLOB_STORE_BACKEND=database
+CREATE TABLE IF NOT EXISTS crop_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Migration for databases created before the durable job queue
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITHOUT TIME ZONE;
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+
+-- Migration for databases created before content-hash dedup.
+-- Existing rows are backfilled with: python -m drivers.backfill_content_hashes
+-- (duplicate pending/processing jobs are failed so uq_crop_jobs_inflight holds)
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS image_sha256 CHAR(64);
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS landmarks_sha256 CHAR(64);
+
+-- Migration for databases created before the raw SVG result endpoint.
+-- Results completed earlier have no precompressed copies and are served uncompressed.
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS svg_sha256 CHAR(64);
+
+-- Migration for databases created before the blob store: new jobs only reference blobs.
+-- Existing documents are moved with: python -m drivers.migrate_blobs
+ALTER TABLE crop_jobs ALTER COLUMN image_base64 DROP NOT NULL;
+ALTER TABLE crop_jobs ALTER COLUMN segmentation_map_base64 DROP NOT NULL;
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS segmentation_map_sha256 CHAR(64);
+
+-- The compressed SVG copies are blobs too: the columns holding them are dropped,
+-- drivers.migrate_blobs compresses the results again into blobs
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS svg_gzip_sha256 CHAR(64);
+ALTER TABLE crop_jobs ADD COLUMN IF NOT EXISTS svg_br_sha256 CHAR(64);
+ALTER TABLE crop_jobs DROP COLUMN IF EXISTS svg_gzip;
+ALTER TABLE crop_jobs DROP COLUMN IF EXISTS svg_br;
+
 CREATE INDEX IF NOT EXISTS idx_crop_jobs_status ON crop_jobs (status);
 
-CREATE INDEX IF NOT EXISTS idx_crop_jobs_created_at ON crop_jobs (created_at);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_crop_jobs_created_at ON crop_jobs (created_at);
+
+-- Claiming index for the durable job queue (SELECT ... FOR UPDATE SKIP LOCKED)
+CREATE INDEX IF NOT EXISTS idx_crop_jobs_claimable ON crop_jobs (created_at, id) WHERE status IN ('pending', 'processing');
+
+-- Dedup index: submit looks up (image hash, landmarks hash, status) instead of comparing image_base64
+CREATE INDEX IF NOT EXISTS idx_crop_jobs_dedup ON crop_jobs (image_sha256, landmarks_sha256, status);
+
+-- At most one pending/processing job per (image hash, landmarks hash): duplicate submissions are coalesced
+CREATE UNIQUE INDEX IF NOT EXISTS uq_crop_jobs_inflight ON crop_jobs (image_sha256, landmarks_sha256) WHERE status IN ('pending', 'processing');
\ No newline at end of file
@@ -0,0 +1,97 @@
+import os
+from datetime import datetime
+from services.logger import console
+from models.crop_model import DBCropJob, IN_FLIGHT_JOB_STATUSES
+from drivers.database import SessionLocal
+from services.content_hash import hash_image_base64, hash_landmarks
+
+# Number of rows hashed and committed per batch
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+
+
+# Check whether another in-flight job already holds the given content hashes
+def _in_flight_duplicate_exists(db, db_crop_job_model, row_id: int, hashes: dict) -> bool:
+    return (
+        db.query(db_crop_job_model.id)
+        .filter(
+            db_crop_job_model.id != row_id,
+            db_crop_job_model.status.in_(IN_FLIGHT_JOB_STATUSES),
+            *(column == value for column, value in hashes.items()),
+        )
+        .first()
+        is not None
+    )
+
+
+# Fill image_sha256/landmarks_sha256 for rows created before the columns existed
+def backfill_content_hashes(
+    db_session_factory=SessionLocal,
+    db_crop_job_model=DBCropJob,
+    batch_size: int = BACKFILL_BATCH_SIZE,
+) -> int:
+
+    updated_count = 0
+    failed_count = 0
+    last_id = 0
+    while True:
+        db = db_session_factory()
+        try:
+            # Only load the columns needed to compute the hashes, in id order
+            rows = (
+                db.query(
+                    db_crop_job_model.id,
+                    db_crop_job_model.image_base64,
+                    db_crop_job_model.landmarks_json,
+                    db_crop_job_model.status,
+                )
+                .filter(
+                    db_crop_job_model.id > last_id,
+                    db_crop_job_model.image_sha256.is_(None),
+                )
+                .order_by(db_crop_job_model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            for row in rows:
+                values = {
+                    db_crop_job_model.image_sha256: hash_image_base64(row.image_base64),
+                    db_crop_job_model.landmarks_sha256: hash_landmarks(
+                        row.landmarks_json
+                    ),
+                }
+                # Jobs queued before dedup may repeat an in-flight job: the unique
+                # in-flight index only allows one of them, the others are failed
+                if row.status in IN_FLIGHT_JOB_STATUSES and _in_flight_duplicate_exists(
+                    db, db_crop_job_model, row.id, values
+                ):
+                    values[db_crop_job_model.status] = "failed"
+                    values[db_crop_job_model.completed_at] = datetime.utcnow()
+                    values[db_crop_job_model.lease_expires_at] = None
+                    failed_count += 1
+                db.query(db_crop_job_model).filter(
+                    db_crop_job_model.id == row.id
+                ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        updated_count += len(rows)
+        last_id = rows[-1].id
+        console.log(f"[info]Backfilled content hashes for {updated_count} job(s).[/info]")
+
+    if failed_count:
+        console.log(
+            f"[warning]Failed {failed_count} duplicate in-flight job(s) during the backfill.[/warning]"
+        )
+    console.log(
+        f"[success]Content hash backfill complete: {updated_count} job(s) updated.[/success]"
+    )
+    return updated_count
+
+
+# Run after applying the ALTER TABLE statements in postgresql/init.sql
+if __name__ == "__main__":
+    backfill_content_hashes()
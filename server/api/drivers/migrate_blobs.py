@@ -0,0 +1,125 @@
+import os
+import base64
+import binascii
+from sqlalchemy import and_, or_
+from services.logger import console
+from drivers.database import SessionLocal
+from models.crop_model import DBCropJob, DBBlob
+from services.content_hash import decode_base64_content
+from services.blob_store import create_blob_store, blob_key
+from services.svg_result import compress_svg_result, svg_result_blobs
+
+# Number of rows moved and committed per batch
+MIGRATE_BLOBS_BATCH_SIZE = int(os.getenv("MIGRATE_BLOBS_BATCH_SIZE", "100"))
+
+
+# Move the base64 columns of rows created before the blob store into the blob store,
+# and store the compressed copies of SVG results that have none as blobs
+def migrate_blobs(
+    db_session_factory=SessionLocal,
+    db_crop_job_model=DBCropJob,
+    blob_store=None,
+    batch_size: int = MIGRATE_BLOBS_BATCH_SIZE,
+) -> int:
+
+    if blob_store is None:
+        blob_store = create_blob_store(DBBlob)
+
+    migrated_count = 0
+    last_id = 0
+    while True:
+        db = db_session_factory()
+        try:
+            # Rows with any document still stored as base64 text, in id order
+            rows = (
+                db.query(
+                    db_crop_job_model.id,
+                    db_crop_job_model.image_base64,
+                    db_crop_job_model.segmentation_map_base64,
+                    db_crop_job_model.svg_base64,
+                    db_crop_job_model.svg_sha256,
+                    db_crop_job_model.svg_gzip_sha256,
+                )
+                .filter(
+                    db_crop_job_model.id > last_id,
+                    or_(
+                        db_crop_job_model.image_base64.isnot(None),
+                        db_crop_job_model.segmentation_map_base64.isnot(None),
+                        db_crop_job_model.svg_base64.isnot(None),
+                        and_(
+                            db_crop_job_model.svg_sha256.isnot(None),
+                            db_crop_job_model.svg_gzip_sha256.is_(None),
+                        ),
+                    ),
+                )
+                .order_by(db_crop_job_model.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+
+            for row in rows:
+                blobs = {}
+                values = {}
+                if row.image_base64 is not None:
+                    image_bytes = decode_base64_content(row.image_base64)
+                    image_sha256 = blob_key(image_bytes)
+                    blobs[image_sha256] = image_bytes
+                    values[db_crop_job_model.image_sha256] = image_sha256
+                    values[db_crop_job_model.image_base64] = None
+                if row.segmentation_map_base64 is not None:
+                    segmentation_map_bytes = decode_base64_content(
+                        row.segmentation_map_base64
+                    )
+                    segmentation_map_sha256 = blob_key(segmentation_map_bytes)
+                    blobs[segmentation_map_sha256] = segmentation_map_bytes
+                    values[db_crop_job_model.segmentation_map_sha256] = (
+                        segmentation_map_sha256
+                    )
+                    values[db_crop_job_model.segmentation_map_base64] = None
+                # The SVG document and its compressed copies, compressed again when
+                # they were stored in the dropped svg_gzip/svg_br columns
+                compressed_svg = None
+                if row.svg_base64 is not None:
+                    # An SVG that is not valid base64 stays as it is
+                    try:
+                        compressed_svg = compress_svg_result(row.svg_base64)
+                    except (binascii.Error, ValueError):
+                        compressed_svg = None
+                    if compressed_svg is not None:
+                        values[db_crop_job_model.svg_base64] = None
+                elif row.svg_sha256 is not None and row.svg_gzip_sha256 is None:
+                    svg_bytes = blob_store.get(db, row.svg_sha256)
+                    if svg_bytes is not None:
+                        compressed_svg = compress_svg_result(
+                            base64.b64encode(svg_bytes).decode("ascii")
+                        )
+                if compressed_svg is not None:
+                    blobs.update(svg_result_blobs(compressed_svg))
+                    values[db_crop_job_model.svg_sha256] = compressed_svg.sha256
+                    values[db_crop_job_model.svg_gzip_sha256] = compressed_svg.gzip_sha256
+                    values[db_crop_job_model.svg_br_sha256] = compressed_svg.br_sha256
+
+                blob_store.put_many(db, blobs)
+                if values:
+                    db.query(db_crop_job_model).filter(
+                        db_crop_job_model.id == row.id
+                    ).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        migrated_count += len(rows)
+        last_id = rows[-1].id
+        console.log(f"[info]Moved the documents of {migrated_count} job(s) to the blob store.[/info]")
+
+    console.log(
+        f"[success]Blob migration complete: {migrated_count} job(s) migrated.[/success]"
+    )
+    return migrated_count
+
+
+# Run after applying the ALTER TABLE statements in postgresql/init.sql
+if __name__ == "__main__":
+    migrate_blobs()
@@ -0,0 +1,81 @@
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from drivers.database import Base
+from models.crop_model import DBCropJob
+from services.content_hash import hash_image_base64, hash_landmarks
+from server.api.drivers.backfill_content_hashes import backfill_content_hashes
+
+
+def make_session_factory():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def test_backfill_content_hashes() -> None:
+    session_factory = make_session_factory()
+
+    # Rows created before the hash columns existed
+    db = session_factory()
+    for index in range(5):
+        db.add(
+            DBCropJob(
+                job_id=f"job{index}",
+                image_base64=f"image{index}",
+                landmarks_json=[{"x": index, "y": index}],
+                segmentation_map_base64="seg",
+            )
+        )
+    db.commit()
+    db.close()
+
+    assert backfill_content_hashes(session_factory, DBCropJob, batch_size=2) == 5
+    # Already hashed rows are not touched again
+    assert backfill_content_hashes(session_factory, DBCropJob, batch_size=2) == 0
+
+    db = session_factory()
+    job = db.query(DBCropJob).filter(DBCropJob.job_id == "job3").first()
+    assert job.image_sha256 == hash_image_base64("image3")
+    assert job.landmarks_sha256 == hash_landmarks([{"x": 3, "y": 3}])
+    db.close()
+
+
+def test_backfill_fails_duplicate_in_flight_jobs() -> None:
+    session_factory = make_session_factory()
+
+    # Identical jobs queued before dedup existed, plus a completed one
+    db = session_factory()
+    for job_id, status in [
+        ("done", "completed"),
+        ("first", "pending"),
+        ("second", "pending"),
+        ("third", "processing"),
+    ]:
+        db.add(
+            DBCropJob(
+                job_id=job_id,
+                image_base64="image",
+                landmarks_json=[{"x": 1, "y": 1}],
+                segmentation_map_base64="seg",
+                status=status,
+            )
+        )
+    db.commit()
+    db.close()
+
+    # The unique in-flight index does not abort the batch
+    assert backfill_content_hashes(session_factory, DBCropJob, batch_size=10) == 4
+
+    db = session_factory()
+    statuses = {job.job_id: job.status for job in db.query(DBCropJob).all()}
+    assert statuses == {
+        "done": "completed",
+        "first": "pending",
+        "second": "failed",
+        "third": "failed",
+    }
+    assert all(job.image_sha256 == hash_image_base64("image") for job in db.query(DBCropJob))
+    db.close()
@@ -0,0 +1,64 @@
+import gzip
+import base64
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from drivers.database import Base
+from models.crop_model import DBCropJob, DBBlob
+from services.blob_store import DatabaseBlobStore, blob_key
+from server.api.drivers.migrate_blobs import migrate_blobs
+
+
+def test_migrate_blobs() -> None:
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    store = DatabaseBlobStore(DBBlob)
+
+    # Rows created before the blob store, all with the same image
+    db = session_factory()
+    for index in range(3):
+        db.add(
+            DBCropJob(
+                job_id=f"job{index}",
+                image_base64=base64.b64encode(b"image").decode("ascii"),
+                landmarks_json=[{"x": index, "y": index}],
+                segmentation_map_base64=base64.b64encode(b"seg").decode("ascii"),
+                status="completed",
+                svg_base64=base64.b64encode(f"<svg>{index}</svg>".encode()).decode("ascii"),
+            )
+        )
+
+    # A result stored as a blob while its compressed copies were columns
+    store.put(db, b"<svg>blob</svg>")
+    db.add(
+        DBCropJob(
+            job_id="blob-job",
+            landmarks_json=[],
+            status="completed",
+            svg_sha256=blob_key(b"<svg>blob</svg>"),
+        )
+    )
+    db.commit()
+    db.close()
+
+    assert migrate_blobs(session_factory, DBCropJob, store, batch_size=2) == 4
+    # Migrated rows are not touched again
+    assert migrate_blobs(session_factory, DBCropJob, store, batch_size=2) == 0
+
+    db = session_factory()
+    job = db.query(DBCropJob).filter(DBCropJob.job_id == "job2").first()
+    assert job.image_base64 is None and job.svg_base64 is None
+    assert job.image_sha256 == blob_key(b"image")
+    assert store.get(db, job.segmentation_map_sha256) == b"seg"
+    assert store.get(db, job.svg_sha256) == b"<svg>2</svg>"
+    assert gzip.decompress(store.get(db, job.svg_gzip_sha256)) == b"<svg>2</svg>"
+
+    job = db.query(DBCropJob).filter(DBCropJob.job_id == "blob-job").first()
+    assert gzip.decompress(store.get(db, job.svg_gzip_sha256)) == b"<svg>blob</svg>"
+    # One image, one segmentation map and four SVG documents with their copies
+    copies = 2 if job.svg_br_sha256 is None else 3
+    assert db.query(DBBlob).count() == 2 + 4 * copies
+    db.close()
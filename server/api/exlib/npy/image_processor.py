@@ -0,0 +1,301 @@
+import math
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
+from exlib.py.image_processor import (
+    region_names,
+    _dummy_calculation,
+    _round_coordinate,
+    _check_coordinate_precision,
+    _check_image_encoding,
+    _segmentation_mask_contours,
+    _apply_region_exclusions,
+    _build_svg_image_elements,
+    _svg_content_chunks,
+    _encode_svg_base64,
+    _process_image_decoding_and_cropping,
+)
+
+# Helpers every backend module exposes (the backend tests run against each module);
+# this backend does not call them, it re-exports the pure Python ones
+from exlib.py.image_processor import _cropped_img_save, _extract_raw_points
+
+__all__ = [
+    "process_image_data_intensive",
+    "_cropped_img_save",
+    "_extract_raw_points",
+]
+
+# NumPy backend of image_processor.
+# Landmarks are converted once into one contiguous (N, 2) float64 array; bbox, crop
+# offset and simplification are array operations. Path strings and contours are
+# byte-identical to the pure Python version: integer coordinates are tracked in a
+# mask so they are still printed as integers.
+
+
+# Convert the landmark groups into one contiguous coordinate array, done once per job
+def _landmarks_to_arrays(
+    landmarks_list_of_lists: List[List[Dict[str, float]]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    values = []
+    group_lengths = []
+    for contour_group in landmarks_list_of_lists:
+        group_length = 0
+        for point_data in contour_group:
+            if isinstance(point_data, dict) and "x" in point_data and "y" in point_data:
+                values.append((point_data["x"], point_data["y"]))
+                group_length += 1
+        group_lengths.append(group_length)
+
+    # Contiguous (N, 2) coordinates, and which of them were given as integers
+    coordinates = np.array(values, dtype=np.float64).reshape(-1, 2)
+    integer_mask = np.array(
+        [(type(x) is int, type(y) is int) for x, y in values], dtype=bool
+    ).reshape(-1, 2)
+
+    # Start offset of every group in the coordinate array
+    group_bounds = np.zeros(len(group_lengths) + 1, dtype=np.intp)
+    np.cumsum(group_lengths, out=group_bounds[1:])
+    return coordinates, integer_mask, group_bounds
+
+
+# Format coordinates as the pure Python f-strings would (int or float repr)
+def _format_values(
+    values: np.ndarray, integer_mask: np.ndarray, coordinate_precision: int = -1
+) -> List[str]:
+    return [
+        str(int(value))
+        if is_integer
+        else repr(_round_coordinate(value, coordinate_precision))
+        for value, is_integer in zip(values.tolist(), integer_mask.tolist())
+    ]
+
+
+# Restore Python ints for coordinates that were given as integers
+def _to_python_values(
+    values: np.ndarray, integer_mask: np.ndarray, coordinate_precision: int = -1
+) -> List[Any]:
+    return [
+        int(value) if is_integer else _round_coordinate(value, coordinate_precision)
+        for value, is_integer in zip(values.tolist(), integer_mask.tolist())
+    ]
+
+
+# Ramer-Douglas-Peucker keep mask, with the distances of every segment computed at once
+def _simplify_mask(points: np.ndarray, tolerance: float) -> np.ndarray:
+    num_points = len(points)
+    keep = np.zeros(num_points, dtype=bool)
+    keep[0] = keep[num_points - 1] = True
+
+    segments = [(0, num_points - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        ax, ay = points[first].tolist()
+        bx, by = points[last].tolist()
+        dx, dy = bx - ax, by - ay
+        length = math.sqrt(dx * dx + dy * dy)
+
+        # Same operations as the pure Python version, so the same points are kept
+        inner = points[first + 1 : last]
+        if length == 0:
+            delta = inner - (ax, ay)
+            distances = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        else:
+            distances = (
+                np.abs(dx * (ay - inner[:, 1]) - (ax - inner[:, 0]) * dy) / length
+            )
+
+        # argmax returns the first farthest point, as the sequential scan does
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            max_index = first + 1 + farthest
+            keep[max_index] = True
+            segments.append((first, max_index))
+            segments.append((max_index, last))
+    return keep
+
+
+# Build the smooth SVG path of a contour from its coordinate array
+def _points_array_to_smooth_svg_path(
+    points: np.ndarray, integer_mask: np.ndarray, coordinate_precision: int = -1
+) -> str:
+
+    num_points = len(points)
+    if num_points == 0:
+        return ""
+
+    first = _format_values(points[0], integer_mask[0], coordinate_precision)
+    if num_points == 1:
+        return f"M {first[0]} {first[1]} Z"
+    if num_points == 2:
+        second = _format_values(points[1], integer_mask[1], coordinate_precision)
+        return f"M {first[0]} {first[1]} L {second[0]} {second[1]} Z"
+
+    # Midpoint of every point with the next one, the last wraps to the first
+    midpoints = (points + np.roll(points, -1, axis=0)) / 2.0
+    midpoint_values = midpoints.ravel().tolist()
+    if coordinate_precision >= 0:
+        midpoint_values = [
+            round(value, coordinate_precision) for value in midpoint_values
+        ]
+    midpoint_strings = list(map(repr, midpoint_values))
+
+    path_commands = [
+        f"M {first[0]} {first[1]}",
+        f"Q {first[0]} {first[1]}, {midpoint_strings[0]} {midpoint_strings[1]}",
+    ]
+    path_commands.extend(
+        f"T {midpoint_strings[i]} {midpoint_strings[i + 1]}"
+        for i in range(2, 2 * num_points, 2)
+    )
+    path_commands.append("Z")
+    return " ".join(path_commands)
+
+
+# Helper function to convert points to a smooth SVG path
+def _points_to_smooth_svg_path(
+    points_list: List[Dict[str, float]], coordinate_precision: int = -1
+) -> str:
+
+    points, integer_mask, _ = _landmarks_to_arrays([points_list])
+    return _points_array_to_smooth_svg_path(points, integer_mask, coordinate_precision)
+
+
+# Function to process image data and landmarks, performing cropping and SVG generation
+def process_image_data_intensive(
+    loadtest_mode_enabled: bool,
+    landmarks_data: Dict[str, Any],
+    original_image_base64_bytes: bytes,
+    svg_image_embed_mode: str = "defs",
+    jpeg_lossless_transform: bool = False,
+    max_output_dimension: int = 0,
+    image_encoding: Optional[Dict[str, Any]] = None,
+    path_simplify_tolerance: float = 0.0,
+    coordinate_precision: int = -1,
+    segmentation_map_base64_bytes: Optional[bytes] = None,
+    segmentation_labels: Optional[Dict[str, int]] = None,
+    region_exclusions: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    _check_coordinate_precision(coordinate_precision)
+    _check_image_encoding(image_encoding)
+
+    # Calling the dummy calculation to simulate intensive processing
+    if not loadtest_mode_enabled:
+        _dummy_calculation()
+
+    landmarks_list_of_lists = landmarks_data.get("landmarks", [])
+    coordinates, integer_mask, group_bounds = _landmarks_to_arrays(
+        landmarks_list_of_lists
+    )
+
+    # Bounding box of every landmark in one pass
+    if len(coordinates):
+        min_x, min_y = coordinates.min(axis=0).tolist()
+        max_x, max_y = coordinates.max(axis=0).tolist()
+        bounding_box = (min_x, max_x, min_y, max_y)
+    else:
+        bounding_box = (float("inf"), float("-inf"), float("inf"), float("-inf"))
+
+    (
+        rotated_and_cropped_image_base64_str,
+        image_width,
+        image_height,
+        crop_offset_x,
+        crop_offset_y,
+        downscale_factor,
+        source_width,
+        source_height,
+    ) = _process_image_decoding_and_cropping(
+        original_image_base64_bytes,
+        landmarks_data,
+        bounding_box,
+        jpeg_lossless_transform=jpeg_lossless_transform,
+        max_output_dimension=max_output_dimension,
+        image_encoding=image_encoding,
+    )
+
+    # Adjust every landmark for cropping at once (integer offsets keep integers)
+    coordinates = coordinates - np.array(
+        (crop_offset_x, crop_offset_y), dtype=np.float64
+    )
+
+    # Downscaled output: power-of-two division is exact, the results are floats
+    if downscale_factor > 1:
+        coordinates /= downscale_factor
+        integer_mask = np.zeros_like(integer_mask)
+
+    generated_mask_contours_list = []
+
+    for i in range(len(landmarks_list_of_lists)):
+        start, end = group_bounds[i], group_bounds[i + 1]
+
+        # Skip empty contour groups
+        if start == end:
+            continue
+
+        region_name = region_names.get(i, f"region_{i+1}")
+        points = coordinates[start:end]
+        points_integer_mask = integer_mask[start:end]
+
+        # Drop the points within the simplification tolerance of the outline
+        if path_simplify_tolerance > 0 and end - start > 2:
+            keep = _simplify_mask(points, path_simplify_tolerance)
+            points = points[keep]
+            points_integer_mask = points_integer_mask[keep]
+
+        path_d_string = _points_array_to_smooth_svg_path(
+            points, points_integer_mask, coordinate_precision
+        )
+
+        # Raw points as [x, y] pairs, with the original int/float types
+        point_values = _to_python_values(
+            points.ravel(), points_integer_mask.ravel(), coordinate_precision
+        )
+        generated_mask_contours_list.append(
+            {
+                "name": region_name,
+                "path_d": path_d_string,
+                "points": [
+                    point_values[j : j + 2] for j in range(0, len(point_values), 2)
+                ],
+            }
+        )
+
+    # Regions traced from the segmentation map, after the landmark regions
+    generated_mask_contours_list.extend(
+        _segmentation_mask_contours(
+            segmentation_map_base64_bytes,
+            segmentation_labels,
+            (source_width, source_height),
+            (crop_offset_x, crop_offset_y),
+            downscale_factor,
+            (image_width, image_height),
+            path_simplify_tolerance,
+            coordinate_precision,
+            _points_to_smooth_svg_path,
+        )
+    )
+
+    # Cut the excluded regions out of the clip paths (e.g. the nose out of the cheek)
+    _apply_region_exclusions(
+        generated_mask_contours_list, region_exclusions, coordinate_precision
+    )
+    region_paths = [
+        (mask_contour["name"], mask_contour["path_d"])
+        for mask_contour in generated_mask_contours_list
+    ]
+
+    clip_path_defs, image_clips = _build_svg_image_elements(
+        image_width,
+        image_height,
+        rotated_and_cropped_image_base64_str,
+        region_paths,
+        svg_image_embed_mode,
+    )
+    # Stream the SVG into base64, the document itself is never assembled
+    generated_svg_base64 = _encode_svg_base64(
+        _svg_content_chunks(image_width, image_height, clip_path_defs, image_clips)
+    )
+    return generated_svg_base64, generated_mask_contours_list
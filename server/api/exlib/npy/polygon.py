@@ -0,0 +1,371 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+# Polygon difference shared by every image processor backend.
+# Both outlines are cut where they cross or touch; the pieces of the subject outline
+# outside the excluded polygon are kept, the pieces of the excluded outline inside the
+# subject are kept reversed, and the kept pieces are linked back into rings. Crossings
+# and inside tests are array operations over the edge pairs found by a sort and sweep
+# (edges far apart are never compared); vertices lying on the other outline are found
+# exactly for integer (or half-integer) coordinates.
+
+# Where a node of the cut outlines comes from: a subject vertex, a clip vertex, or a
+# crossing point of the two outlines
+NODE_SUBJECT_VERTEX = 0
+NODE_CLIP_VERTEX = 1
+NODE_CROSSING = 2
+
+# Outline as [x, y] points, closed implicitly
+Ring = List[List[float]]
+
+
+# Signed area of a closed outline (shoelace formula), the sign gives its orientation
+def _signed_area(points: np.ndarray) -> float:
+    following = np.roll(points, -1, axis=0)
+    return float(
+        np.sum(points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]) / 2.0
+    )
+
+
+# Edges of closed rings stored one after the other: the index of the end vertex of
+# every edge, given the number of points of each ring
+def _edge_ends(ring_lengths: List[int]) -> np.ndarray:
+    ends = np.arange(1, sum(ring_lengths) + 1)
+    ring_ends = np.cumsum(ring_lengths)
+    ends[ring_ends - 1] = ring_ends - np.asarray(ring_lengths)
+    return ends
+
+
+# Pairs (i, j) of overlapping intervals [a_low[i], a_high[i]] and [b_low[j], b_high[j]]:
+# a sort and sweep, so intervals far apart are never compared
+def _overlapping_pairs(
+    a_low: np.ndarray, a_high: np.ndarray, b_low: np.ndarray, b_high: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    if not len(a_low) or not len(b_low):
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+
+    # b intervals starting between a_low - (longest b interval) and a_high
+    order = np.argsort(b_low, kind="stable")
+    sorted_low = b_low[order]
+    longest = float(np.max(b_high - b_low))
+    first = np.searchsorted(sorted_low, a_low - longest, side="left")
+    last = np.searchsorted(sorted_low, a_high, side="right")
+    counts = last - first
+    a_index = np.repeat(np.arange(len(a_low)), counts)
+    b_index = order[
+        np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts - first, counts)
+    ]
+    overlapping = b_high[b_index] >= a_low[a_index]
+    return a_index[overlapping], b_index[overlapping]
+
+
+# Pairs of edges of a and b whose bounding boxes overlap
+def _edge_pairs(
+    a_starts: np.ndarray, a_ends: np.ndarray, b_starts: np.ndarray, b_ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    a_index, b_index = _overlapping_pairs(
+        np.minimum(a_starts[:, 0], a_ends[:, 0]),
+        np.maximum(a_starts[:, 0], a_ends[:, 0]),
+        np.minimum(b_starts[:, 0], b_ends[:, 0]),
+        np.maximum(b_starts[:, 0], b_ends[:, 0]),
+    )
+    overlapping = (
+        np.maximum(a_starts[a_index, 1], a_ends[a_index, 1])
+        >= np.minimum(b_starts[b_index, 1], b_ends[b_index, 1])
+    ) & (
+        np.minimum(a_starts[a_index, 1], a_ends[a_index, 1])
+        <= np.maximum(b_starts[b_index, 1], b_ends[b_index, 1])
+    )
+    return a_index[overlapping], b_index[overlapping]
+
+
+# Crossings inside both edges (end points excluded) of the a edges with the b edges:
+# a edge, position along it (0-1), b edge, position along it and crossing point
+def _edge_crossings(
+    a_starts: np.ndarray, a_ends: np.ndarray, b_starts: np.ndarray, b_ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+    a_index, b_index = _edge_pairs(a_starts, a_ends, b_starts, b_ends)
+    a_start = a_starts[a_index]
+    a_direction = a_ends[a_index] - a_start
+    b_direction = b_ends[b_index] - b_starts[b_index]
+    offset = b_starts[b_index] - a_start
+
+    # a_start + t * a_direction == b_start + u * b_direction, with the denominator
+    # made positive so the bounds are checked without dividing
+    denominator = a_direction[:, 0] * b_direction[:, 1] - a_direction[:, 1] * b_direction[:, 0]
+    t_numerator = offset[:, 0] * b_direction[:, 1] - offset[:, 1] * b_direction[:, 0]
+    u_numerator = offset[:, 0] * a_direction[:, 1] - offset[:, 1] * a_direction[:, 0]
+    sign = np.sign(denominator)
+    denominator *= sign
+    t_numerator *= sign
+    u_numerator *= sign
+    crossing = (
+        (denominator > 0)
+        & (t_numerator > 0)
+        & (t_numerator < denominator)
+        & (u_numerator > 0)
+        & (u_numerator < denominator)
+    )
+    t = t_numerator[crossing] / denominator[crossing]
+    u = u_numerator[crossing] / denominator[crossing]
+    points = a_start[crossing] + t[:, None] * a_direction[crossing]
+    return a_index[crossing], t, b_index[crossing], u, points
+
+
+# Points lying inside an edge (end points excluded): edge, position along it (0-1), point
+def _points_on_edges(
+    starts: np.ndarray, ends: np.ndarray, points: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    edge_index, point_index = _edge_pairs(starts, ends, points, points)
+    start = starts[edge_index]
+    direction = ends[edge_index] - start
+    offset = points[point_index] - start
+    cross = direction[:, 0] * offset[:, 1] - direction[:, 1] * offset[:, 0]
+    dot = direction[:, 0] * offset[:, 0] + direction[:, 1] * offset[:, 1]
+    length_squared = direction[:, 0] ** 2 + direction[:, 1] ** 2
+    on_edge = (cross == 0) & (dot > 0) & (dot < length_squared)
+    return (
+        edge_index[on_edge],
+        dot[on_edge] / length_squared[on_edge],
+        point_index[on_edge],
+    )
+
+
+# Location of points against closed outlines (even-odd rule): 1 inside, 0 outside,
+# -1 on an outline edge; for points on an edge, the index of that edge (else -1)
+def _locate_points(
+    points: np.ndarray, starts: np.ndarray, ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Only the edges spanning the height of a point can be crossed by its ray or hold it
+    point_index, edge_index = _overlapping_pairs(
+        points[:, 1],
+        points[:, 1],
+        np.minimum(starts[:, 1], ends[:, 1]),
+        np.maximum(starts[:, 1], ends[:, 1]),
+    )
+    px, py = points[point_index, 0], points[point_index, 1]
+    x0, y0 = starts[edge_index, 0], starts[edge_index, 1]
+    dx, dy = ends[edge_index, 0] - x0, ends[edge_index, 1] - y0
+
+    # Crossings of a ray going right, counted once per edge straddling the point
+    straddles = (y0 > py) != (y0 + dy > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crossing = straddles & (px < x0 + (py - y0) * dx / dy)
+    crossings = np.bincount(point_index[crossing], minlength=len(points))
+
+    # Points on an edge: collinear with it and between its end points
+    rx, ry = px - x0, py - y0
+    dot = dx * rx + dy * ry
+    on_edge = (dx * ry - dy * rx == 0) & (dot >= 0) & (dot <= dx * dx + dy * dy)
+    boundary_edge = np.full(len(points), len(starts), dtype=np.intp)
+    np.minimum.at(boundary_edge, point_index[on_edge], edge_index[on_edge])
+    on_boundary = boundary_edge < len(starts)
+
+    location = np.where(on_boundary, -1, crossings % 2)
+    return location, np.where(on_boundary, boundary_edge, -1)
+
+
+# Cut closed outlines at the given nodes: every edge is split at the positions found
+# on it. Return the start and end node of every piece, in outline order.
+def _split_edges(
+    vertex_count: int,
+    edge_ends: np.ndarray,
+    split_edges: np.ndarray,
+    split_positions: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+
+    # Nodes: the vertices (position 0 on their edge), then the split points
+    node_edges = np.concatenate((np.arange(vertex_count), split_edges))
+    node_positions = np.concatenate((np.zeros(vertex_count), split_positions))
+    order = np.lexsort((node_positions, node_edges))
+
+    # Every node runs to the next one on its edge, the last one to the edge end vertex
+    sorted_edges = node_edges[order]
+    following = np.empty(len(order), dtype=np.intp)
+    following[:-1] = order[1:]
+    last_on_edge = np.ones(len(order), dtype=bool)
+    last_on_edge[:-1] = sorted_edges[1:] != sorted_edges[:-1]
+    following[last_on_edge] = edge_ends[sorted_edges[last_on_edge]]
+    return order, following
+
+
+# Outline without repeated consecutive points (the closing pair included): a zero-length
+# edge would hold every point at its height when locating points
+def _without_repeated_points(ring: Ring) -> Ring:
+    return [
+        point
+        for index, point in enumerate(ring)
+        if tuple(point) != tuple(ring[index - 1])
+    ]
+
+
+# Subject outlines minus the clip outline, as rings of [x, y] points (input points are
+# reused as given, crossing points are floats); None when nothing of the subject is cut
+def polygon_difference(subject_rings: List[Ring], clip_points: Ring) -> Optional[List[Ring]]:
+    subject_rings = [_without_repeated_points(ring) for ring in subject_rings]
+    subject_rings = [ring for ring in subject_rings if len(ring) >= 3]
+    clip_points = _without_repeated_points(clip_points)
+    if not subject_rings or len(clip_points) < 3:
+        return None
+
+    subject_points = [point for ring in subject_rings for point in ring]
+    subject = np.array(subject_points, dtype=np.float64)
+    clip = np.array(clip_points, dtype=np.float64)
+    ring_lengths = [len(ring) for ring in subject_rings]
+    subject_edge_ends = _edge_ends(ring_lengths)
+    ring_starts = np.cumsum([0] + ring_lengths).tolist()
+    subject_area = sum(
+        _signed_area(subject[start:end])
+        for start, end in zip(ring_starts[:-1], ring_starts[1:])
+    )
+    clip_area = _signed_area(clip)
+    if subject_area == 0 or clip_area == 0:
+        return None
+
+    # Both outlines with the same orientation: the clip is walked backwards otherwise
+    clip_order = np.arange(len(clip))
+    if (subject_area > 0) != (clip_area > 0):
+        clip_order = clip_order[::-1].copy()
+        clip = clip[clip_order]
+    clip_edge_ends = _edge_ends([len(clip)])
+    subject_ends = subject[subject_edge_ends]
+    clip_ends = clip[clip_edge_ends]
+
+    # Crossings of the outlines, and vertices of each one lying on the other
+    (
+        crossing_subject_edges,
+        crossing_subject_positions,
+        crossing_clip_edges,
+        crossing_clip_positions,
+        crossing_points,
+    ) = _edge_crossings(subject, subject_ends, clip, clip_ends)
+    clip_on_subject_edges, clip_on_subject_positions, clip_on_subject = _points_on_edges(
+        subject, subject_ends, clip
+    )
+    subject_on_clip_edges, subject_on_clip_positions, subject_on_clip = _points_on_edges(
+        clip, clip_ends, subject
+    )
+
+    # Every node: its coordinates and where it comes from
+    subject_count, clip_count = len(subject), len(clip)
+    crossing_count = len(crossing_points)
+    node_points = np.concatenate((subject, clip, crossing_points))
+    node_sources = np.concatenate(
+        (
+            np.full(subject_count, NODE_SUBJECT_VERTEX),
+            np.full(clip_count, NODE_CLIP_VERTEX),
+            np.full(crossing_count, NODE_CROSSING),
+        )
+    )
+    node_indices = np.concatenate(
+        (np.arange(subject_count), clip_order, np.arange(crossing_count))
+    )
+    crossing_nodes = subject_count + clip_count + np.arange(crossing_count)
+
+    # Cut both outlines at the crossings and at the vertices of the other one
+    subject_order, subject_following = _split_edges(
+        subject_count,
+        subject_edge_ends,
+        np.concatenate((crossing_subject_edges, clip_on_subject_edges)),
+        np.concatenate((crossing_subject_positions, clip_on_subject_positions)),
+    )
+    subject_nodes = np.concatenate(
+        (np.arange(subject_count), crossing_nodes, subject_count + clip_on_subject)
+    )
+    clip_order_nodes, clip_following = _split_edges(
+        clip_count,
+        clip_edge_ends,
+        np.concatenate((crossing_clip_edges, subject_on_clip_edges)),
+        np.concatenate((crossing_clip_positions, subject_on_clip_positions)),
+    )
+    clip_nodes = np.concatenate(
+        (subject_count + np.arange(clip_count), crossing_nodes, subject_on_clip)
+    )
+    subject_piece_starts = subject_nodes[subject_order]
+    subject_piece_ends = subject_nodes[subject_following]
+    clip_piece_starts = clip_nodes[clip_order_nodes]
+    clip_piece_ends = clip_nodes[clip_following]
+
+    # Subject pieces outside the clip are kept, and so are the pieces along a clip
+    # edge running the other way (the clip interior is on the other side)
+    start_points = node_points[subject_piece_starts]
+    end_points = node_points[subject_piece_ends]
+    location, boundary_edge = _locate_points(
+        (start_points + end_points) / 2.0, clip, clip_ends
+    )
+    directions = end_points - start_points
+    boundary_directions = clip_ends[boundary_edge] - clip[boundary_edge]
+    keep_subject = (location == 0) | (
+        (location == -1)
+        & (np.sum(directions * boundary_directions, axis=1) < 0)
+    )
+
+    # Clip pieces inside the subject are kept, walked backwards
+    start_points = node_points[clip_piece_starts]
+    end_points = node_points[clip_piece_ends]
+    location, _ = _locate_points(
+        (start_points + end_points) / 2.0, subject, subject_ends
+    )
+    keep_clip = location == 1
+
+    if keep_subject.all() and not keep_clip.any():
+        return None
+
+    # Link the kept pieces end to start into rings, subject pieces first
+    piece_starts = np.concatenate(
+        (subject_piece_starts[keep_subject], clip_piece_ends[keep_clip])
+    )
+    piece_ends = np.concatenate(
+        (subject_piece_ends[keep_subject], clip_piece_starts[keep_clip])
+    )
+    non_empty = np.any(node_points[piece_starts] != node_points[piece_ends], axis=1)
+    piece_starts = piece_starts[non_empty]
+    piece_ends = piece_ends[non_empty]
+    start_keys = list(map(tuple, node_points[piece_starts].tolist()))
+    end_keys = list(map(tuple, node_points[piece_ends].tolist()))
+
+    outgoing = {}
+    for piece in range(len(start_keys) - 1, -1, -1):
+        outgoing.setdefault(start_keys[piece], []).append(piece)
+
+    node_sources = node_sources.tolist()
+    node_indices = node_indices.tolist()
+    piece_start_nodes = piece_starts.tolist()
+    crossing_values = crossing_points.tolist()
+    used = [False] * len(start_keys)
+    rings = []
+    for first in range(len(start_keys)):
+        if used[first]:
+            continue
+        ring = []
+        piece = first
+        while piece is not None:
+            used[piece] = True
+            node = piece_start_nodes[piece]
+            source, index = node_sources[node], node_indices[node]
+            if source == NODE_SUBJECT_VERTEX:
+                ring.append(subject_points[index])
+            elif source == NODE_CLIP_VERTEX:
+                ring.append(clip_points[index])
+            else:
+                ring.append(crossing_values[index])
+            if end_keys[piece] == start_keys[first]:
+                break
+
+            # Next unused piece leaving the end node; an outline left open is closed here
+            candidates = outgoing.get(end_keys[piece], [])
+            piece = None
+            while candidates:
+                candidate = candidates.pop()
+                if not used[candidate]:
+                    piece = candidate
+                    break
+        if len(ring) >= 3:
+            rings.append(ring)
+    return rings
@@ -0,0 +1,240 @@
+import base64
+import numpy as np
+from io import BytesIO
+from PIL import Image
+from typing import Dict, List, Tuple
+
+# Segmentation stage shared by every image processor backend.
+# The segmentation map is a label image in the upright frame of the input photo (any
+# resolution with the same aspect ratio); a region is the set of pixels of one label
+# value. The map is sampled onto the cropped output grid and the outline of each region
+# is traced with a vectorized marching squares, without OpenCV.
+
+# Marching squares segments of a 2x2 cell, by case (corners inside: top-left 8,
+# top-right 4, bottom-right 2, bottom-left 1), as (start edge, end edge) with edges
+# 0 top, 1 right, 2 bottom, 3 left. Segments keep the inside on their left, saddle
+# cells (5, 10) keep the two inside corners apart.
+MARCHING_SQUARES_SEGMENTS = {
+    1: ((2, 3),),
+    2: ((1, 2),),
+    3: ((1, 3),),
+    4: ((0, 1),),
+    5: ((0, 1), (2, 3)),
+    6: ((0, 2),),
+    7: ((0, 3),),
+    8: ((3, 0),),
+    9: ((2, 0),),
+    10: ((3, 0), (1, 2)),
+    11: ((1, 0),),
+    12: ((3, 1),),
+    13: ((2, 1),),
+    14: ((3, 2),),
+}
+
+# The same table as lookup arrays: [segment slot, case] -> edge, -1 when absent
+SEGMENT_START_EDGES = np.full((2, 16), -1, dtype=np.intp)
+SEGMENT_END_EDGES = np.full((2, 16), -1, dtype=np.intp)
+for _case, _segments in MARCHING_SQUARES_SEGMENTS.items():
+    for _slot, (_start_edge, _end_edge) in enumerate(_segments):
+        SEGMENT_START_EDGES[_slot, _case] = _start_edge
+        SEGMENT_END_EDGES[_slot, _case] = _end_edge
+
+# Midpoint of each edge in doubled cell coordinates (x, y), so keys stay integers
+EDGE_X2 = np.array([1, 2, 1, 0], dtype=np.intp)
+EDGE_Y2 = np.array([0, 1, 2, 1], dtype=np.intp)
+
+
+# Decode the segmentation map into a 2D array of labels
+def _decode_label_map(segmentation_map_base64_bytes: bytes) -> np.ndarray:
+    img = Image.open(BytesIO(base64.b64decode(segmentation_map_base64_bytes)))
+    # Grayscale values and palette indices are the labels, other modes are converted
+    if img.mode not in ("L", "P", "I", "I;16"):
+        img = img.convert("L")
+    return np.asarray(img)
+
+
+# Nearest label of every output pixel: the map scaled to the source image, cropped
+# at the crop offset and sampled every downscale_factor source pixels
+def _sample_label_map(
+    labels: np.ndarray,
+    source_size: Tuple[int, int],
+    crop_offset: Tuple[int, int],
+    downscale_factor: int,
+    output_size: Tuple[int, int],
+) -> np.ndarray:
+
+    map_height, map_width = labels.shape
+    source_width, source_height = source_size
+    offset_x, offset_y = crop_offset
+    output_width, output_height = output_size
+
+    # Same grid as the output image: a view, no copy
+    if (map_width, map_height) == (source_width, source_height) and downscale_factor == 1:
+        return labels[offset_y : offset_y + output_height, offset_x : offset_x + output_width]
+
+    rows = (
+        (offset_y + (np.arange(output_height) + 0.5) * downscale_factor)
+        * map_height
+        / source_height
+    ).astype(np.intp)
+    cols = (
+        (offset_x + (np.arange(output_width) + 0.5) * downscale_factor)
+        * map_width
+        / source_width
+    ).astype(np.intp)
+    np.clip(rows, 0, map_height - 1, out=rows)
+    np.clip(cols, 0, map_width - 1, out=cols)
+    return labels[rows[:, None], cols[None, :]]
+
+
+# Outlines of every region of a mask and of their holes, as (N, 2) pixel center
+# coordinates (corners only, collinear marching squares points are dropped). Outer
+# outlines come first, largest first, then the holes; holes run the other way, so
+# every outline can be drawn as a subpath of one nonzero filled path. Empty if the
+# mask is empty.
+def _trace_outlines(mask: np.ndarray) -> List[np.ndarray]:
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not rows.size:
+        return []
+    cols = np.flatnonzero(mask.any(axis=0))
+    top, left = rows[0], cols[0]
+
+    # Only the bounding box of the region is traced, padded so every outline is closed
+    padded = np.pad(mask[top : rows[-1] + 1, left : cols[-1] + 1], 1)
+    width = padded.shape[1]
+
+    # Boundary cells (named by their top-left grid point) are the two cells on each
+    # side of a change between horizontal or vertical neighbours; finding them from
+    # the changes avoids computing the case of every cell
+    cell_width = width - 1
+    horizontal_rows, horizontal_cols = np.divmod(
+        np.flatnonzero(padded[:, :-1] != padded[:, 1:]), cell_width
+    )
+    vertical_rows, vertical_cols = np.divmod(
+        np.flatnonzero(padded[:-1, :] != padded[1:, :]), width
+    )
+    cell_rows, cell_cols = np.divmod(
+        np.unique(
+            np.concatenate(
+                (
+                    (horizontal_rows - 1) * cell_width + horizontal_cols,
+                    horizontal_rows * cell_width + horizontal_cols,
+                    vertical_rows * cell_width + vertical_cols - 1,
+                    vertical_rows * cell_width + vertical_cols,
+                )
+            )
+        ),
+        cell_width,
+    )
+    corners = padded.view(np.uint8)
+    cell_cases = (
+        (corners[cell_rows, cell_cols] << 3)
+        | (corners[cell_rows, cell_cols + 1] << 2)
+        | (corners[cell_rows + 1, cell_cols + 1] << 1)
+        | corners[cell_rows + 1, cell_cols]
+    )
+
+    # Segment end points of every boundary cell, in doubled grid coordinates
+    start_x2, start_y2, end_x2, end_y2 = [], [], [], []
+    for slot in range(2):
+        start_edges = SEGMENT_START_EDGES[slot, cell_cases]
+        present = start_edges >= 0
+        start_edges = start_edges[present]
+        end_edges = SEGMENT_END_EDGES[slot, cell_cases[present]]
+        slot_cols = 2 * cell_cols[present]
+        slot_rows = 2 * cell_rows[present]
+        start_x2.append(slot_cols + EDGE_X2[start_edges])
+        start_y2.append(slot_rows + EDGE_Y2[start_edges])
+        end_x2.append(slot_cols + EDGE_X2[end_edges])
+        end_y2.append(slot_rows + EDGE_Y2[end_edges])
+    start_x2 = np.concatenate(start_x2)
+    start_y2 = np.concatenate(start_y2)
+    end_x2 = np.concatenate(end_x2)
+    end_y2 = np.concatenate(end_y2)
+    segment_count = len(start_x2)
+
+    # Every edge midpoint starts exactly one segment: link each segment to the next
+    key_width = 2 * width + 1
+    start_keys = start_y2 * key_width + start_x2
+    order = np.argsort(start_keys)
+    successor = order[np.searchsorted(start_keys[order], end_y2 * key_width + end_x2)]
+
+    # Label every closed loop by its smallest segment index (pointer jumping)
+    loop_ids = np.arange(segment_count)
+    jump = successor
+    for _ in range(segment_count.bit_length()):
+        loop_ids = np.minimum(loop_ids, loop_ids[jump])
+        jump = jump[jump]
+
+    # Signed area of every loop: outer outlines are negative, holes positive
+    areas = np.bincount(
+        loop_ids, weights=start_x2 * end_y2 - end_x2 * start_y2, minlength=segment_count
+    )
+    loop_lengths = np.bincount(loop_ids, minlength=segment_count)
+    loop_starts = np.flatnonzero(loop_lengths)
+    loop_starts = loop_starts[np.argsort(areas[loop_starts], kind="stable")]
+
+    outlines = []
+    for loop_start in loop_starts.tolist():
+        # Walk the loop in order
+        loop_length = int(loop_lengths[loop_start])
+        loop_order = np.empty(loop_length, dtype=np.intp)
+        segment = loop_start
+        for i in range(loop_length):
+            loop_order[i] = segment
+            segment = successor[segment]
+        points_x2 = start_x2[loop_order]
+        points_y2 = start_y2[loop_order]
+
+        # Keep the corners only
+        incoming_x = points_x2 - np.roll(points_x2, 1)
+        incoming_y = points_y2 - np.roll(points_y2, 1)
+        outgoing_x = np.roll(points_x2, -1) - points_x2
+        outgoing_y = np.roll(points_y2, -1) - points_y2
+        corners = incoming_x * outgoing_y - incoming_y * outgoing_x != 0
+
+        # Padded grid point (r, c) is the center of output pixel (r - 1, c - 1)
+        outline = np.empty((int(np.count_nonzero(corners)), 2), dtype=np.float64)
+        outline[:, 0] = points_x2[corners] / 2.0 - 0.5 + left
+        outline[:, 1] = points_y2[corners] / 2.0 - 0.5 + top
+        outlines.append(outline)
+    return outlines
+
+
+# Outlines of every labelled region of the segmentation map, in output image coordinates:
+# per label, the outline of each of its separate areas and of their holes
+def segmentation_region_contours(
+    segmentation_map_base64_bytes: bytes,
+    segmentation_labels: Dict[str, int],
+    source_size: Tuple[int, int],
+    crop_offset: Tuple[int, int],
+    downscale_factor: int,
+    output_size: Tuple[int, int],
+) -> List[Tuple[str, List[List[Dict[str, float]]]]]:
+
+    if min(source_size) <= 0 or min(output_size) <= 0:
+        return []
+
+    region_labels = _sample_label_map(
+        _decode_label_map(segmentation_map_base64_bytes),
+        source_size,
+        crop_offset,
+        downscale_factor,
+        output_size,
+    )
+
+    region_contours = []
+    for label_name, label_value in segmentation_labels.items():
+        outlines = _trace_outlines(region_labels == label_value)
+        if not outlines:
+            continue
+        region_contours.append(
+            (
+                label_name,
+                [
+                    [{"x": x, "y": y} for x, y in outline.tolist()]
+                    for outline in outlines
+                ],
+            )
+        )
+    return region_contours
@@ -1,12 +1,67 @@
 import math
 import base64
+import binascii
+import shutil
+import subprocess
 from io import BytesIO
 from PIL import Image, ExifTags
-from typing import List, Dict, Any, Optional, Tuple
+from typing import (
+    List,
+    Dict,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
 
 # Constants for cropping
 CROP_PADDING = 50  # Padding around the detected landmarks for cropping
 
+# How the cropped image is embedded in the SVG:
+# "defs"  - once in <defs>, referenced by one <use> per clip region
+# "union" - a single <image> clipped by one clipPath holding every region path
+SVG_IMAGE_EMBED_MODES = ("defs", "union")
+
+# Pillow rotation (degrees, counter-clockwise) for the EXIF orientations handled here
+EXIF_ORIENTATION_ROTATIONS = {3: 180, 6: 270, 8: 90}
+
+# jpegtran (libjpeg-turbo-progs) for lossless JPEG rotations and crops, if installed
+JPEGTRAN_PATH = shutil.which("jpegtran")
+JPEGTRAN_TIMEOUT = 30
+
+# The same rotations as jpegtran -rotate arguments (degrees, clockwise)
+JPEGTRAN_ROTATIONS = {3: "180", 6: "90", 8: "270"}
+
+# Encodings of the embedded image: "source" keeps the input format, "jpeg" and "webp"
+# re-encode with the quality/progressive/optimize/subsampling/method of image_encoding
+IMAGE_OUTPUT_FORMATS = ("source", "jpeg", "webp")
+
+# Magic bytes of the image formats that may end up embedded in the SVG
+IMAGE_MIME_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+# SVG element: a string, or its parts when it embeds the (large) image base64 string
+SvgElement = Union[str, Tuple[str, ...]]
+
+# Characters of SVG text base64 encoded per step when streaming the output (multiple of 3)
+SVG_BASE64_CHUNK_SIZE = 3 * 64 * 1024
+
+# Decimals kept by coordinate_precision at most (round() of a double is exact up to there)
+COORDINATE_PRECISION_MAX = 15
+
+# Straight segments per curve of a smooth outline flattened before a region exclusion cut
+SMOOTH_OUTLINE_CURVE_STEPS = 8
+
+# Mask contour key holding every outline of a region drawn with several subpaths; only
+# used by the region exclusions and removed before the contours are returned
+CONTOUR_RINGS_KEY = "_rings"
+
 # Define region names for the contours
 region_names = {
     0: "right_cheek",
@@ -21,14 +76,77 @@ region_names = {
 def _cropped_img_save(
     image: Image.Image, 
     buffered: BytesIO, 
-    format: Optional[str]
+    format: Optional[str],
+    image_encoding: Optional[Dict[str, Any]] = None,
 ) -> None:
+    if image_encoding and image_encoding.get("format", "source") != "source":
+        _encode_image(image, buffered, image_encoding)
+        return
     try:
         image.save(buffered, format=format if format else "JPEG")
     except Exception:
         image.save(buffered, format="JPEG")
 
 
+# Encode the image as JPEG or WebP with the encoder settings of image_encoding
+def _encode_image(
+    image: Image.Image, buffered: BytesIO, image_encoding: Dict[str, Any]
+) -> None:
+    output_format = image_encoding["format"]
+    save_options: Dict[str, Any] = {}
+    if image_encoding.get("quality"):
+        save_options["quality"] = image_encoding["quality"]
+
+    if output_format == "jpeg":
+        # JPEG has no alpha channel or palette
+        if image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        save_options["progressive"] = bool(image_encoding.get("progressive"))
+        save_options["optimize"] = bool(image_encoding.get("optimize"))
+        # 0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0; None or -1 keeps the encoder default
+        if image_encoding.get("subsampling") not in (None, -1):
+            save_options["subsampling"] = image_encoding["subsampling"]
+        image.save(buffered, format="JPEG", **save_options)
+    elif output_format == "webp":
+        # Encoder effort, 0 (fast) to 6 (smallest)
+        if image_encoding.get("method") is not None:
+            save_options["method"] = image_encoding["method"]
+        image.save(buffered, format="WEBP", **save_options)
+    else:
+        raise ValueError(
+            f"Unknown image output format '{output_format}'. Expected one of {IMAGE_OUTPUT_FORMATS}."
+        )
+
+
+# MIME type of a base64 encoded image, sniffed from its magic bytes (JPEG if unknown)
+def _image_mime_type(image_base64_str: str) -> str:
+    try:
+        header = base64.b64decode(image_base64_str[:16])
+    except Exception:
+        return "image/jpeg"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in IMAGE_MIME_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return "image/jpeg"
+
+
+# MIME type and decoded byte size of the image embedded in an SVG document, found in
+# place: the (large) image base64 string is never copied or decoded
+def embedded_image_info(svg_content: bytes) -> Tuple[str, int]:
+    start = svg_content.find(b";base64,")
+    if start < 0:
+        return "", 0
+    start += len(b";base64,")
+    end = svg_content.find(b'"', start)
+    if end < 0:
+        return "", 0
+    size = (end - start) * 3 // 4 - svg_content[max(start, end - 2) : end].count(b"=")
+    image_header = svg_content[start : min(end, start + 16)].decode("ascii", "replace")
+    return _image_mime_type(image_header), size
+
+
 # Function to simulate intensive calculations
 def _dummy_calculation(
         
@@ -45,170 +163,426 @@ def _dummy_calculation(
 # Helper function to convert points to a smooth SVG path
 def _points_to_smooth_svg_path(
     points_list: List[Dict[str, float]],
-    exclude_region_landmarks: Optional[List[Dict[str, float]]] = None,
+    coordinate_precision: int = -1,
 ) -> str:
 
     # Ensure points_list is not empty
     if not points_list:
         return ""
 
-    # Ensure exclude_region_landmarks is a list, default to empty if None
+    # Path commands of the smooth outline
     path_commands = []
 
-    # If exclude_region_landmarks is None, we treat it as an empty list
-    adjusted_points = []
-
-    # If exclude_region_landmarks is provided, we will adjust points away from it
-    if exclude_region_landmarks and len(points_list) > 2:
-
-        # the start of the excluded region
-        ex_cx, ex_cy = 0.0, 0.0
-
-        # Calculate the center of the excluded region landmarks
-        if exclude_region_landmarks:
-            sum_x = sum(p["x"] for p in exclude_region_landmarks)
-            sum_y = sum(p["y"] for p in exclude_region_landmarks)
-            ex_cx = (
-                sum_x / len(exclude_region_landmarks) if exclude_region_landmarks else 0
-            )
-            ex_cy = (
-                sum_y / len(exclude_region_landmarks) if exclude_region_landmarks else 0
-            )
-
-        # Iterate through points to adjust them away from the excluded region center
-        for point in points_list:
-            dist = math.sqrt((point["x"] - ex_cx) ** 2 + (point["y"] - ex_cy) ** 2)
-            if dist < CROP_PADDING * 2:  # Arbitrary "too close" threshold
-                # Move point slightly away from the center of the excluded region
-                dx, dy = point["x"] - ex_cx, point["y"] - ex_cy
-                if dx == 0 and dy == 0:
-                    dx, dy = 1, 1  # Prevent division by zero
-                norm = math.sqrt(dx * dx + dy * dy)
-                if norm == 0:
-                    adj_x = point["x"] + 5  # Arbitrarily move 5 pixels in x
-                    adj_y = point["y"] + 5  # Arbitrarily move 5 pixels in y
-                else:
-                    adj_x = point["x"] + (dx / norm) * 5  # Move 5 pixels away
-                    adj_y = point["y"] + (dy / norm) * 5
-                adjusted_points.append({"x": adj_x, "y": adj_y})
-            else:
-                adjusted_points.append(point)
-    else:
-        adjusted_points = points_list
-
-    # Now generate the smooth path using the adjusted points
-    num_points = len(adjusted_points)
-    if num_points == 0:
-        return ""
+    # Now generate the smooth path through the points
+    num_points = len(points_list)
     if num_points == 1:
-        return f"M {adjusted_points[0]['x']} {adjusted_points[0]['y']} Z"  # Single point as a path
+        return f"M {_round_coordinate(points_list[0]['x'], coordinate_precision)} {_round_coordinate(points_list[0]['y'], coordinate_precision)} Z"  # Single point as a path
 
     # Move to the first point
-    path_commands.append(f"M {adjusted_points[0]['x']} {adjusted_points[0]['y']}")
+    path_commands.append(
+        f"M {_round_coordinate(points_list[0]['x'], coordinate_precision)} {_round_coordinate(points_list[0]['y'], coordinate_precision)}"
+    )
 
     if num_points == 2:
-        path_commands.append(f"L {adjusted_points[1]['x']} {adjusted_points[1]['y']}")
+        path_commands.append(
+            f"L {_round_coordinate(points_list[1]['x'], coordinate_precision)} {_round_coordinate(points_list[1]['y'], coordinate_precision)}"
+        )
     else:
         # First segment (P0 to midpoint of P0 and P1)
-        p1 = adjusted_points[0]
-        p2 = adjusted_points[1]
+        p1 = points_list[0]
+        p2 = points_list[1]
         mp_x = (p1["x"] + p2["x"]) / 2.0
         mp_y = (p1["y"] + p2["y"]) / 2.0
-        path_commands.append(f"Q {p1['x']} {p1['y']}, {mp_x} {mp_y}")
+        path_commands.append(
+            f"Q {_round_coordinate(p1['x'], coordinate_precision)} {_round_coordinate(p1['y'], coordinate_precision)}, "
+            f"{_round_coordinate(mp_x, coordinate_precision)} {_round_coordinate(mp_y, coordinate_precision)}"
+        )
 
         # Intermediate segments (midpoint to midpoint, using current point as control)
         for i in range(1, num_points - 1):
-            p1 = adjusted_points[i]
-            p2 = adjusted_points[i + 1]
+            p1 = points_list[i]
+            p2 = points_list[i + 1]
             mp_x = (p1["x"] + p2["x"]) / 2.0
             mp_y = (p1["y"] + p2["y"]) / 2.0
             # The SVG "T" command is a shorthand for smooth quadratic Bézier curves and requires a preceding "Q" command.
-            path_commands.append(f"T {mp_x} {mp_y}")
+            path_commands.append(
+                f"T {_round_coordinate(mp_x, coordinate_precision)} {_round_coordinate(mp_y, coordinate_precision)}"
+            )
 
         # Last segment (midpoint between last and first, using last point as control)
-        p_last = adjusted_points[num_points - 1]
-        p_first = adjusted_points[0]
+        p_last = points_list[num_points - 1]
+        p_first = points_list[0]
         mp_x_last = (p_last["x"] + p_first["x"]) / 2.0
         mp_y_last = (p_last["y"] + p_first["y"]) / 2.0
-        path_commands.append(f"T {mp_x_last} {mp_y_last}")
+        path_commands.append(
+            f"T {_round_coordinate(mp_x_last, coordinate_precision)} {_round_coordinate(mp_y_last, coordinate_precision)}"
+        )
 
     # The "Z" command will close the path, so no need for an extra "Q" command here.
     path_commands.append("Z")
     return " ".join(path_commands)
 
 
+# The outline _points_to_smooth_svg_path draws through [x, y] points, as a polygon: the
+# straight start up to the first midpoint, then every quadratic curve (midpoint to
+# midpoint around a point) flattened into curve_steps segments
+def _smooth_outline_points(
+    points: List[List[float]], curve_steps: int = SMOOTH_OUTLINE_CURVE_STEPS
+) -> List[List[float]]:
+
+    num_points = len(points)
+    if num_points < 3:
+        return [list(point) for point in points]
+
+    outline = [list(points[0])]
+    for i in range(1, num_points):
+        previous_x, previous_y = points[i - 1]
+        control_x, control_y = points[i]
+        next_x, next_y = points[(i + 1) % num_points]
+        start_x = (previous_x + control_x) / 2.0
+        start_y = (previous_y + control_y) / 2.0
+        end_x = (control_x + next_x) / 2.0
+        end_y = (control_y + next_y) / 2.0
+        if i == 1:
+            outline.append([start_x, start_y])
+        for step in range(1, curve_steps + 1):
+            t = step / curve_steps
+            u = 1.0 - t
+            outline.append(
+                [
+                    u * u * start_x + 2.0 * u * t * control_x + t * t * end_x,
+                    u * u * start_y + 2.0 * u * t * control_y + t * t * end_y,
+                ]
+            )
+    return outline
+
+
+# Straight-edged SVG path through [x, y] points, closed
+def _points_to_polygon_svg_path(
+    points: List[List[float]], coordinate_precision: int = -1
+) -> str:
+    path_commands = [
+        f"{'M' if i == 0 else 'L'} {_round_coordinate(x, coordinate_precision)} {_round_coordinate(y, coordinate_precision)}"
+        for i, (x, y) in enumerate(points)
+    ]
+    path_commands.append("Z")
+    return " ".join(path_commands)
+
+
+# Round a coordinate to coordinate_precision decimals (negative: unchanged), ints stay ints
+def _round_coordinate(value: float, coordinate_precision: int) -> float:
+    if coordinate_precision < 0:
+        return value
+    return round(value, coordinate_precision)
+
+
+# Reject precisions the compiled backend cannot round exactly like round()
+def _check_coordinate_precision(coordinate_precision: int) -> None:
+    if coordinate_precision > COORDINATE_PRECISION_MAX:
+        raise ValueError(
+            f"Coordinate precision {coordinate_precision} is above the maximum of {COORDINATE_PRECISION_MAX} decimals."
+        )
+
+
+# Reject unknown output formats before any work: a ValueError raised while encoding
+# would be caught by the decoding fallback and the original image embedded instead
+def _check_image_encoding(image_encoding: Optional[Dict[str, Any]]) -> None:
+    if image_encoding and image_encoding.get("format", "source") not in IMAGE_OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown image output format '{image_encoding['format']}'. Expected one of {IMAGE_OUTPUT_FORMATS}."
+        )
+
+
+# Ramer-Douglas-Peucker: keep the points farther than tolerance pixels from the
+# simplified outline; the first and last points are always kept
+def _simplify_points(
+    points_list: List[Dict[str, float]], tolerance: float
+) -> List[Dict[str, float]]:
+
+    num_points = len(points_list)
+    if tolerance <= 0 or num_points < 3:
+        return points_list
+
+    keep = [False] * num_points
+    keep[0] = keep[num_points - 1] = True
+    segments = [(0, num_points - 1)]
+    while segments:
+        first, last = segments.pop()
+        ax, ay = points_list[first]["x"], points_list[first]["y"]
+        dx = points_list[last]["x"] - ax
+        dy = points_list[last]["y"] - ay
+        length = math.sqrt(dx * dx + dy * dy)
+
+        # Farthest point from the segment (from its first point if the segment is empty)
+        max_distance, max_index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = points_list[i]["x"], points_list[i]["y"]
+            if length == 0:
+                distance = math.sqrt((px - ax) * (px - ax) + (py - ay) * (py - ay))
+            else:
+                distance = abs(dx * (ay - py) - (ax - px) * dy) / length
+            if distance > max_distance:
+                max_distance, max_index = distance, i
+
+        if max_distance > tolerance:
+            keep[max_index] = True
+            segments.append((first, max_index))
+            segments.append((max_index, last))
+
+    return [point for point, kept in zip(points_list, keep) if kept]
+
+
+# Helper function to find the bounding box (min_x, max_x, min_y, max_y) of all landmarks
+def _landmarks_bounding_box(
+    landmarks_data: Dict[str, Any]
+) -> Tuple[float, float, float, float]:
+
+    min_x, max_x = float("inf"), float("-inf")
+    min_y, max_y = float("inf"), float("-inf")
+
+    for contour_group in landmarks_data.get("landmarks", []):
+        for point_data in contour_group:
+            if (
+                isinstance(point_data, dict)
+                and "x" in point_data
+                and "y" in point_data
+            ):
+                min_x = min(min_x, point_data["x"])
+                max_x = max(max_x, point_data["x"])
+                min_y = min(min_y, point_data["y"])
+                max_y = max(max_y, point_data["y"])
+
+    return min_x, max_x, min_y, max_y
+
+
+# Read the EXIF orientation tag without decoding the pixels
+def _exif_orientation(img: Image.Image) -> Optional[int]:
+    exif = img._getexif()
+    if not exif:
+        return None
+
+    for orientation_tag_id in ExifTags.TAGS.keys():
+        if ExifTags.TAGS[orientation_tag_id] == "Orientation":
+            break
+    else:
+        orientation_tag_id = None
+
+    if orientation_tag_id is not None and orientation_tag_id in exif:
+        return exif[orientation_tag_id]
+    return None
+
+
+# Reuse the submitted base64 text when it is canonical (no line breaks or whitespace)
+def _reuse_base64(original_image_base64_bytes: bytes, image_bytes: bytes) -> str:
+    if len(original_image_base64_bytes) == 4 * ((len(image_bytes) + 2) // 3):
+        return original_image_base64_bytes.decode("utf-8")
+    return base64.b64encode(image_bytes).decode("utf-8")
+
+
+# Size in pixels of a JPEG MCU (8x8 blocks scaled by the largest sampling factors)
+def _jpeg_mcu_size(img: Image.Image) -> Tuple[int, int]:
+    layers = getattr(img, "layer", None) or [("", 1, 1, 0)]
+    return (
+        8 * max(horizontal for _, horizontal, _, _ in layers),
+        8 * max(vertical for _, _, vertical, _ in layers),
+    )
+
+
+# Rotate and crop a JPEG losslessly with jpegtran, moving the crop origin up/left to
+# an MCU boundary. Returns (JPEG bytes, crop offset x, crop offset y, width, height),
+# or None when jpegtran is missing or the transform cannot be done exactly.
+def _jpeg_lossless_transform(
+    image_bytes: bytes,
+    img: Image.Image,
+    orientation: Optional[int],
+    crop_box: Optional[Tuple[int, int, int, int]],
+) -> Optional[Tuple[bytes, int, int, int, int]]:
+
+    if JPEGTRAN_PATH is None or img.format != "JPEG":
+        return None
+
+    mcu_width, mcu_height = _jpeg_mcu_size(img)
+    width, height = img.size
+    args = [JPEGTRAN_PATH, "-copy", "none"]
+
+    # The crop region is given in the rotated image, where MCUs are rotated too
+    if orientation in JPEGTRAN_ROTATIONS:
+        args += ["-rotate", JPEGTRAN_ROTATIONS[orientation], "-perfect"]
+        if orientation in (6, 8):
+            mcu_width, mcu_height = mcu_height, mcu_width
+            width, height = height, width
+
+    crop_offset_x, crop_offset_y = 0, 0
+    if crop_box is not None:
+        crop_left, crop_top, crop_right, crop_bottom = crop_box
+        crop_offset_x = crop_left - crop_left % mcu_width
+        crop_offset_y = crop_top - crop_top % mcu_height
+        width, height = crop_right - crop_offset_x, crop_bottom - crop_offset_y
+        args += ["-crop", f"{width}x{height}+{crop_offset_x}+{crop_offset_y}"]
+
+    try:
+        result = subprocess.run(
+            args, input=image_bytes, capture_output=True, timeout=JPEGTRAN_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout, crop_offset_x, crop_offset_y, width, height
+
+
+# Smallest power-of-two downscale fitting width x height in max_output_dimension (0 disables)
+def _downscale_factor(width: int, height: int, max_output_dimension: int) -> int:
+    factor = 1
+    if max_output_dimension and max_output_dimension > 0:
+        while max(width, height) / factor > max_output_dimension:
+            factor *= 2
+    return factor
+
+
+# Decode the image at 1/factor of its size: JPEG DCT scaling (draft) up to 1/8,
+# then reduce() for the rest, so the full resolution pixels are never held in memory
+def _decode_reduced(img: Image.Image, factor: int) -> Image.Image:
+    if img.format == "JPEG":
+        width, height = img.size
+        draft_scale = min(factor, 8)
+        draft_result = img.draft(
+            img.mode, (max(1, width // draft_scale), max(1, height // draft_scale))
+        )
+        if draft_result is not None:
+            # The draft box is the original size divided by the scale libjpeg applied
+            factor //= round(width / draft_result[1][2])
+    if factor > 1:
+        img = img.reduce(factor)
+    return img
+
+
 # New function to encapsulate image decoding and cropping logic
 def _process_image_decoding_and_cropping(
     original_image_base64_bytes: bytes, 
-    landmarks_data: Dict[str, Any]
-) -> Tuple[str, int, int, int, int]:
+    landmarks_data: Dict[str, Any],
+    bounding_box: Optional[Tuple[float, float, float, float]] = None,
+    jpeg_lossless_transform: bool = False,
+    max_output_dimension: int = 0,
+    image_encoding: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, int, int, int, int, int, int, int]:
 
     image_width, image_height = 0, 0
     crop_offset_x, crop_offset_y = 0, 0
+    downscale_factor = 1
+    # Size of the upright (EXIF rotated) input image, before cropping and downscaling
+    source_width, source_height = 0, 0
     rotated_and_cropped_image_base64_str = ""
 
     try:
         image_bytes = base64.b64decode(original_image_base64_bytes)
+        # Opening only reads the headers, the pixels are decoded on first use
         img = Image.open(BytesIO(image_bytes))
 
-        exif = img._getexif()
-        if exif:
-            for orientation_tag_id in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation_tag_id] == "Orientation":
-                    break
-            else:
-                orientation_tag_id = None
-
-            if orientation_tag_id is not None and orientation_tag_id in exif:
-                if exif[orientation_tag_id] == 3:
-                    img = img.rotate(180, expand=True)
-                elif exif[orientation_tag_id] == 6:
-                    img = img.rotate(270, expand=True)
-                elif exif[orientation_tag_id] == 8:
-                    img = img.rotate(90, expand=True)
-
-        landmarks_list_of_lists = landmarks_data.get("landmarks", [])
-
-        min_x, max_x = float("inf"), float("-inf")
-        min_y, max_y = float("inf"), float("-inf")
-
-        for contour_group in landmarks_list_of_lists:
-            for point_data in contour_group:
-                if (
-                    isinstance(point_data, dict)
-                    and "x" in point_data
-                    and "y" in point_data
-                ):
-                    min_x = min(min_x, point_data["x"])
-                    max_x = max(max_x, point_data["x"])
-                    min_y = min(min_y, point_data["y"])
-                    max_y = max(max_y, point_data["y"])
+        orientation = _exif_orientation(img)
+        rotation = EXIF_ORIENTATION_ROTATIONS.get(orientation)
 
+        # Use the bounding box computed by the caller, if any
+        if bounding_box is None:
+            bounding_box = _landmarks_bounding_box(landmarks_data)
+        min_x, max_x, min_y, max_y = bounding_box
+
+        # Size of the image once rotated, known from the headers
         current_img_width, current_img_height = img.size
+        if rotation in (90, 270):
+            current_img_width, current_img_height = current_img_height, current_img_width
+        source_width, source_height = current_img_width, current_img_height
+
+        # No crop without landmarks, or when the padded bounding box covers the whole image
+        crop_box = None
+        if min_x != float("inf") and min_y != float("inf"):
+            crop_left = math.floor(max(0, min_x - CROP_PADDING))
+            crop_top = math.floor(max(0, min_y - CROP_PADDING))
+            crop_right = math.ceil(min(current_img_width, max_x + CROP_PADDING))
+            crop_bottom = math.ceil(min(current_img_height, max_y + CROP_PADDING))
+            if (
+                crop_right > crop_left
+                and crop_bottom > crop_top
+                and (crop_left, crop_top, crop_right, crop_bottom)
+                != (0, 0, current_img_width, current_img_height)
+            ):
+                crop_box = (crop_left, crop_top, crop_right, crop_bottom)
+
+        # Power-of-two downscale keeping the output within max_output_dimension
+        if crop_box is None:
+            downscale_factor = _downscale_factor(
+                current_img_width, current_img_height, max_output_dimension
+            )
+        else:
+            downscale_factor = _downscale_factor(
+                crop_box[2] - crop_box[0], crop_box[3] - crop_box[1], max_output_dimension
+            )
 
-        crop_left = math.floor(max(0, min_x - CROP_PADDING))
-        crop_top = math.floor(max(0, min_y - CROP_PADDING))
-        crop_right = math.ceil(min(current_img_width, max_x + CROP_PADDING))
-        crop_bottom = math.ceil(min(current_img_height, max_y + CROP_PADDING))
+        # The input bytes are only kept as they are when no re-encoding is requested
+        keep_source_encoding = (
+            not image_encoding or image_encoding.get("format", "source") == "source"
+        )
 
+        # Lossless JPEG rotation/crop, when enabled and there is something to do
+        lossless_result = None
         if (
-            min_x == float("inf")
-            or min_y == float("inf")
-            or crop_right <= crop_left
-            or crop_bottom <= crop_top
+            jpeg_lossless_transform
+            and keep_source_encoding
+            and downscale_factor == 1
+            and (rotation is not None or crop_box is not None)
         ):
-            cropped_img = img
-            crop_offset_x, crop_offset_y = 0, 0
+            lossless_result = _jpeg_lossless_transform(
+                image_bytes, img, orientation, crop_box
+            )
+
+        if (
+            rotation is None
+            and crop_box is None
+            and downscale_factor == 1
+            and keep_source_encoding
+        ):
+            # Fast path: the submitted image is embedded as is, without decode/re-encode
+            image_width, image_height = img.size
+            rotated_and_cropped_image_base64_str = _reuse_base64(
+                original_image_base64_bytes, image_bytes
+            )
+        elif lossless_result is not None:
+            jpeg_bytes, crop_offset_x, crop_offset_y, image_width, image_height = (
+                lossless_result
+            )
+            rotated_and_cropped_image_base64_str = base64.b64encode(jpeg_bytes).decode(
+                "utf-8"
+            )
         else:
-            cropped_img = img.crop((crop_left, crop_top, crop_right, crop_bottom))
-            crop_offset_x, crop_offset_y = crop_left, crop_top
+            if downscale_factor > 1:
+                img = _decode_reduced(img, downscale_factor)
+
+            if rotation is not None:
+                img = img.rotate(rotation, expand=True)
+
+            if crop_box is None:
+                cropped_img = img
+            else:
+                # Crop box in the downscaled image; offsets stay in original pixels
+                crop_left = crop_box[0] // downscale_factor
+                crop_top = crop_box[1] // downscale_factor
+                cropped_img = img.crop(
+                    (
+                        crop_left,
+                        crop_top,
+                        min(img.size[0], math.ceil(crop_box[2] / downscale_factor)),
+                        min(img.size[1], math.ceil(crop_box[3] / downscale_factor)),
+                    )
+                )
+                crop_offset_x = crop_left * downscale_factor
+                crop_offset_y = crop_top * downscale_factor
 
-        image_width, image_height = cropped_img.size
-        buffered = BytesIO()
-        _cropped_img_save(cropped_img, buffered, img.format)
-        rotated_and_cropped_image_base64_str = base64.b64encode(
-            buffered.getvalue()
-        ).decode("utf-8")
+            image_width, image_height = cropped_img.size
+            buffered = BytesIO()
+            _cropped_img_save(cropped_img, buffered, img.format, image_encoding)
+            rotated_and_cropped_image_base64_str = base64.b64encode(
+                buffered.getvalue()
+            ).decode("utf-8")
 
     except Exception as e:
         # print(f"Error during image processing (rotation or cropping): {e}. Using original image data and dimensions.")
@@ -222,6 +596,8 @@ def _process_image_decoding_and_cropping(
             "utf-8"
         )
         crop_offset_x, crop_offset_y = 0, 0
+        downscale_factor = 1
+        source_width, source_height = image_width, image_height
         # You might want to log the error here: print(f"Error: {e}")
 
     return (
@@ -230,36 +606,293 @@ def _process_image_decoding_and_cropping(
         image_height,
         crop_offset_x,
         crop_offset_y,
+        downscale_factor,
+        source_width,
+        source_height,
     )
 
 
-def _generate_final_svg_content(
+# Build the <defs> entries and clipped elements embedding the image exactly once
+def _build_svg_image_elements(
     image_width: int,
     image_height: int,
-    clip_path_defs: List[str],
-    image_clips: List[str],
-) -> str:
+    image_base64_str: str,
+    region_paths: List[Tuple[str, str]],
+    svg_image_embed_mode: str,
+) -> Tuple[List[SvgElement], List[SvgElement]]:
 
-    defs_content = "\n".join(clip_path_defs)
-    clips_content = "\n".join(image_clips)
+    clip_path_defs: List[SvgElement] = []
+    image_clips: List[SvgElement] = []
 
-    final_svg_content = (
+    # The image element is kept in parts, so the image base64 string is never copied
+    image_href = f"data:{_image_mime_type(image_base64_str)};base64,"
+
+    if svg_image_embed_mode == "union":
+        # One clipPath grouping every region path, applied to a single image
+        region_path_elements = "".join(
+            f'<path d="{path_d_string}" />' for _, path_d_string in region_paths
+        )
+        clip_path_defs.append(
+            f'<clipPath id="mask_regions">{region_path_elements}</clipPath>'
+        )
+        image_clips.append(
+            (
+                f'<image width="{image_width}" height="{image_height}" clip-path="url(#mask_regions)" xlink:href="{image_href}',
+                image_base64_str,
+                '" />',
+            )
+        )
+    elif svg_image_embed_mode == "defs":
+        # The image is defined once and referenced by every clipped region
+        for region_name, path_d_string in region_paths:
+            clip_id = f"mask_{region_name.replace(' ', '_')}"
+            clip_path_defs.append(
+                f'<clipPath id="{clip_id}"><path d="{path_d_string}" /></clipPath>'
+            )
+            image_clips.append(
+                f'<use xlink:href="#cropped_image" clip-path="url(#{clip_id})" />'
+            )
+        clip_path_defs.append(
+            (
+                f'<image id="cropped_image" width="{image_width}" height="{image_height}" xlink:href="{image_href}',
+                image_base64_str,
+                '" />',
+            )
+        )
+    else:
+        raise ValueError(
+            f"Unknown SVG image embed mode '{svg_image_embed_mode}'. Expected one of {SVG_IMAGE_EMBED_MODES}."
+        )
+
+    return clip_path_defs, image_clips
+
+
+# Chunks of the elements separated by newlines, elements in parts are yielded part by part
+def _joined_element_chunks(elements: List[SvgElement]) -> Iterator[str]:
+    for i, element in enumerate(elements):
+        if i:
+            yield "\n"
+        if isinstance(element, str):
+            yield element
+        else:
+            yield from element
+
+
+# The SVG document as a sequence of chunks, in order
+def _svg_content_chunks(
+    image_width: int,
+    image_height: int,
+    clip_path_defs: List[SvgElement],
+    image_clips: List[SvgElement],
+) -> Iterator[str]:
+
+    yield (
         f'<svg viewBox="0 0 {image_width} {image_height}" preserveAspectRatio="xMidYMid meet" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">\n'
         f"    <defs>\n"
-        f"        {defs_content}\n"
+        f"        "
+    )
+    yield from _joined_element_chunks(clip_path_defs)
+    yield (
+        f"\n"
         f"    </defs>\n"
         f'    <rect x="0" y="0" width="{image_width}" height="{image_height}" fill="#FAFAFA"/>\n'
-        f"    {clips_content}\n"
-        f"</svg>"
+        f"    "
     )
-    return final_svg_content
+    yield from _joined_element_chunks(image_clips)
+    yield "\n</svg>"
+
+
+# Incremental base64 encoder writing into a single growing bytearray
+class _Base64Writer:
+
+    def __init__(self):
+        self._output = bytearray()
+        # Trailing bytes not yet forming a complete 3-byte group
+        self._pending = b""
+
+    # Encode text as UTF-8, in bounded slices so large chunks are not copied whole
+    def write(self, text: str) -> None:
+        for start in range(0, len(text), SVG_BASE64_CHUNK_SIZE):
+            data = self._pending + text[start : start + SVG_BASE64_CHUNK_SIZE].encode(
+                "utf-8"
+            )
+            complete_length = len(data) - len(data) % 3
+            self._output += binascii.b2a_base64(
+                memoryview(data)[:complete_length], newline=False
+            )
+            self._pending = data[complete_length:]
+
+    # Flush the pending bytes (with padding) and return the base64 text
+    def getvalue(self) -> str:
+        if self._pending:
+            self._output += binascii.b2a_base64(self._pending, newline=False)
+            self._pending = b""
+        return self._output.decode("ascii")
+
+
+# Stream the SVG chunks into base64 without assembling the whole SVG document
+def _encode_svg_base64(chunks: Iterable[str]) -> str:
+    writer = _Base64Writer()
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer.getvalue()
+
+
+# Mask contours of the segmentation map regions, built with the backend's path function
+def _segmentation_mask_contours(
+    segmentation_map_base64_bytes: Optional[bytes],
+    segmentation_labels: Optional[Dict[str, int]],
+    source_size: Tuple[int, int],
+    crop_offset: Tuple[int, int],
+    downscale_factor: int,
+    output_size: Tuple[int, int],
+    path_simplify_tolerance: float,
+    coordinate_precision: int,
+    points_to_smooth_svg_path: Callable[..., str],
+) -> List[Dict[str, Any]]:
+
+    if not segmentation_map_base64_bytes or not segmentation_labels:
+        return []
+
+    # NumPy is only needed once a segmentation map is processed
+    from exlib.npy.segmentation import segmentation_region_contours
+
+    try:
+        region_contours = segmentation_region_contours(
+            segmentation_map_base64_bytes,
+            segmentation_labels,
+            source_size,
+            crop_offset,
+            downscale_factor,
+            output_size,
+        )
+    except Exception:
+        # An unreadable segmentation map leaves the landmark regions only
+        return []
+
+    # One path per label, one subpath per outline: a label covering separate areas
+    # keeps all of them and its holes are cut out (the outlines of holes run the
+    # other way). The points are those of the largest area's outline.
+    mask_contours = []
+    for label_name, outlines in region_contours:
+        outlines = [
+            _simplify_points(outline, path_simplify_tolerance) for outline in outlines
+        ]
+        path_d_string = " ".join(
+            points_to_smooth_svg_path(outline, coordinate_precision)
+            for outline in outlines
+        )
+        mask_contour = {
+            "name": f"segmentation_{label_name}",
+            "path_d": path_d_string,
+            "points": _extract_raw_points(outlines[0], coordinate_precision),
+        }
+        # Every outline, for the region exclusions, which remove this key
+        if len(outlines) > 1:
+            mask_contour[CONTOUR_RINGS_KEY] = [
+                _extract_raw_points(outline, coordinate_precision)
+                for outline in outlines
+            ]
+        mask_contours.append(mask_contour)
+    return mask_contours
+
+
+# Bounding box (min_x, max_x, min_y, max_y) of [x, y] points
+def _points_bounding_box(points: List[List[float]]) -> Tuple[float, float, float, float]:
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+# Cut the regions named by region_exclusions out of each region's clip path: the
+# polygon difference of the smooth outlines the clip paths draw, both flattened, drawn
+# back with straight segments so the cut follows the excluded outline exactly. Every
+# area of a region with several is cut, by every area of the excluded region (whose
+# holes are cut out too). Regions whose bounding boxes do not overlap are skipped
+# without any geometry.
+def _apply_region_exclusions(
+    mask_contours: List[Dict[str, Any]],
+    region_exclusions: Optional[Dict[str, List[str]]],
+    coordinate_precision: int,
+) -> None:
+
+    outlines = {
+        contour["name"]: contour.pop(CONTOUR_RINGS_KEY, None) or [contour["points"]]
+        for contour in mask_contours
+    }
+    if not region_exclusions:
+        return
+
+    smooth_outlines: Dict[str, List[List[List[float]]]] = {}
+    bounding_boxes: Dict[str, Tuple[float, float, float, float]] = {}
+
+    # Flattened outlines and bounding box of a region, computed once per region
+    def smooth_outline(name: str) -> List[List[List[float]]]:
+        if name not in smooth_outlines:
+            smooth_outlines[name] = [
+                _smooth_outline_points(outline) for outline in outlines[name]
+            ]
+            bounding_boxes[name] = _points_bounding_box(
+                [point for outline in smooth_outlines[name] for point in outline]
+            )
+        return smooth_outlines[name]
+
+    for contour in mask_contours:
+        region_name = contour["name"]
+        excluded_names = [
+            name
+            for name in region_exclusions.get(region_name, ())
+            if name != region_name and name in outlines and len(outlines[name][0]) > 2
+        ]
+        if not excluded_names or len(contour["points"]) < 3:
+            continue
+
+        rings = smooth_outline(region_name)
+        for name in excluded_names:
+            excluded_outlines = smooth_outline(name)
+            min_x, max_x, min_y, max_y = bounding_boxes[region_name]
+            other_min_x, other_max_x, other_min_y, other_max_y = bounding_boxes[name]
+            if (
+                other_min_x > max_x
+                or other_max_x < min_x
+                or other_min_y > max_y
+                or other_max_y < min_y
+            ):
+                continue
+
+            # NumPy is only needed once two regions overlap
+            from exlib.npy.polygon import polygon_difference
+
+            for excluded_outline in excluded_outlines:
+                cut_rings = polygon_difference(rings, excluded_outline)
+                if cut_rings is not None:
+                    rings = cut_rings
+
+        if rings is smooth_outlines[region_name]:
+            continue
+
+        # One subpath per ring: holes run the other way, so nonzero filling cuts them
+        contour["path_d"] = " ".join(
+            _points_to_polygon_svg_path(ring, coordinate_precision) for ring in rings
+        )
+
+
+# Map an original image coordinate into the cropped (and downscaled) output image
+def _to_output_coordinate(value: float, crop_offset: int, downscale_factor: int) -> float:
+    if downscale_factor > 1:
+        return (value - crop_offset) / downscale_factor
+    return value - crop_offset
 
 
 def _extract_raw_points(
-    contour_group: List[Dict[str, float]]
+    contour_group: List[Dict[str, float]],
+    coordinate_precision: int = -1,
 ) -> List[List[float]]:
     raw_points = [
-        [p["x"], p["y"]]
+        [
+            _round_coordinate(p["x"], coordinate_precision),
+            _round_coordinate(p["y"], coordinate_precision),
+        ]
         for p in contour_group
         if isinstance(p, dict) and "x" in p and "y" in p
     ]
@@ -271,8 +904,19 @@ def process_image_data_intensive(
     loadtest_mode_enabled: bool,
     landmarks_data: Dict[str, Any],
     original_image_base64_bytes: bytes,
-    # , segmentation_map_base64_bytes: bytes
+    svg_image_embed_mode: str = "defs",
+    jpeg_lossless_transform: bool = False,
+    max_output_dimension: int = 0,
+    image_encoding: Optional[Dict[str, Any]] = None,
+    path_simplify_tolerance: float = 0.0,
+    coordinate_precision: int = -1,
+    segmentation_map_base64_bytes: Optional[bytes] = None,
+    segmentation_labels: Optional[Dict[str, int]] = None,
+    region_exclusions: Optional[Dict[str, List[str]]] = None,
 ) -> Tuple[str, List[Dict[str, Any]]]:
+    _check_coordinate_precision(coordinate_precision)
+    _check_image_encoding(image_encoding)
+
     # Calling the dummy calculation to simulate intensive processing
     if not loadtest_mode_enabled:
         _dummy_calculation()
@@ -284,51 +928,19 @@ def process_image_data_intensive(
         image_height,
         crop_offset_x,
         crop_offset_y,
+        downscale_factor,
+        source_width,
+        source_height,
     ) = _process_image_decoding_and_cropping(
-        original_image_base64_bytes, landmarks_data
+        original_image_base64_bytes,
+        landmarks_data,
+        jpeg_lossless_transform=jpeg_lossless_transform,
+        max_output_dimension=max_output_dimension,
+        image_encoding=image_encoding,
     )
 
-    # --- Conceptual use of Segmentation Map ---
-    # In a real scenario, you would parse the segmentation_map_base64_bytes here.
-    # This would involve:
-    # 1. Decoding the segmentation map:
-    #    seg_map_img = Image.open(BytesIO(base64.b64decode(segmentation_map_base64_bytes)))
-    # 2. Potentially resizing/cropping the segmentation map to match the processed image.
-    # 3. Extracting pixel regions for each semantic area (e.g., 'skin', 'nose', 'right_cheek').
-    #    This often involves checking pixel values.
-    # 4. Converting these pixel masks into vector contours (e.g., using OpenCV's findContours).
-    #    This is the most complex part and is beyond basic Pillow capabilities.
-    #
-    # For now, we will proceed with landmark-based contouring but indicate where
-    # segmentation map logic would ideally be integrated for superior mask quality.
-
-    # Placeholder for segmentation map processing
-    # print(f"Segmentation map bytes length: {len(segmentation_map_base64_bytes)}")
-    # If we had pixel values, we could define masks here.
-    # Example:
-    # seg_img_pil = Image.open(BytesIO(base64.b64decode(segmentation_map_base64_bytes))).convert("L") # Convert to grayscale
-    # Example: mask for skin where pixel_value == X
-    # skin_mask = seg_img_pil.point(lambda p: 255 if p == SKIN_PIXEL_VALUE else 0)
-    # Then use skin_mask to derive contours for the whole face.
-
     # --- Extract and Process Landmark Data (and adjust for cropping) ---
     processed_landmarks_list_of_lists = []
-    # Identify the nose region landmarks for exclusion
-    nose_landmarks_adjusted = []
-
-    # Assuming index 3 corresponds to the nose in your landmarks.txt structure
-    if len(landmarks_data.get("landmarks", [])) > 3:
-        # Original nose landmarks
-        original_nose_landmarks = landmarks_data["landmarks"][3]
-        # Adjust nose landmarks for cropping
-        for point_data in original_nose_landmarks:
-            if isinstance(point_data, dict) and "x" in point_data and "y" in point_data:
-                nose_landmarks_adjusted.append(
-                    {
-                        "x": point_data["x"] - crop_offset_x,
-                        "y": point_data["y"] - crop_offset_y,
-                    }
-                )
 
     # Process each contour group in the landmarks data
     for i, contour_group in enumerate(landmarks_data.get("landmarks", [])):
@@ -342,17 +954,19 @@ def process_image_data_intensive(
                 # Adjust the point coordinates based on the crop offsets
                 adjusted_contour_group.append(
                     {
-                        "x": point_data["x"] - crop_offset_x,
-                        "y": point_data["y"] - crop_offset_y,
+                        "x": _to_output_coordinate(
+                            point_data["x"], crop_offset_x, downscale_factor
+                        ),
+                        "y": _to_output_coordinate(
+                            point_data["y"], crop_offset_y, downscale_factor
+                        ),
                     }
                 )
 
         # Append the adjusted contour group to the processed landmarks list
         processed_landmarks_list_of_lists.append(adjusted_contour_group)
 
-    # Prepare the SVG content with clip paths for each region
-    clip_path_defs = []
-    image_clips = []
+    # Prepare the mask contour of each region, the image is embedded once afterwards
     generated_mask_contours_list = []
 
     # Iterate through the processed landmarks and create SVG clip paths
@@ -364,32 +978,11 @@ def process_image_data_intensive(
 
         region_name = region_names.get(i, f"region_{i+1}")
 
-        # Apply exclusion logic for Region 0 (right_cheek) if it's supposed to avoid the nose
-        exclude_target_landmarks = None
-
-        # This is the conceptual part for "Region No.4 (right_cheek assuming index 0) should not intersect the nose"
-        if (
-            region_name == "right_cheek" and nose_landmarks_adjusted
-        ):  # Check if it's the right cheek and nose landmarks exist
-            exclude_target_landmarks = nose_landmarks_adjusted
+        # Drop the points within the simplification tolerance of the outline
+        contour_group = _simplify_points(contour_group, path_simplify_tolerance)
 
         # Convert the contour group to a smooth SVG path
-        path_d_string = _points_to_smooth_svg_path(
-            contour_group, exclude_target_landmarks
-        )
-
-        # If the region name is not found, use a default name
-        clip_id = f"mask_{region_name.replace(' ', '_')}"
-
-        # Create the clip path definition
-        clip_path_defs.append(
-            f'<clipPath id="{clip_id}"><path d="{path_d_string}" /></clipPath>'
-        )
-
-        # Create the image clip with the rotated and cropped image
-        image_clips.append(
-            f'<image width="{image_width}" height="{image_height}" clip-path="url(#{clip_id})" xlink:href="data:image/jpeg;base64,{rotated_and_cropped_image_base64_str}" />'
-        )
+        path_d_string = _points_to_smooth_svg_path(contour_group, coordinate_precision)
 
         # Append the generated mask contour data
         generated_mask_contours_list.append(
@@ -397,23 +990,48 @@ def process_image_data_intensive(
                 "name": region_name,
                 "path_d": path_d_string,
                 "points": _extract_raw_points(
-                    contour_group
+                    contour_group, coordinate_precision
                 ),  # If the path is empty, skip this contour
             }
         )
 
-    # Prepare the final SVG content
-    final_svg_content = _generate_final_svg_content(
+    # Regions traced from the segmentation map, after the landmark regions
+    generated_mask_contours_list.extend(
+        _segmentation_mask_contours(
+            segmentation_map_base64_bytes,
+            segmentation_labels,
+            (source_width, source_height),
+            (crop_offset_x, crop_offset_y),
+            downscale_factor,
+            (image_width, image_height),
+            path_simplify_tolerance,
+            coordinate_precision,
+            _points_to_smooth_svg_path,
+        )
+    )
+
+    # Cut the excluded regions out of the clip paths (e.g. the nose out of the cheek)
+    _apply_region_exclusions(
+        generated_mask_contours_list, region_exclusions, coordinate_precision
+    )
+    region_paths = [
+        (mask_contour["name"], mask_contour["path_d"])
+        for mask_contour in generated_mask_contours_list
+    ]
+
+    # Create the clip paths and the clipped elements, embedding the image only once
+    clip_path_defs, image_clips = _build_svg_image_elements(
         image_width,
         image_height,
         rotated_and_cropped_image_base64_str,
-        clip_path_defs,
-        image_clips,
+        region_paths,
+        svg_image_embed_mode,
     )
 
-    # Encode the final SVG content to base64
-    generated_svg_base64 = base64.b64encode(final_svg_content.encode("utf-8")).decode(
-        "utf-8"
+    # Prepare the final SVG content
+    # Stream the SVG into base64, the document itself is never assembled
+    generated_svg_base64 = _encode_svg_base64(
+        _svg_content_chunks(image_width, image_height, clip_path_defs, image_clips)
     )
 
     # Return the base64 encoded SVG and the generated mask contours list
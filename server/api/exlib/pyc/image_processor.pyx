@@ -1,404 +1,714 @@
-import math
-import base64
-from io import BytesIO
-from PIL import Image, ExifTags
-from typing import List, Optional
-
-# Configuration for cropping
-CROP_PADDING = 50 # Pixels to add around the landmark bounding box
-
-# Define region names for the contours
-cdef dict region_names = {
-    0: "right_cheek",
-    1: "right_undereye",
-    2: "left_cheek",
-    3: "nose" # Assuming 0 is right_cheek and 3 is nose
-    # , Add more regions as needed
-}
-
-# Function to save the cropped image to a BytesIO buffer
-cdef void _cropped_img_save(
-    image: Image.Image, 
-    buffered: BytesIO, 
-    img_format: Optional[str]
-):
-    # Declare C types for variables
-    cdef str format_to_use
-
-    # Determine the format to use for saving the image
-    if format_str_or_none is None:
-        format_to_use = "JPEG"
+# cython: language_level=3, boundscheck=False, wraparound=False, initializedcheck=False
+from cython.view cimport array as cvarray
+from libc.float cimport DBL_MIN
+from libc.math cimport sqrt, isnan, isinf, signbit, fabs, frexp, ldexp
+from libc.stdio cimport snprintf
+from libc.stdlib cimport malloc, free, strtod
+from libc.string cimport memcpy
+from typing import List, Dict, Any, Optional, Tuple
+from exlib.py.image_processor import (
+    SVG_IMAGE_EMBED_MODES,
+    region_names,
+    _cropped_img_save,
+    _dummy_calculation,
+    _extract_raw_points,
+    _check_coordinate_precision,
+    _check_image_encoding,
+    _segmentation_mask_contours,
+    _apply_region_exclusions,
+    _build_svg_image_elements,
+    _svg_content_chunks,
+    _encode_svg_base64,
+    _process_image_decoding_and_cropping,
+)
+
+# Cython backend of image_processor.
+# Landmarks are copied once into contiguous double[:, ::1] buffers; the crop offset,
+# the simplification and the path formatting run on those buffers without the GIL
+# and write the path commands into a preallocated char buffer. Image decoding and
+# the SVG assembly are shared with the pure Python version, and the output is
+# byte-identical to it.
+
+cdef enum:
+    # Longest number written by the kernel ("-1.2345678901234567e-308" is 24 chars)
+    NUMBER_MAX_CHARS = 32
+    # Longest path command: a command letter, two numbers, separators and a trailing space
+    PATH_COMMAND_MAX_CHARS = 2 * NUMBER_MAX_CHARS + 8
+
+# Integers below this magnitude are written exactly from their digits
+cdef double INTEGER_MAX_MAGNITUDE = 1e17
+
+# Values from 1e-4 up to 2**53 are formatted with exact 128-bit integer arithmetic
+cdef double SHORTEST_DECIMAL_MAX = 9007199254740992.0
+
+# 128-bit integers are a GCC/Clang extension, other compilers only use printf
+cdef extern from *:
+    """
+    #if defined(__SIZEOF_INT128__)
+    typedef unsigned __int128 image_processor_uint128;
+    #define IMAGE_PROCESSOR_HAS_UINT128 1
+    #else
+    typedef unsigned long long image_processor_uint128;
+    #define IMAGE_PROCESSOR_HAS_UINT128 0
+    #endif
+    """
+    ctypedef unsigned long long uint128 "image_processor_uint128"
+    bint HAS_UINT128 "IMAGE_PROCESSOR_HAS_UINT128"
+
+
+# Lay out significant digits as repr() does: scientific notation when the decimal
+# point is more than 16 digits right or 4 zeros left of them, fixed notation otherwise
+cdef Py_ssize_t _write_repr_layout(
+    bint negative,
+    const char* digits,
+    int digit_count,
+    int decimal_point,
+    char* out,
+) noexcept nogil:
+    cdef Py_ssize_t length = 0
+    cdef int i
+
+    # Trailing zeros are never significant
+    while digit_count > 1 and digits[digit_count - 1] == c"0":
+        digit_count -= 1
+
+    if negative:
+        out[length] = c"-"
+        length += 1
+
+    if decimal_point <= -4 or decimal_point > 16:
+        # d.ddde+XX, with at least two exponent digits
+        out[length] = digits[0]
+        length += 1
+        if digit_count > 1:
+            out[length] = c"."
+            length += 1
+            memcpy(out + length, digits + 1, digit_count - 1)
+            length += digit_count - 1
+        length += snprintf(out + length, NUMBER_MAX_CHARS, "e%+03d", decimal_point - 1)
+    elif decimal_point <= 0:
+        # 0.000ddd
+        out[length] = c"0"
+        out[length + 1] = c"."
+        length += 2
+        for i in range(-decimal_point):
+            out[length] = c"0"
+            length += 1
+        memcpy(out + length, digits, digit_count)
+        length += digit_count
+    elif decimal_point >= digit_count:
+        # ddd000.0
+        memcpy(out + length, digits, digit_count)
+        length += digit_count
+        for i in range(decimal_point - digit_count):
+            out[length] = c"0"
+            length += 1
+        out[length] = c"."
+        out[length + 1] = c"0"
+        length += 2
     else:
-        format_to_use = format_str_or_none
-
-    try:
-        image.save(buffered, format=format_to_use)
-    except Exception:
-        # Fallback to JPEG if the preferred format fails
-        image.save(buffered, format="JPEG")
-
-# Function to simulate intensive calculations
-cdef void _dummy_calculation():
-
-    # a dummy calculation to mimic the original code's complexity
-    dummy_calculation_result = 0
-    # Declare C types for variables
-    cdef int i, j
-
-    # Simulate some intensive calculations
-    for i in range(100):
-        for j in range(1000):
-            dummy_calculation_result += (i * j) % 12345
-
-# Declare C functions with params for converting points to a smooth SVG PATH with High performance
-cdef str _points_to_smooth_svg_path(
-    list points_list, 
-    list exclude_region_landmarks_py
-):
-    # Declare C types for variables
-    cdef dict p1, p2
-    cdef float mp_x, mp_y
-    cdef int num_points, i_loop
-    cdef list adjusted_points = [] # Python list
-    cdef float ex_cx, ex_cy, sum_x, sum_y, dist, dx, dy, norm, adj_x, adj_y
-    cdef dict point_item, p_ex_item # Python dicts
-    cdef list internal_path_commands = [] # Python list of strings
-    cdef dict point_item, p_ex_item # Python dicts
-    cdef list internal_path_commands = [] # Python list of strings
-
-    # If exclude_region_landmarks is provided, we will adjust points away from it
-    if exclude_region_landmarks_py and len(points_list) > 2:
-        sum_x = 0.0
-        sum_y = 0.0
-
-        # Calculate the center of the excluded region landmarks
-        if len(exclude_region_landmarks_py) > 0:
-            for i_ex in range(len(exclude_region_landmarks_py)):
-                p_item = exclude_region_landmarks_py[i_ex]
-                if 'x' in p_item and 'y' in p_item:
-                    sum_x += p_item['x']
-                    sum_y += p_item['y']
-            ex_cx = sum_x / len(exclude_region_landmarks_py)
-            ex_cy = sum_y / len(exclude_region_landmarks_py)
-        else:
-            ex_cx, ex_cy = 0.0, 0.0
-
-        # Iterate through points to adjust them away from the excluded region center
-        for i_pt in range(len(points_list)):
-            point = points_list[i_pt]
-            dist = math.sqrt((point['x'] - ex_cx)**2 + (point['y'] - ex_cy)**2)
-            if dist < CROP_PADDING * 2: # Arbitrary "too close" threshold
-                dx = point['x'] - ex_cx
-                dy = point['y'] - ex_cy
-                if dx == 0 and dy == 0:
-                    dx, dy = 1.0, 1.0 # Prevent division by zero if point is exactly at centroid
-                norm = math.sqrt(dx*dx + dy*dy)
-                # The 'if norm == 0' block is now unreachable because dx, dy are set to 1.0, 1.0 if they were 0,0.
-                # So norm will always be sqrt(1.0*1.0 + 1.0*1.0) = sqrt(2.0) != 0 in that specific case.
-                adj_x = point["x"] + (dx / norm) * 5  # Move 5 pixels away
-                adj_y = point["y"] + (dy / norm) * 5
-                # Append the adjusted point
-                adjusted_points.append({'x': adj_x, 'y': adj_y})
+        # ddd.ddd
+        memcpy(out + length, digits, decimal_point)
+        length += decimal_point
+        out[length] = c"."
+        length += 1
+        memcpy(out + length, digits + decimal_point, digit_count - decimal_point)
+        length += digit_count - decimal_point
+    return length
+
+
+# Write the decimal digits of an unsigned integer, return the number of chars written
+cdef Py_ssize_t _write_digits(unsigned long long value, char* out) noexcept nogil:
+    cdef char reversed_digits[NUMBER_MAX_CHARS]
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t i
+    while True:
+        reversed_digits[count] = <char>(c"0" + value % 10)
+        count += 1
+        value //= 10
+        if value == 0:
+            break
+    for i in range(count):
+        out[i] = reversed_digits[count - 1 - i]
+    return count
+
+
+# Whether a decimal at the given scaled distance converts back to the value.
+# In scaled units the rounding interval is power_of_ten / 2 wide on each side,
+# power_of_ten / 4 below powers of two; ties go to the even mantissa.
+cdef inline bint _within_rounding_interval(
+    uint128 distance,
+    bint above,
+    uint128 power_of_ten,
+    bint round_half_even,
+    bint power_of_two,
+) noexcept nogil:
+    cdef uint128 doubled = (4 if power_of_two and not above else 2) * distance
+    return doubled < power_of_ten or (doubled == power_of_ten and round_half_even)
+
+
+# Write a value in [1e-4, 2**53) as repr() would, or return 0 if it cannot be done here.
+# The value is mantissa / 2**shift; for each number of decimals, the decimals nearest
+# to it are checked exactly (in 128-bit integers) against the half-ulp rounding
+# interval, the first that converts back to the value is the shortest one, as repr() picks.
+cdef Py_ssize_t _write_shortest_decimal(double value, char* out) noexcept nogil:
+    cdef int binary_exponent, decimals, shift, digit_count
+    cdef unsigned long long mantissa
+    cdef uint128 power_of_ten = 1
+    cdef uint128 scaled, unit, quotient, remainder, candidate
+    cdef bint round_half_even, power_of_two, below, above
+    cdef char digits[NUMBER_MAX_CHARS]
+
+    if not HAS_UINT128:
+        return 0
+
+    mantissa = <unsigned long long>ldexp(frexp(fabs(value), &binary_exponent), 53)
+    shift = 53 - binary_exponent
+    unit = (<uint128>1) << shift
+    round_half_even = mantissa % 2 == 0
+    # The gap to the next smaller double is halved at powers of two
+    power_of_two = mantissa == (<unsigned long long>1) << 52
+
+    for decimals in range(23):
+        scaled = <uint128>mantissa * power_of_ten
+        quotient = scaled >> shift
+        remainder = scaled - (quotient << shift)
+
+        below = _within_rounding_interval(
+            remainder, False, power_of_ten, round_half_even, power_of_two
+        )
+        above = _within_rounding_interval(
+            unit - remainder, True, power_of_ten, round_half_even, power_of_two
+        )
+        if below and above:
+            # Both convert back: the nearest one, the even one on a tie
+            if 2 * remainder < unit or (2 * remainder == unit and quotient % 2 == 0):
+                candidate = quotient
             else:
-                adjusted_points.append(point)
+                candidate = quotient + 1
+            break
+        if below or above:
+            candidate = quotient if below else quotient + 1
+            break
+        power_of_ten *= 10
     else:
-        adjusted_points = points_list
+        return 0
 
-    # Now generate the smooth path using the adjusted points
-    num_points = len(adjusted_points)
-    if num_points == 0:
-        return ""
-    if num_points == 1:
-        return f"M {adjusted_points[0]['x']} {adjusted_points[0]['y']} Z"
+    digit_count = _write_digits(<unsigned long long>candidate, digits)
+    return _write_repr_layout(
+        value < 0, digits, digit_count, digit_count - decimals, out
+    )
 
-    # Start the path with the first point
-    internal_path_commands.append(f"M {adjusted_points[0]['x']} {adjusted_points[0]['y']}")
-    
-    # If there are only two points, we can just draw a line to the second point
-    if num_points == 2:
-        internal_path_commands.append(f"L {adjusted_points[1]['x']} {adjusted_points[1]['y']}")
-    else:
-        # First segment (P0 to midpoint of P0 and P1)
-        p1 = adjusted_points[0]
-        p2 = adjusted_points[1]
-        mp_x = (p1['x'] + p2['x']) / 2.0
-        mp_y = (p1['y'] + p2['y']) / 2.0
-        # Use the first point as control for the first segment
-        internal_path_commands.append(f"Q {p1['x']} {p1['y']}, {mp_x} {mp_y}")
-
-        # Intermediate segments (midpoint to midpoint, using current point as control)
-        for i in range(1, num_points - 1):
-            p1 = adjusted_points[i]
-            p2 = adjusted_points[i+1]
-            mp_x = (<float>p1['x'] + <float>p2['x']) / 2.0
-            mp_y = (<float>p1['y'] + <float>p2['y']) / 2.0
-            internal_path_commands.append(f"T {mp_x} {mp_y}")
-
-        # Last segment (midpoint between last and first, using last point as control)
-        p_last = adjusted_points[num_points - 1]
-        p_first = adjusted_points[0] # Use the original first adjusted point for closure
-        mp_x_last = (p_last['x'] + p_first['x']) / 2.0
-        mp_x_last = (p_last['y'] + p_first['y']) / 2.0
-        # Use the last point as control for the final segment
-        internal_path_commands.append(f"T {mp_x_last} {mp_y_last}")
-        # Close the path back to the starting point.
-        internal_path_commands.append(f"Q {p_first['x']} {p_first['y']}, {adjusted_points[0]['x']} {adjusted_points[0]['y']}")
-
-    # The "Z" command will close the path.
-    internal_path_commands.append("Z")
-
-    return " ".join(internal_path_commands)
-
-cpdef tuple _process_image_decoding_and_cropping(
-    bytes original_image_base64_bytes, 
-    dict landmarks_data
-):
-    # Declare C types for variables
-    cdef int image_width, image_height
-    cdef int crop_offset_x, crop_offset_y
-    cdef str rotated_and_cropped_image_base64_str = ""
-    cdef bytes image_bytes
-    cdef object img # PIL Image object
-    cdef object exif_data # Dictionary from img._getexif()
-    cdef object orientation_tag_id_obj # Can be int or None
-    cdef int orientation_tag_id_val # For casting orientation_tag_id_obj
-    cdef list landmarks_list_of_lists # Python list
-    cdef float min_x, max_x, min_y, max_y
-    cdef int current_img_width, current_img_height
-    cdef int crop_left, crop_top, crop_right, crop_bottom
-    cdef object cropped_img # PIL Image object
-    cdef object buffered # BytesIO object
-    cdef dict point_data_item # For iterating through landmarks
-
-    image_width, image_height = 0, 0
-    crop_offset_x, crop_offset_y = 0, 0
-    rotated_and_cropped_image_base64_str = ""
 
-    try:
-        # Decode the base64 image bytes
-        image_bytes = base64.b64decode(original_image_base64_bytes)
-        img = Image.open(BytesIO(image_bytes))
-
-        exif_data = img._getexif()
-        if exif_data:
-            # Need to iterate Python dict in Cython
-            for orientation_tag_id_obj in ExifTags.TAGS.keys():
-                if ExifTags.TAGS[orientation_tag_id_obj] == "Orientation":
-                    break
-            else: # Executed if loop completes without break
-                orientation_tag_id_obj = None
-
-            if orientation_tag_id_obj is not None and orientation_tag_id_obj in exif_data:
-                orientation_tag_id_val = <int>orientation_tag_id_obj # Cast to int
-                if exif_data[orientation_tag_id_val] == 3:
-                    img = img.rotate(180, expand=True)
-                elif exif_data[orientation_tag_id_val] == 6:
-                    img = img.rotate(270, expand=True)
-                elif exif_data[orientation_tag_id_val] == 8:
-                    img = img.rotate(90, expand=True)
-
-        landmarks_list_of_lists = landmarks_data.get("landmarks", [])
-
-        min_x, max_x = float('inf'), float('-inf')
-        min_y, max_y = float('inf'), float('-inf')
-
-        # Iterate through the landmarks to find the bounding box
-        for i_group in range(len(landmarks_list_of_lists)):
-            for point_data_item in landmarks_list_of_lists[i_group]: # Nested iteration
-                if isinstance(point_data_item, dict) and 'x' in point_data_item and 'y' in point_data_item:
-                    min_x = min(min_x, <float>point_data_item['x'])
-                    max_x = max(max_x, <float>point_data_item['x'])
-                    min_y = min(min_y, <float>point_data_item['y'])
-                    max_y = max(max_y, <float>point_data_item['y'])
-
-        current_img_width, current_img_height = img.size
-
-        crop_left = max(0, <int>math.floor(min_x - CROP_PADDING))
-        crop_top = max(0, <int>math.floor(min_y - CROP_PADDING))
-        crop_right = min(current_img_width, <int>math.ceil(max_x + CROP_PADDING))
-        crop_bottom = min(current_img_height, <int>math.ceil(max_y + CROP_PADDING))
-
-        if (min_x == float('inf') or min_y == float('inf') or crop_right <= crop_left or crop_bottom <= crop_top):
-            cropped_img = img
-            crop_offset_x, crop_offset_y = 0, 0
-        else:
-            cropped_img = img.crop((crop_left, crop_top, crop_right, crop_bottom))
-            crop_offset_x, crop_offset_y = crop_left, crop_top
-
-        image_width, image_height = cropped_img.size
-        buffered = BytesIO()
-        _cropped_img_save(cropped_img, buffered, img.format) # Call existing helper
-        rotated_and_cropped_image_base64_str = base64.b64encode(
-            buffered.getvalue()
-        ).decode('utf-8')
-
-    except Exception as e:
-        # Fallback in case of error
-        image_dimensions_from_landmarks = landmarks_data.get("dimensions", [1024, 1024])
-        image_width = int(image_dimensions_from_landmarks[0])
-        image_height = int(image_dimensions_from_landmarks[1])
-        rotated_and_cropped_image_base64_str = original_image_base64_bytes.decode('utf-8')
-        crop_offset_x, crop_offset_y = 0, 0
-        # print(f"Error during image processing (rotation or cropping): {e}")
-
-    return (
-        rotated_and_cropped_image_base64_str,
-        image_width,
-        image_height,
-        crop_offset_x,
-        crop_offset_y,
+# Write a non-zero finite value as repr() would, using printf to find the shortest digits
+cdef Py_ssize_t _write_printf_repr(double value, char* out) noexcept nogil:
+    cdef char scientific[NUMBER_MAX_CHARS]
+    cdef char digits[NUMBER_MAX_CHARS]
+    cdef int precision, digit_count
+    cdef char* cursor
+
+    # Shortest round-tripping digits: 15 significant digits are always exact for
+    # the shortest representation, 16 or 17 are only needed when 15 do not round-trip.
+    # Subnormals carry fewer significant bits and are searched from a single digit.
+    for precision in range(0 if fabs(value) < DBL_MIN else 14, 17):
+        snprintf(scientific, NUMBER_MAX_CHARS, "%.*e", precision, fabs(value))
+        if strtod(scientific, NULL) == fabs(value):
+            break
+
+    # Split "d.ddddde+XX" into its digits and exponent
+    digit_count = 0
+    cursor = scientific
+    while cursor[0] != c"e":
+        if cursor[0] != c".":
+            digits[digit_count] = cursor[0]
+            digit_count += 1
+        cursor += 1
+    return _write_repr_layout(
+        value < 0, digits, digit_count, <int>strtod(cursor + 1, NULL) + 1, out
     )
 
-cpdef str _generate_final_svg_content(
-    int image_width,
-    int image_height,
-    str rotated_and_cropped_image_base64_str,
-    list clip_path_defs, # List of Python strings
-    list image_clips # List of Python strings
-):
-    # Declare C types for local variables
-    cdef str defs_content, clips_content, final_svg_content
-
-    defs_content = "\n".join(clip_path_defs)
-    clips_content = "\n".join(image_clips)
-
-    final_svg_content_py = (
-        f'<svg viewBox="0 0 {image_width} {image_height}" preserveAspectRatio="xMidYMid meet" xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">\n'
-        f'    <defs>\n'
-        f'        {defs_content_py}\n'
-        f'    </defs>\n'
-        f'    <rect x="0" y="0" width="{image_width}" height="{image_height}" fill="#FAFAFA"/>\n'
-        f'    {clips_content_py}\n'
-        f'</svg>'
-    )
 
-    return c_final_svg_content
+# Write value as Python's repr() of a float would, return the number of chars written
+cdef Py_ssize_t _write_float_repr(double value, char* out) noexcept nogil:
+    cdef Py_ssize_t length
+    if isnan(value):
+        memcpy(out, b"nan", 3)
+        return 3
+    if isinf(value):
+        if value < 0:
+            memcpy(out, b"-inf", 4)
+            return 4
+        memcpy(out, b"inf", 3)
+        return 3
+    if value == 0:
+        if signbit(value):
+            memcpy(out, b"-0.0", 4)
+            return 4
+        memcpy(out, b"0.0", 3)
+        return 3
+
+    # Coordinates and midpoints are formatted without printf
+    if 1e-4 <= fabs(value) < SHORTEST_DECIMAL_MAX:
+        length = _write_shortest_decimal(value, out)
+        if length:
+            return length
+    return _write_printf_repr(value, out)
+
+
+# round(value, precision): printf rounds the exact binary value correctly, as round() does
+cdef double _round_decimal(double value, int precision) noexcept nogil:
+    cdef char buffer[NUMBER_MAX_CHARS * 2]
+    # Doubles this large have no fractional digits left to round
+    if isnan(value) or isinf(value) or fabs(value) >= SHORTEST_DECIMAL_MAX:
+        return value
+    snprintf(buffer, sizeof(buffer), "%.*f", precision, value)
+    return strtod(buffer, NULL)
+
+
+# Write a coordinate, integers given as int are written without a fractional part;
+# floats are rounded to precision decimals first unless precision is negative
+cdef Py_ssize_t _write_number(
+    double value, bint is_integer, int precision, char* out
+) noexcept nogil:
+    if is_integer and fabs(value) < INTEGER_MAX_MAGNITUDE:
+        if value < 0:
+            out[0] = c"-"
+            return 1 + _write_digits(<unsigned long long>(-value), out + 1)
+        return _write_digits(<unsigned long long>value, out)
+    if precision >= 0 and not is_integer:
+        value = _round_decimal(value, precision)
+    return _write_float_repr(value, out)
+
+
+# Write "<command> <x> <y>" followed by a space
+cdef Py_ssize_t _write_command(
+    char command,
+    double x,
+    bint x_is_integer,
+    double y,
+    bint y_is_integer,
+    int precision,
+    char* out,
+) noexcept nogil:
+    cdef Py_ssize_t length = 0
+    out[0] = command
+    out[1] = c" "
+    length = 2
+    length += _write_number(x, x_is_integer, precision, out + length)
+    out[length] = c" "
+    length += 1
+    length += _write_number(y, y_is_integer, precision, out + length)
+    out[length] = c" "
+    return length + 1
+
+
+# Subtract the crop offset from every coordinate, then divide by the downscale factor
+cdef void _translate(
+    double[:, ::1] coordinates,
+    Py_ssize_t count,
+    double offset_x,
+    double offset_y,
+    double downscale_factor,
+) noexcept nogil:
+    cdef Py_ssize_t i
+    for i in range(count):
+        coordinates[i, 0] -= offset_x
+        coordinates[i, 1] -= offset_y
+    if downscale_factor > 1:
+        for i in range(count):
+            coordinates[i, 0] /= downscale_factor
+            coordinates[i, 1] /= downscale_factor
+
+
+# Ramer-Douglas-Peucker on a point range, compacting the kept points to its start;
+# same operations as the pure Python version. Return the end of the kept points.
+# segments holds 2 * (end - start) indices, keep end - start flags.
+cdef Py_ssize_t _simplify(
+    double[:, ::1] coordinates,
+    unsigned char[:, ::1] integer_mask,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    double tolerance,
+    Py_ssize_t* segments,
+    unsigned char* keep,
+) noexcept nogil:
+    cdef Py_ssize_t num_points = end - start
+    cdef Py_ssize_t segment_count = 1
+    cdef Py_ssize_t i, j, first, last, max_index
+    cdef double ax, ay, dx, dy, px, py, length, distance, max_distance
+
+    if tolerance <= 0 or num_points < 3:
+        return end
+
+    for i in range(num_points):
+        keep[i] = 0
+    keep[0] = 1
+    keep[num_points - 1] = 1
+    segments[0] = 0
+    segments[1] = num_points - 1
+    while segment_count > 0:
+        segment_count -= 1
+        first = segments[2 * segment_count]
+        last = segments[2 * segment_count + 1]
+        ax = coordinates[start + first, 0]
+        ay = coordinates[start + first, 1]
+        dx = coordinates[start + last, 0] - ax
+        dy = coordinates[start + last, 1] - ay
+        length = sqrt(dx * dx + dy * dy)
+
+        # Farthest point from the segment (from its first point if the segment is empty)
+        max_distance = -1.0
+        max_index = first
+        for i in range(first + 1, last):
+            px = coordinates[start + i, 0]
+            py = coordinates[start + i, 1]
+            if length == 0:
+                distance = sqrt((px - ax) * (px - ax) + (py - ay) * (py - ay))
+            else:
+                distance = fabs(dx * (ay - py) - (ax - px) * dy) / length
+            if distance > max_distance:
+                max_distance = distance
+                max_index = i
+
+        if max_distance > tolerance:
+            keep[max_index] = 1
+            segments[2 * segment_count] = first
+            segments[2 * segment_count + 1] = max_index
+            segments[2 * segment_count + 2] = max_index
+            segments[2 * segment_count + 3] = last
+            segment_count += 2
+
+    # Compact the kept points in place, in their original order
+    j = start
+    for i in range(num_points):
+        if keep[i]:
+            coordinates[j, 0] = coordinates[start + i, 0]
+            coordinates[j, 1] = coordinates[start + i, 1]
+            integer_mask[j, 0] = integer_mask[start + i, 0]
+            integer_mask[j, 1] = integer_mask[start + i, 1]
+            j += 1
+    return j
+
+
+# Write the smooth SVG path of a contour into out, return its length
+cdef Py_ssize_t _write_smooth_svg_path(
+    const double[:, ::1] points,
+    const unsigned char[:, ::1] integer_mask,
+    Py_ssize_t num_points,
+    int precision,
+    char* out,
+) noexcept nogil:
+    cdef Py_ssize_t i, next_i
+    cdef Py_ssize_t length = 0
+
+    if num_points == 0:
+        return 0
+
+    # Move to the first point
+    length += _write_command(
+        c"M", points[0, 0], integer_mask[0, 0], points[0, 1], integer_mask[0, 1], precision, out
+    )
 
-cpdef list _extract_raw_points(
-    list contour_group
+    if num_points == 2:
+        length += _write_command(
+            c"L", points[1, 0], integer_mask[1, 0], points[1, 1], integer_mask[1, 1], precision, out + length
+        )
+    elif num_points > 2:
+        # First segment, using the first point as control: "Q x0 y0, mx my"
+        length += _write_command(
+            c"Q", points[0, 0], integer_mask[0, 0], points[0, 1], integer_mask[0, 1], precision, out + length
+        )
+        out[length - 1] = c","
+        out[length] = c" "
+        length += 1
+        length += _write_number(
+            (points[0, 0] + points[1, 0]) / 2.0, False, precision, out + length
+        )
+        out[length] = c" "
+        length += 1
+        length += _write_number(
+            (points[0, 1] + points[1, 1]) / 2.0, False, precision, out + length
+        )
+        out[length] = c" "
+        length += 1
+
+        # Midpoint to midpoint, the last one wraps around to the first point
+        for i in range(1, num_points):
+            next_i = i + 1 if i + 1 < num_points else 0
+            length += _write_command(
+                c"T",
+                (points[i, 0] + points[next_i, 0]) / 2.0,
+                False,
+                (points[i, 1] + points[next_i, 1]) / 2.0,
+                False,
+                precision,
+                out + length,
+            )
+
+    out[length] = c"Z"
+    return length + 1
+
+
+# Copy the landmark groups into contiguous coordinate and integer mask buffers
+cdef tuple _landmarks_to_buffers(list landmarks_list_of_lists):
+    cdef list group_bounds = [0]
+    cdef Py_ssize_t count = 0
+    cdef Py_ssize_t index = 0
+    cdef double[:, ::1] coordinates
+    cdef unsigned char[:, ::1] integer_mask
+    cdef object point_data, x, y
+
+    for contour_group in landmarks_list_of_lists:
+        for point_data in contour_group:
+            if isinstance(point_data, dict) and "x" in point_data and "y" in point_data:
+                count += 1
+        group_bounds.append(count)
+
+    # Zero-sized buffers are not allowed, keep at least one row
+    coordinates = cvarray(shape=(max(count, 1), 2), itemsize=sizeof(double), format="d")
+    integer_mask = cvarray(shape=(max(count, 1), 2), itemsize=sizeof(unsigned char), format="B")
+
+    for contour_group in landmarks_list_of_lists:
+        for point_data in contour_group:
+            if isinstance(point_data, dict) and "x" in point_data and "y" in point_data:
+                x = point_data["x"]
+                y = point_data["y"]
+                coordinates[index, 0] = x
+                coordinates[index, 1] = y
+                integer_mask[index, 0] = type(x) is int
+                integer_mask[index, 1] = type(y) is int
+                index += 1
+
+    return coordinates, integer_mask, group_bounds
+
+
+# Raw [x, y] points of a range, with the original int/float types
+cdef list _buffer_to_raw_points(
+    const double[:, ::1] coordinates,
+    const unsigned char[:, ::1] integer_mask,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    int precision,
 ):
-    # Declare C types for local variables
+    cdef Py_ssize_t i
     cdef list raw_points = []
-    cdef dict p_item
-
-    for p_item in contour_group:
-        if isinstance(p_item, dict) and 'x' in p_item and 'y' in p_item:
-            raw_points.append([<float>p_item['x'], <float>p_item['y']])
+    for i in range(start, end):
+        raw_points.append(
+            [
+                int(coordinates[i, 0]) if integer_mask[i, 0] else _round_value(coordinates[i, 0], precision),
+                int(coordinates[i, 1]) if integer_mask[i, 1] else _round_value(coordinates[i, 1], precision),
+            ]
+        )
     return raw_points
 
-cpdef tuple process_image_data_intensive(
-    bool loadtest_mode_enabled,
-    dict landmarks_data,
-    bytes original_image_base64_bytes
+
+# Rounded float for the contour points, as the path numbers are
+cdef inline double _round_value(double value, int precision) noexcept:
+    if precision < 0:
+        return value
+    return _round_decimal(value, precision)
+
+
+# Build the path string of one contour range, releasing the GIL while formatting
+cdef str _smooth_svg_path_from_buffers(
+    const double[:, ::1] coordinates,
+    const unsigned char[:, ::1] integer_mask,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    int precision,
+    char* path_buffer,
 ):
-    # Declare C types for variables
-    cdef int i, i_group
-    cdef list clip_path_defs = []
-    cdef list image_clips = []
-    cdef list generated_mask_contours_list = []
-    cdef list contour_group_py
-    cdef str path_d_string # Python string for path
-    cdef list raw_points
-    cdef str region_name, clip_id
-    cdef list processed_landmarks_list_of_lists = []
-    cdef list adjusted_contour_group
-    cdef list nose_landmarks_adjusted = []
-    cdef list exclude_target_landmarks
-    cdef str final_svg_content # Python string for final SVG
-    cdef str generated_svg_base64 # Final base64 encoded SVG
-
-    # Call the dummy calculation to simulate intensive processing
+    cdef Py_ssize_t length
+    cdef const double[:, ::1] points = coordinates[start:end]
+    cdef const unsigned char[:, ::1] points_integer_mask = integer_mask[start:end]
+    with nogil:
+        length = _write_smooth_svg_path(
+            points, points_integer_mask, end - start, precision, path_buffer
+        )
+    return path_buffer[:length].decode("ascii")
+
+
+# Helper function to convert points to a smooth SVG path
+def _points_to_smooth_svg_path(
+    points_list: List[Dict[str, float]],
+    coordinate_precision: int = -1,
+) -> str:
+    cdef double[:, ::1] coordinates
+    cdef unsigned char[:, ::1] integer_mask
+    cdef Py_ssize_t count
+    cdef char* path_buffer
+
+    coordinates, integer_mask, group_bounds = _landmarks_to_buffers([points_list])
+    count = group_bounds[1]
+    if count == 0:
+        return ""
+
+    path_buffer = <char*>malloc((count + 4) * PATH_COMMAND_MAX_CHARS)
+    if path_buffer == NULL:
+        raise MemoryError()
+    try:
+        return _smooth_svg_path_from_buffers(
+            coordinates, integer_mask, 0, count, coordinate_precision, path_buffer
+        )
+    finally:
+        free(path_buffer)
+
+
+# Function to process image data and landmarks, performing cropping and SVG generation
+def process_image_data_intensive(
+    loadtest_mode_enabled: bool,
+    landmarks_data: Dict[str, Any],
+    original_image_base64_bytes: bytes,
+    svg_image_embed_mode: str = "defs",
+    jpeg_lossless_transform: bool = False,
+    max_output_dimension: int = 0,
+    image_encoding: Optional[Dict[str, Any]] = None,
+    path_simplify_tolerance: float = 0.0,
+    coordinate_precision: int = -1,
+    segmentation_map_base64_bytes: Optional[bytes] = None,
+    segmentation_labels: Optional[Dict[str, int]] = None,
+    region_exclusions: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    cdef double[:, ::1] coordinates
+    cdef unsigned char[:, ::1] integer_mask
+    cdef double min_x, max_x, min_y, max_y, offset_x, offset_y, scale
+    cdef Py_ssize_t i, count, start, end, largest_group = 0
+    cdef double tolerance = path_simplify_tolerance
+    cdef int precision = coordinate_precision
+    cdef char* path_buffer
+    cdef Py_ssize_t* segments
+    cdef unsigned char* keep
+
+    _check_coordinate_precision(coordinate_precision)
+    _check_image_encoding(image_encoding)
+
+    # Calling the dummy calculation to simulate intensive processing
     if not loadtest_mode_enabled:
         _dummy_calculation()
 
-    # Image Processing: Decode base64, Auto-rotate, and Crop
+    landmarks_list_of_lists = landmarks_data.get("landmarks", [])
+    coordinates, integer_mask, group_bounds = _landmarks_to_buffers(
+        landmarks_list_of_lists
+    )
+    count = group_bounds[len(group_bounds) - 1]
+
+    # Bounding box of every landmark in one pass
+    min_x, max_x = float("inf"), float("-inf")
+    min_y, max_y = float("inf"), float("-inf")
+    with nogil:
+        for i in range(count):
+            min_x = min(min_x, coordinates[i, 0])
+            max_x = max(max_x, coordinates[i, 0])
+            min_y = min(min_y, coordinates[i, 1])
+            max_y = max(max_y, coordinates[i, 1])
+
     (
         rotated_and_cropped_image_base64_str,
         image_width,
         image_height,
         crop_offset_x,
         crop_offset_y,
+        downscale_factor,
+        source_width,
+        source_height,
     ) = _process_image_decoding_and_cropping(
-        original_image_base64_bytes, landmarks_data
+        original_image_base64_bytes,
+        landmarks_data,
+        (min_x, max_x, min_y, max_y),
+        jpeg_lossless_transform=jpeg_lossless_transform,
+        max_output_dimension=max_output_dimension,
+        image_encoding=image_encoding,
     )
 
-    # Extract and Process Landmark Data (and adjust for cropping)
-    if len(landmarks_data.get('landmarks', [])) > 3:
-        original_nose_landmarks = landmarks_data['landmarks'][3]
-        for i in range(len(original_nose_landmarks)):
-            p_data = original_nose_landmarks[i]
-            if isinstance(p_data, dict) and 'x' in p_data and 'y' in p_data:
-                nose_landmarks_adjusted.append({
-                    'x': <float>p_data['x'] - crop_offset_x,
-                    'y': <float>p_data['y'] - crop_offset_y
-                })
-
-    # Process each group of landmarks
-    landmarks_list_of_lists = landmarks_data.get('landmarks', [])
-
-    # Adjust each contour group based on the crop offsets
-    for i_group in range(len(landmarks_list_of_lists)):
-        
-        contour_group_py = landmarks_list_of_lists[i_group]
-        adjusted_contour_group = []
-
-        # check isinstance of contour_group_py
-        for p_data in contour_group_py:
-            if isinstance(p_data, dict) and 'x' in p_data and 'y' in p_data:
-                adjusted_contour_group.append({
-                    'x': <float>p_data['x'] - crop_offset_x,
-                    'y': <float>p_data['y'] - crop_offset_y
-                })
-        # append the adjusted contour group to the processed list
-        processed_landmarks_list_of_lists.append(adjusted_contour_group)
-
-    # Generate SVG with ClipPaths
-    for i in range(len(processed_landmarks_list_of_lists)):
-        contour_group_adjusted = processed_landmarks_list_of_lists[i]
-        
-        if not contour_group_adjusted:
-            continue
-        
-        region_name = region_names.get(i, f"region_{i+1}")
-        
-        if region_name == "right_cheek" and nose_landmarks_adjusted:
-            exclude_target_landmarks = nose_landmarks_adjusted
-        else:
-            exclude_target_landmarks = []
-
-        # Call _points_to_smooth_svg_path, which now returns Python str
-        path_d_string = _points_to_smooth_svg_path(
-            contour_group_adjusted, exclude_target_landmarks
-        )
-        
-        # Extract raw points for the contour group
-        raw_points = _extract_raw_points(contour_group_adjusted)
-        
-        clip_id = f"mask_{region_name.replace(' ', '_')}"
-
-        clip_path_defs.append(f'<clipPath id="{clip_id}"><path d="{path_d_string}" /></clipPath>')
-        
-        image_clips.append(f'<image width="{image_width}" height="{image_height}" clip-path="url(#{clip_id})" xlink:href="data:image/jpeg;base64,{rotated_and_cropped_image_base64_str}" />')
-
-        generated_mask_contours_list.append(
-            {
-                "name": region_name,
-                "path_d": path_d_string,
-                "points": raw_points
-            }
+    # Adjust every landmark for cropping (integer offsets keep integers)
+    offset_x, offset_y, scale = crop_offset_x, crop_offset_y, downscale_factor
+    with nogil:
+        _translate(coordinates, count, offset_x, offset_y, scale)
+
+    # Downscaled coordinates are floats
+    if downscale_factor > 1:
+        integer_mask[:, :] = 0
+
+    # Path buffer and scratch buffers sized for the largest contour, reused by every region
+    for i in range(len(landmarks_list_of_lists)):
+        largest_group = max(largest_group, group_bounds[i + 1] - group_bounds[i])
+    path_buffer = <char*>malloc((largest_group + 4) * PATH_COMMAND_MAX_CHARS)
+    segments = <Py_ssize_t*>malloc((2 * largest_group + 2) * sizeof(Py_ssize_t))
+    keep = <unsigned char*>malloc(largest_group + 1)
+    if path_buffer == NULL or segments == NULL or keep == NULL:
+        free(path_buffer)
+        free(segments)
+        free(keep)
+        raise MemoryError()
+
+    generated_mask_contours_list = []
+    try:
+        for i in range(len(landmarks_list_of_lists)):
+            start, end = group_bounds[i], group_bounds[i + 1]
+
+            # Skip empty contour groups
+            if start == end:
+                continue
+
+            region_name = region_names.get(i, f"region_{i+1}")
+
+            # Drop the points within the simplification tolerance of the outline
+            with nogil:
+                end = _simplify(
+                    coordinates, integer_mask, start, end, tolerance, segments, keep
+                )
+
+            path_d_string = _smooth_svg_path_from_buffers(
+                coordinates, integer_mask, start, end, precision, path_buffer
+            )
+
+            generated_mask_contours_list.append(
+                {
+                    "name": region_name,
+                    "path_d": path_d_string,
+                    "points": _buffer_to_raw_points(
+                        coordinates, integer_mask, start, end, precision
+                    ),
+                }
+            )
+    finally:
+        free(path_buffer)
+        free(segments)
+        free(keep)
+
+    # Regions traced from the segmentation map, after the landmark regions
+    generated_mask_contours_list.extend(
+        _segmentation_mask_contours(
+            segmentation_map_base64_bytes,
+            segmentation_labels,
+            (source_width, source_height),
+            (crop_offset_x, crop_offset_y),
+            downscale_factor,
+            (image_width, image_height),
+            path_simplify_tolerance,
+            coordinate_precision,
+            _points_to_smooth_svg_path,
         )
+    )
+
+    # Cut the excluded regions out of the clip paths (e.g. the nose out of the cheek)
+    _apply_region_exclusions(
+        generated_mask_contours_list, region_exclusions, coordinate_precision
+    )
+    region_paths = [
+        (mask_contour["name"], mask_contour["path_d"])
+        for mask_contour in generated_mask_contours_list
+    ]
 
-    # Prepare the final SVG content
-    final_svg_content = _generate_final_svg_content(
+    clip_path_defs, image_clips = _build_svg_image_elements(
         image_width,
         image_height,
         rotated_and_cropped_image_base64_str,
-        clip_path_defs,
-        image_clips
+        region_paths,
+        svg_image_embed_mode,
     )
-    
-    # Encode the final SVG content to base64
-    generated_svg_base64 = base64.b64encode(final_svg_content.encode('utf-8')).decode('utf-8')
-
-    # Return the base64 encoded SVG and the generated mask contours list
-    return generated_svg_base64, generated_mask_contours_list
\ No newline at end of file
+    # Stream the SVG into base64, the document itself is never assembled
+    generated_svg_base64 = _encode_svg_base64(
+        _svg_content_chunks(image_width, image_height, clip_path_defs, image_clips)
+    )
+    return generated_svg_base64, generated_mask_contours_list
@@ -1,41 +1,28 @@
 import base64
+import shutil
 import pytest
 from PIL import Image
 from io import BytesIO
 from services.logger import console
+from services.image_backends import IMAGE_PROCESSOR_BACKEND_MODULES
+from exlib.py.image_processor import _smooth_outline_points, _points_to_polygon_svg_path
 
-# Import the image processing function
-# This block attempts to import the compiled Cython module first from the new path.
-# If the Cython module (image_processor.so/.pyd within exlib/pyc) is found and successfully imported,
-# it will use that for performance.
-# If an ImportError occurs, it will fall back to importing the
-# pure Python version of image_processor.py from exlib/py.
-#
-# IMPORTANT: Ensure your project structure includes:
-# - exlib/
-# - exlib/__init__.py (empty file)
-# - exlib/pyc/
-# - exlib/pyc/__init__.py (empty file)
-# - exlib/pyc/image_processor.pyx (your Cython source)
-# - exlib/py/
-# - exlib/py/__init__.py (empty file)
-# - exlib/py/image_processor.py (your pure Python source)
-#
-# After compiling image_processor.pyx, the compiled .so/.pyd file will appear
-# alongside image_processor.pyx in exlib/pyc.
-try:
-    from pyc import image_processor
+# The region exclusion tests need NumPy, as the polygon difference does
+np = pytest.importorskip("numpy")
+from exlib.npy.polygon import polygon_difference, _locate_points, _signed_area
 
-    console.log(
-        "[bold green]Successfully imported Cythonized image_processor from pyc.[/bold green]"
-    )
-except ImportError:
-    # Fallback to pure Python version if Cython module is not found.
-    from py import image_processor
 
+# Run every test against each image processor backend (py, pyc, npy).
+# Backends that are not available here (pyc not compiled, NumPy missing) are skipped.
+@pytest.fixture(params=list(IMAGE_PROCESSOR_BACKEND_MODULES))
+def image_processor(request):
+    image_processor = pytest.importorskip(
+        IMAGE_PROCESSOR_BACKEND_MODULES[request.param]
+    )
     console.log(
-        "[bold yellow]Cythonized image_processor not found. Using pure Python version from py.[/bold yellow]"
+        f"[bold green]Testing image_processor backend {request.param}.[/bold green]"
     )
+    return image_processor
 
 
 def create_test_image(width=100, height=100, color=(255, 0, 0)) -> bytes:
@@ -49,7 +36,16 @@ def encode_image_to_base64_bytes(img_bytes) -> bytes:
     return base64.b64encode(img_bytes)
 
 
-def test__cropped_img_save_jpeg(tmp_path) -> None:
+def square_contour(low, high) -> list:
+    return [
+        {"x": low, "y": low},
+        {"x": high, "y": low},
+        {"x": high, "y": high},
+        {"x": low, "y": high},
+    ]
+
+
+def test__cropped_img_save_jpeg(image_processor, tmp_path) -> None:
     img = Image.new("RGB", (10, 10), (123, 222, 111))
     buf = BytesIO()
     image_processor._cropped_img_save(img, buf, "JPEG")
@@ -58,7 +54,7 @@ def test__cropped_img_save_jpeg(tmp_path) -> None:
     assert loaded.size == (10, 10)
 
 
-def test__cropped_img_save_fallback_to_jpeg(tmp_path) -> None:
+def test__cropped_img_save_fallback_to_jpeg(image_processor, tmp_path) -> None:
     img = Image.new("RGB", (10, 10), (123, 222, 111))
     buf = BytesIO()
     # Use an invalid format to trigger fallback
@@ -68,37 +64,111 @@ def test__cropped_img_save_fallback_to_jpeg(tmp_path) -> None:
     assert loaded.size == (10, 10)
 
 
-def test__dummy_calculation_runs() -> None:
+def test__dummy_calculation_runs(image_processor) -> None:
     # Just ensure it runs without error
     image_processor._dummy_calculation()
 
 
 @pytest.mark.parametrize(
-    "points,exclude,expected_start",
+    "points,expected_start",
     [
-        ([{"x": 0, "y": 0}], None, "M 0 0 Z"),
-        ([{"x": 0, "y": 0}, {"x": 10, "y": 10}], None, "M 0 0 L 10 10"),
+        ([{"x": 0, "y": 0}], "M 0 0 Z"),
+        ([{"x": 0, "y": 0}, {"x": 10, "y": 10}], "M 0 0 L 10 10"),
         (
             [{"x": 0, "y": 0}, {"x": 10, "y": 0}, {"x": 10, "y": 10}],
-            None,
             "M 0 0 Q 0 0, 5.0 0.0 T 10.0 5.0 T 5.0 5.0 Z",
         ),
     ],
 )
-def test__points_to_smooth_svg_path_basic(points, exclude, expected_start) -> None:
-    result = image_processor._points_to_smooth_svg_path(points, exclude)
+def test__points_to_smooth_svg_path_basic(image_processor, points, expected_start) -> None:
+    result = image_processor._points_to_smooth_svg_path(points)
     assert result.startswith(expected_start.split()[0])
 
 
-def test__points_to_smooth_svg_path_with_exclusion() -> None:
-    points = [{"x": 50, "y": 50}, {"x": 60, "y": 50}, {"x": 60, "y": 60}]
-    exclude = [{"x": 55, "y": 55}]
-    result = image_processor._points_to_smooth_svg_path(points, exclude)
-    # Should adjust points away from exclusion center
-    assert "M" in result and "Q" in result
+def test_region_exclusion_cuts_the_excluded_region(image_processor) -> None:
+    square = lambda x0, y0, x1, y1: [
+        {"x": x0, "y": y0},
+        {"x": x1, "y": y0},
+        {"x": x1, "y": y1},
+        {"x": x0, "y": y1},
+    ]
+    landmarks = {
+        "landmarks": [square(100, 100, 200, 200), [], [], square(150, 150, 250, 250)]
+    }
+    img_b64 = encode_image_to_base64_bytes(create_test_image(400, 400))
+
+    # Crop offset (50, 50): the nose covers the bottom right quarter of the cheek
+    _, contours = image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, region_exclusions={"right_cheek": ["nose"]}
+    )
+    cheek, nose = contours
+
+    # The smooth outlines the clip paths draw are cut, the cut is drawn with straight segments
+    cheek_outline = _smooth_outline_points(cheek["points"])
+    nose_outline = _smooth_outline_points(nose["points"])
+    rings = polygon_difference([cheek_outline], nose_outline)
+    assert cheek["path_d"] == " ".join(_points_to_polygon_svg_path(ring) for ring in rings)
+    assert cheek["path_d"].startswith("M 50 50 L 100.0 50.0 L ")
+    # No point of the cut outline lies inside the excluded outline
+    cut_points = np.array([point for ring in rings for point in ring], dtype=np.float64)
+    location, _ = _locate_points(
+        cut_points, np.array(nose_outline), np.roll(np.array(nose_outline), -1, axis=0)
+    )
+    assert (location != 1).all()
 
+    # The region outline itself and the excluded region are unchanged
+    assert cheek["points"] == [[50, 50], [150, 50], [150, 150], [50, 150]]
+    assert nose["path_d"] == image_processor._points_to_smooth_svg_path(
+        square(100, 100, 200, 200)
+    )
+
+    # Without the rule the cheek keeps its whole outline
+    _, contours = image_processor.process_image_data_intensive(True, landmarks, img_b64)
+    assert contours[0]["path_d"] == image_processor._points_to_smooth_svg_path(
+        square(50, 50, 150, 150)
+    )
 
-def test__process_image_decoding_and_cropping_basic() -> None:
+
+def test_smooth_outline_points_follow_the_smooth_path() -> None:
+    # The start, the midpoints between the points and the first point are on the path
+    outline = _smooth_outline_points([[0, 0], [10, 0], [10, 10]], curve_steps=2)
+    assert outline == [
+        [0, 0],
+        [5.0, 0.0],
+        [8.75, 1.25],
+        [10.0, 5.0],
+        [8.75, 7.5],
+        [5.0, 5.0],
+    ]
+    assert _points_to_polygon_svg_path([[0, 0], [1.5, 0], [1, 1]]) == "M 0 0 L 1.5 0 L 1 1 Z"
+
+
+def test_region_exclusion_inside_a_region_is_a_hole(image_processor) -> None:
+    contours = [
+        {"name": "right_cheek", "path_d": "", "points": [[0, 0], [10, 0], [10, 10], [0, 10]]},
+        {"name": "nose", "path_d": "", "points": [[2, 2], [4, 2], [4, 4], [2, 4]]},
+        {"name": "left_cheek", "path_d": "", "points": [[20, 0], [30, 0], [30, 10]]},
+    ]
+    image_processor._apply_region_exclusions(
+        contours, {"right_cheek": ["nose", "unknown"], "left_cheek": ["nose"]}, -1
+    )
+    # One subpath per ring, the hole running the other way
+    outline, hole = contours[0]["path_d"].split(" Z M ")
+    assert outline == _points_to_polygon_svg_path(
+        _smooth_outline_points(contours[0]["points"])
+    )[: -len(" Z")]
+    nose_outline = _smooth_outline_points(contours[1]["points"])
+    hole_points = [
+        [float(value) for value in command.split()[-2:]]
+        for command in hole.rstrip(" Z").split(" L ")
+    ]
+    assert sorted(hole_points) == sorted(nose_outline)
+    assert _signed_area(np.array(hole_points)) * _signed_area(np.array(nose_outline)) < 0
+    # Disjoint bounding boxes: nothing is cut
+    assert contours[2]["path_d"] == ""
+
+
+def test__process_image_decoding_and_cropping_basic(image_processor) -> None:
     img_bytes = create_test_image(100, 100)
     img_b64 = encode_image_to_base64_bytes(img_bytes)
     landmarks = {
@@ -112,30 +182,32 @@ def test__process_image_decoding_and_cropping_basic() -> None:
         ]
     }
     result = image_processor._process_image_decoding_and_cropping(img_b64, landmarks)
-    b64_str, w, h, off_x, off_y = result
+    b64_str, w, h, off_x, off_y = result[:5]
     assert isinstance(b64_str, str)
     assert w > 0 and h > 0
     assert off_x >= 0 and off_y >= 0
 
 
-def test__process_image_decoding_and_cropping_error(monkeypatch) -> None:
+def test__process_image_decoding_and_cropping_error(image_processor, monkeypatch) -> None:
     # Pass invalid image data to trigger exception
     bad_img_b64 = b"not_base64"
     landmarks = {"dimensions": [123, 456]}
     result = image_processor._process_image_decoding_and_cropping(
         bad_img_b64, landmarks
     )
-    b64_str, w, h, off_x, off_y = result
+    b64_str, w, h, off_x, off_y = result[:5]
     assert w == 123 and h == 456
     assert off_x == 0 and off_y == 0
 
 
-def test__generate_final_svg_content() -> None:
-    svg = image_processor._generate_final_svg_content(
-        100,
-        200,
-        ['<clipPath id="a"></clipPath>'],
-        ['<image width="100" height="200"/>'],
+def test__svg_content_chunks(image_processor) -> None:
+    svg = "".join(
+        image_processor._svg_content_chunks(
+            100,
+            200,
+            ['<clipPath id="a"></clipPath>'],
+            ['<image width="100" height="200"/>'],
+        )
     )
     assert svg.startswith("<svg")
     assert "clipPath" in svg
@@ -144,13 +216,13 @@ def test__generate_final_svg_content() -> None:
     assert 'height="200"' in svg
 
 
-def test__extract_raw_points() -> None:
+def test__extract_raw_points(image_processor) -> None:
     contour = [{"x": 1, "y": 2}, {"x": 3, "y": 4}]
     points = image_processor._extract_raw_points(contour)
     assert points == [[1, 2], [3, 4]]
 
 
-def test_process_image_data_intensive_basic() -> None:
+def test_process_image_data_intensive_basic(image_processor) -> None:
     img_bytes = create_test_image(100, 100)
     img_b64 = encode_image_to_base64_bytes(img_bytes)
     landmarks = {
@@ -189,3 +261,344 @@ def test_process_image_data_intensive_basic() -> None:
     assert isinstance(svg_b64, str)
     assert isinstance(mask_contours, list)
     assert mask_contours and "name" in mask_contours[0] and "path_d" in mask_contours[0]
+
+
+@pytest.mark.parametrize("svg_image_embed_mode", ["defs", "union"])
+def test_process_image_data_intensive_embeds_image_once(
+    image_processor, svg_image_embed_mode
+) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_image(100, 100))
+    landmarks = {
+        "landmarks": [
+            square_contour(10, 90),
+            square_contour(20, 80),
+            square_contour(30, 70),
+        ]
+    }
+    svg_b64, mask_contours = image_processor.process_image_data_intensive(
+        loadtest_mode_enabled=True,
+        landmarks_data=landmarks,
+        original_image_base64_bytes=img_b64,
+        svg_image_embed_mode=svg_image_embed_mode,
+    )
+    svg = base64.b64decode(svg_b64).decode("utf-8")
+
+    # The image data URI appears exactly once whatever the number of regions
+    assert svg.count("data:image/jpeg;base64,") == 1
+    assert len(mask_contours) == 3
+    for contour in mask_contours:
+        assert contour["path_d"] in svg
+
+
+def test_process_image_data_intensive_unknown_embed_mode(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_image(100, 100))
+    landmarks = {"landmarks": [[{"x": 10, "y": 10}, {"x": 90, "y": 90}]]}
+    with pytest.raises(ValueError):
+        image_processor.process_image_data_intensive(
+            loadtest_mode_enabled=True,
+            landmarks_data=landmarks,
+            original_image_base64_bytes=img_b64,
+            svg_image_embed_mode="per_region",
+        )
+
+
+def create_test_jpeg(width, height, orientation=None, subsampling=2) -> bytes:
+    img = Image.new("RGB", (width, height), (10, 200, 30))
+    buf = BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation  # EXIF Orientation tag
+    img.save(buf, format="JPEG", exif=exif, subsampling=subsampling)
+    return buf.getvalue()
+
+
+def test_decoding_fast_path_reuses_original_base64(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(120, 80, orientation=1))
+    # The padded bounding box covers the whole image: nothing to crop or rotate
+    landmarks = {"landmarks": [square_contour(40, 80)]}
+    b64_str, w, h, off_x, off_y = image_processor._process_image_decoding_and_cropping(
+        img_b64, landmarks
+    )[:5]
+    assert b64_str == img_b64.decode("utf-8")
+    assert (w, h, off_x, off_y) == (120, 80, 0, 0)
+
+
+def test_decoding_fast_path_canonicalizes_base64(image_processor) -> None:
+    img_bytes = create_test_jpeg(60, 60)
+    wrapped_b64 = b"\n".join(
+        base64.encodebytes(img_bytes).splitlines()
+    )  # MIME-style line breaks
+    b64_str, w, h = image_processor._process_image_decoding_and_cropping(
+        wrapped_b64, {"landmarks": []}
+    )[:3]
+    assert b64_str == base64.b64encode(img_bytes).decode("utf-8")
+    assert (w, h) == (60, 60)
+
+
+def test_decoding_rotates_exif_orientation(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(120, 80, orientation=6))
+    b64_str, w, h, off_x, off_y = image_processor._process_image_decoding_and_cropping(
+        img_b64, {"landmarks": []}
+    )[:5]
+    # The image is rotated, so it is re-encoded with swapped dimensions
+    assert b64_str != img_b64.decode("utf-8")
+    assert (w, h, off_x, off_y) == (80, 120, 0, 0)
+
+
+def test_jpeg_mcu_size() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    img_420 = Image.open(BytesIO(create_test_jpeg(64, 64, subsampling=2)))
+    img_444 = Image.open(BytesIO(create_test_jpeg(64, 64, subsampling=0)))
+    assert py_image_processor._jpeg_mcu_size(img_420) == (16, 16)
+    assert py_image_processor._jpeg_mcu_size(img_444) == (8, 8)
+
+
+def test_jpeg_lossless_transform_aligns_crop_to_mcu(monkeypatch) -> None:
+    import subprocess
+    from exlib.py import image_processor as py_image_processor
+
+    calls = []
+
+    # Stand-in for jpegtran returning an image of the requested crop size
+    def fake_run(args, input, capture_output, timeout):
+        calls.append(args)
+        width, height = map(int, args[args.index("-crop") + 1].split("+")[0].split("x"))
+        return subprocess.CompletedProcess(args, 0, stdout=create_test_jpeg(width, height))
+
+    monkeypatch.setattr(py_image_processor, "JPEGTRAN_PATH", "jpegtran")
+    monkeypatch.setattr(py_image_processor.subprocess, "run", fake_run)
+
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(400, 300, orientation=6))
+    landmarks = {"landmarks": [square_contour(100, 180)]}
+    b64_str, w, h, off_x, off_y = py_image_processor._process_image_decoding_and_cropping(
+        img_b64, landmarks, jpeg_lossless_transform=True
+    )[:5]
+
+    # Rotated 90 degrees clockwise, crop origin (50, 50) moved down to the 16 px MCU grid
+    assert calls[0][:6] == ["jpegtran", "-copy", "none", "-rotate", "90", "-perfect"]
+    assert calls[0][6:] == ["-crop", "182x182+48+48"]
+    assert (w, h, off_x, off_y) == (182, 182, 48, 48)
+    assert Image.open(BytesIO(base64.b64decode(b64_str))).size == (182, 182)
+
+
+def test_jpeg_lossless_transform_falls_back_without_jpegtran(monkeypatch) -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    monkeypatch.setattr(py_image_processor, "JPEGTRAN_PATH", None)
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(400, 300))
+    landmarks = {"landmarks": [square_contour(100, 180)]}
+    _, w, h, off_x, off_y = py_image_processor._process_image_decoding_and_cropping(
+        img_b64, landmarks, jpeg_lossless_transform=True
+    )[:5]
+    # Pillow crop, exactly on the padded bounding box
+    assert (w, h, off_x, off_y) == (180, 180, 50, 50)
+
+
+@pytest.mark.skipif(
+    shutil.which("jpegtran") is None, reason="jpegtran is not installed"
+)
+def test_jpeg_lossless_transform_with_jpegtran() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(400, 300, orientation=3))
+    landmarks = {"landmarks": [square_contour(100, 180)]}
+    b64_str, w, h, off_x, off_y = py_image_processor._process_image_decoding_and_cropping(
+        img_b64, landmarks, jpeg_lossless_transform=True
+    )[:5]
+    assert off_x % 16 == 0 and off_y % 16 == 0
+    assert Image.open(BytesIO(base64.b64decode(b64_str))).size == (w, h)
+
+
+def test_downscale_factor() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    assert py_image_processor._downscale_factor(4000, 3000, 0) == 1
+    assert py_image_processor._downscale_factor(4000, 3000, 4000) == 1
+    assert py_image_processor._downscale_factor(4000, 3000, 1024) == 4
+    assert py_image_processor._downscale_factor(3000, 4000, 400) == 16
+
+
+def test_decode_reduced_uses_jpeg_draft_then_reduce() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    img = Image.open(BytesIO(create_test_jpeg(1601, 1200)))
+    assert py_image_processor._decode_reduced(img, 4).size == (401, 300)
+
+    # libjpeg scales down to 1/8, the remaining factor 2 is done by reduce()
+    img = Image.open(BytesIO(create_test_jpeg(1600, 1200)))
+    assert py_image_processor._decode_reduced(img, 16).size == (100, 75)
+
+    png = Image.new("RGB", (200, 100))
+    assert py_image_processor._decode_reduced(png, 2).size == (100, 50)
+
+
+def test_decoding_downscales_to_max_output_dimension(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(1600, 1200))
+    landmarks = {"landmarks": [square_contour(200, 1000)]}
+    (
+        b64_str,
+        w,
+        h,
+        off_x,
+        off_y,
+        downscale_factor,
+    ) = image_processor._process_image_decoding_and_cropping(
+        img_b64, landmarks, max_output_dimension=300
+    )[:6]
+    # 900 px padded crop, divided by 4; the crop origin 150 // 4 is 148 original pixels
+    assert downscale_factor == 4
+    assert (off_x, off_y) == (148, 148)
+    assert (w, h) == (226, 226)
+    assert Image.open(BytesIO(base64.b64decode(b64_str))).size == (226, 226)
+
+
+def test_downscaled_landmarks_match_the_output_image(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(1600, 1200))
+    landmarks = {"landmarks": [square_contour(200, 1000)]}
+    _, contours = image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, max_output_dimension=300
+    )
+    assert contours[0]["points"] == [[13.0, 13.0], [213.0, 13.0], [213.0, 213.0], [13.0, 213.0]]
+
+
+def test_image_mime_type() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    for format, mime_type in (
+        ("JPEG", "image/jpeg"),
+        ("PNG", "image/png"),
+        ("WEBP", "image/webp"),
+        ("GIF", "image/gif"),
+    ):
+        buf = BytesIO()
+        Image.new("RGB", (8, 8)).save(buf, format=format)
+        image_b64 = base64.b64encode(buf.getvalue()).decode("utf-8")
+        assert py_image_processor._image_mime_type(image_b64) == mime_type
+
+
+def test_encode_image_jpeg_settings() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    img = Image.new("RGBA", (64, 64), (10, 200, 30, 128))
+    buf = BytesIO()
+    py_image_processor._cropped_img_save(
+        img,
+        buf,
+        "PNG",
+        {"format": "jpeg", "quality": 70, "progressive": True, "subsampling": 0},
+    )
+    loaded = Image.open(BytesIO(buf.getvalue()))
+    assert loaded.format == "JPEG"
+    assert loaded.info.get("progressive")
+    assert loaded.layer[0][1:3] == (1, 1)  # 4:4:4, no chroma subsampling
+
+
+def test_encode_image_unknown_format() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    with pytest.raises(ValueError):
+        py_image_processor._encode_image(Image.new("RGB", (8, 8)), BytesIO(), {"format": "bmp"})
+
+
+def test_unknown_output_format_fails_the_job(image_processor) -> None:
+    # Not the decoding fallback: the original image would be embedded at 1024x1024
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(120, 80))
+    with pytest.raises(ValueError, match="png"):
+        image_processor.process_image_data_intensive(
+            True,
+            {"landmarks": [square_contour(40, 80)]},
+            img_b64,
+            image_encoding={"format": "png"},
+        )
+
+
+def test_webp_output_is_embedded_with_its_mime_type(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(120, 80))
+    landmarks = {"landmarks": [square_contour(40, 80)]}
+    svg_b64, _ = image_processor.process_image_data_intensive(
+        True,
+        landmarks,
+        img_b64,
+        image_encoding={"format": "webp", "quality": 60},
+    )
+    svg_content = base64.b64decode(svg_b64).decode("utf-8")
+    assert 'xlink:href="data:image/webp;base64,' in svg_content
+
+    from exlib.py import image_processor as py_image_processor
+
+    mime_type, size = py_image_processor.embedded_image_info(base64.b64decode(svg_b64))
+    image_b64 = svg_content.split(";base64,")[1].split('"')[0]
+    assert mime_type == "image/webp"
+    assert size == len(base64.b64decode(image_b64))
+    assert Image.open(BytesIO(base64.b64decode(image_b64))).size == (120, 80)
+    assert py_image_processor.embedded_image_info(b"<svg></svg>") == ("", 0)
+
+
+@pytest.mark.parametrize("chunk_lengths", [(1,), (2, 5), (7, 1, 1, 400000)])
+def test__encode_svg_base64_matches_b64encode(image_processor, chunk_lengths) -> None:
+    text = "".join(chr(33 + i % 90) for i in range(sum(chunk_lengths))) + "\u00e9"
+    chunks = []
+    start = 0
+    for length in chunk_lengths:
+        chunks.append(text[start : start + length])
+        start += length
+    chunks.append(text[start:])
+    assert image_processor._encode_svg_base64(chunks) == base64.b64encode(
+        text.encode("utf-8")
+    ).decode("utf-8")
+
+
+def test_svg_image_element_is_kept_in_parts(image_processor) -> None:
+    image_b64 = base64.b64encode(create_test_jpeg(8, 8)).decode("utf-8")
+    clip_path_defs, _ = image_processor._build_svg_image_elements(
+        8, 8, image_b64, [("nose", "M 1 1 Z")], "defs"
+    )
+    # The image base64 string is referenced, not copied into a larger string
+    assert clip_path_defs[-1][1] is image_b64
+
+
+def test_simplification_drops_points_within_tolerance(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(400, 300))
+    # A square with extra points on its edges, less than 0.5 px off the outline
+    contour = [
+        {"x": 100, "y": 100},
+        {"x": 150, "y": 100.3},
+        {"x": 200, "y": 100},
+        {"x": 200, "y": 200},
+        {"x": 150, "y": 199.6},
+        {"x": 100, "y": 200},
+    ]
+    _, contours = image_processor.process_image_data_intensive(
+        True, {"landmarks": [contour]}, img_b64, path_simplify_tolerance=1.0
+    )
+    assert contours[0]["points"] == [[50, 50], [150, 50], [150, 150], [50, 150]]
+
+    _, contours = image_processor.process_image_data_intensive(
+        True, {"landmarks": [contour]}, img_b64, path_simplify_tolerance=0.1
+    )
+    assert len(contours[0]["points"]) == 6
+
+
+def test_coordinate_precision_rounds_paths_and_points(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(400, 300))
+    contour = [
+        {"x": 100.123456, "y": 100},
+        {"x": 200.987654, "y": 100.5},
+        {"x": 150.55555, "y": 200.25},
+    ]
+    _, contours = image_processor.process_image_data_intensive(
+        True, {"landmarks": [contour]}, img_b64, coordinate_precision=1
+    )
+    assert contours[0]["points"] == [[50.1, 50], [151.0, 50.5], [100.6, 150.2]]
+    assert contours[0]["path_d"] == (
+        "M 50.1 50 Q 50.1 50, 100.6 50.2 T 125.8 100.4 T 75.3 100.1 Z"
+    )
+
+
+def test_coordinate_precision_above_maximum(image_processor) -> None:
+    img_b64 = encode_image_to_base64_bytes(create_test_jpeg(40, 30))
+    with pytest.raises(ValueError):
+        image_processor.process_image_data_intensive(
+            True, {"landmarks": []}, img_b64, coordinate_precision=16
+        )
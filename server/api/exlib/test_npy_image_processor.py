@@ -0,0 +1,136 @@
+import base64
+import random
+import pytest
+from PIL import Image
+from io import BytesIO
+from exlib.py import image_processor as py_image_processor
+from exlib.npy import image_processor as npy_image_processor
+
+
+# The nose is cut out of both cheeks and the undereye
+REGION_EXCLUSIONS = {
+    "right_cheek": ["nose"],
+    "left_cheek": ["nose", "right_undereye"],
+    "right_undereye": ["nose"],
+}
+
+
+def create_test_image_base64(width=400, height=400) -> bytes:
+    img = Image.new("RGB", (width, height), (200, 150, 120))
+    buf = BytesIO()
+    img.save(buf, format="JPEG")
+    return base64.b64encode(buf.getvalue())
+
+
+def random_contour(rng, center, radius, count, integers) -> list:
+    points = []
+    for _ in range(count):
+        x = center[0] + rng.uniform(-radius, radius)
+        y = center[1] + rng.uniform(-radius, radius)
+        points.append({"x": round(x), "y": round(y)} if integers else {"x": x, "y": y})
+    return points
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("integers", [False, True])
+def test_numpy_backend_matches_pure_python(seed, integers) -> None:
+    rng = random.Random(seed)
+    # Dense groups overlapping the nose so the region exclusions are exercised
+    landmarks = {
+        "landmarks": [
+            random_contour(rng, (180, 200), 90, 500, integers),
+            random_contour(rng, (150, 120), 40, 50, integers),
+            random_contour(rng, (260, 200), 60, 3, integers),
+            random_contour(rng, (200, 210), 30, 20, integers),
+            random_contour(rng, (200, 300), 50, 2, integers),
+            random_contour(rng, (210, 320), 50, 1, integers),
+            [],
+        ]
+    }
+    img_b64 = create_test_image_base64()
+
+    expected = py_image_processor.process_image_data_intensive(
+        loadtest_mode_enabled=True,
+        landmarks_data=landmarks,
+        original_image_base64_bytes=img_b64,
+        region_exclusions=REGION_EXCLUSIONS,
+    )
+    result = npy_image_processor.process_image_data_intensive(
+        loadtest_mode_enabled=True,
+        landmarks_data=landmarks,
+        original_image_base64_bytes=img_b64,
+        region_exclusions=REGION_EXCLUSIONS,
+    )
+
+    # The SVG and the contours must be byte-identical
+    assert result[0] == expected[0]
+    assert repr(result[1]) == repr(expected[1])
+
+
+def test_numpy_backend_two_point_nose() -> None:
+    landmarks = {
+        "landmarks": [
+            [{"x": 100, "y": 100}, {"x": 150, "y": 100}, {"x": 150, "y": 150}],
+            [],
+            [],
+            [{"x": 90, "y": 90}, {"x": 110, "y": 110}],
+        ]
+    }
+    img_b64 = create_test_image_base64()
+    options = {"region_exclusions": REGION_EXCLUSIONS}
+    expected = py_image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    result = npy_image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    assert result == expected
+
+
+def test_numpy_backend_without_landmarks() -> None:
+    img_b64 = create_test_image_base64(50, 40)
+    expected = py_image_processor.process_image_data_intensive(True, {}, img_b64)
+    result = npy_image_processor.process_image_data_intensive(True, {}, img_b64)
+    assert result == expected
+
+
+def test_numpy_points_to_smooth_svg_path_matches_pure_python() -> None:
+    points = [{"x": 50, "y": 50}, {"x": 60, "y": 50}, {"x": 60, "y": 60}, {"x": 55.5, "y": 55}]
+    assert npy_image_processor._points_to_smooth_svg_path(
+        points
+    ) == py_image_processor._points_to_smooth_svg_path(points)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("integers", [False, True])
+@pytest.mark.parametrize(
+    "path_simplify_tolerance, coordinate_precision", [(0.5, -1), (2.0, 2), (0, 0), (8.0, 3)]
+)
+def test_numpy_backend_simplified_paths_match_pure_python(
+    seed, integers, path_simplify_tolerance, coordinate_precision
+) -> None:
+    rng = random.Random(seed)
+    landmarks = {
+        "landmarks": [
+            random_contour(rng, (180, 200), 90, 200, integers),
+            random_contour(rng, (150, 120), 40, 50, integers),
+            random_contour(rng, (260, 200), 60, 3, integers),
+            random_contour(rng, (200, 210), 30, 20, integers),
+            [{"x": 200, "y": 300}] * 4,  # Every point on the same spot
+        ]
+    }
+    img_b64 = create_test_image_base64()
+    options = {
+        "path_simplify_tolerance": path_simplify_tolerance,
+        "coordinate_precision": coordinate_precision,
+        "region_exclusions": REGION_EXCLUSIONS,
+    }
+
+    expected = py_image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    result = npy_image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    assert result[0] == expected[0]
+    assert repr(result[1]) == repr(expected[1])
@@ -0,0 +1,92 @@
+import math
+from exlib.npy.polygon import polygon_difference
+
+
+def square(x0, y0, x1, y1) -> list:
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def circle(cx, cy, radius, count) -> list:
+    return [
+        [cx + radius * math.cos(2 * math.pi * k / count), cy + radius * math.sin(2 * math.pi * k / count)]
+        for k in range(count)
+    ]
+
+
+def test_overlapping_corner_is_cut() -> None:
+    assert polygon_difference([square(0, 0, 10, 10)], square(5, 5, 15, 15)) == [
+        [[0, 0], [10, 0], [10.0, 5.0], [5, 5], [5.0, 10.0], [0, 10]]
+    ]
+
+
+def test_clip_orientation_does_not_matter() -> None:
+    assert polygon_difference(
+        [square(0, 0, 10, 10)], square(5, 5, 15, 15)[::-1]
+    ) == polygon_difference([square(0, 0, 10, 10)], square(5, 5, 15, 15))
+
+
+def test_outlines_that_do_not_cut_return_none() -> None:
+    # Disjoint, and sharing an edge from the outside
+    assert polygon_difference([square(0, 0, 10, 10)], square(20, 20, 30, 30)) is None
+    assert polygon_difference([square(0, 0, 10, 10)], square(10, 0, 20, 10)) is None
+    # Degenerate outlines have no inside
+    assert polygon_difference([square(0, 0, 10, 10)], [[2, 2], [4, 4]]) is None
+
+
+def test_clip_inside_is_a_reversed_hole() -> None:
+    assert polygon_difference([square(0, 0, 10, 10)], square(2, 2, 4, 4)) == [
+        [[0, 0], [10, 0], [10, 10], [0, 10]],
+        [[4, 2], [2, 2], [2, 4], [4, 4]],
+    ]
+
+
+def test_covered_subject_is_empty() -> None:
+    assert polygon_difference([square(2, 2, 4, 4)], square(0, 0, 10, 10)) == []
+    assert polygon_difference([square(0, 0, 10, 10)], square(0, 0, 10, 10)) == []
+
+
+def test_shared_edge_inside() -> None:
+    assert polygon_difference([square(0, 0, 10, 10)], square(0, 0, 5, 10)) == [
+        [[5, 0], [10, 0], [10, 10], [5, 10]]
+    ]
+
+
+def test_clip_across_splits_the_subject() -> None:
+    assert polygon_difference([square(0, 0, 10, 10)], square(4, -5, 6, 15)) == [
+        [[0, 0], [4.0, 0.0], [4.0, 10.0], [0, 10]],
+        [[6.0, 0.0], [10, 0], [10, 10], [6.0, 10.0]],
+    ]
+
+
+def test_subject_with_a_hole_is_cut_again() -> None:
+    rings = polygon_difference([square(0, 0, 10, 10)], square(2, 2, 4, 4))
+    assert polygon_difference(rings, square(3, 3, 20, 20)) == [
+        [
+            [0, 0],
+            [10, 0],
+            [10.0, 3.0],
+            [4.0, 3.0],
+            [4, 2],
+            [2, 2],
+            [2, 4],
+            [3.0, 4.0],
+            [3.0, 10.0],
+            [0, 10],
+        ]
+    ]
+
+
+def test_repeated_points_are_ignored() -> None:
+    # Rounded outlines often repeat a point: no zero-length edge may hold other points
+    clip = [[5, 5], [15, 5], [15, 5], [15, 15], [5, 15], [5, 5]]
+    expected = polygon_difference([square(0, 0, 10, 10)], square(5, 5, 15, 15))
+    assert polygon_difference([square(0, 0, 10, 10)], clip) == expected
+    subject = [[0, 0], [0, 0], [10, 0], [10, 10], [0, 10], [0, 10]]
+    assert polygon_difference([subject], clip) == expected
+
+
+def test_large_outlines() -> None:
+    rings = polygon_difference([circle(1000, 1000, 900, 3000)], circle(1500, 1000, 600, 3000))
+    assert len(rings) == 1
+    # Every point of the result is outside the clip circle, or on one of its chords
+    assert all(math.hypot(x - 1500, y - 1000) > 600 - 1e-3 for x, y in rings[0])
@@ -0,0 +1,176 @@
+import base64
+import pytest
+import numpy as np
+from PIL import Image
+from io import BytesIO
+from services.image_backends import IMAGE_PROCESSOR_BACKEND_MODULES
+from exlib.npy.segmentation import (
+    _trace_outlines,
+    _sample_label_map,
+    segmentation_region_contours,
+)
+
+
+def create_label_map_base64(labels: np.ndarray) -> bytes:
+    buf = BytesIO()
+    Image.fromarray(labels.astype(np.uint8), mode="L").save(buf, format="PNG")
+    return base64.b64encode(buf.getvalue())
+
+
+def create_test_image_base64(width, height) -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (width, height), (200, 150, 120)).save(buf, format="JPEG")
+    return base64.b64encode(buf.getvalue())
+
+
+def test_trace_outline_of_a_rectangle() -> None:
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[2:8, 1:9] = True
+    # Corners only; the straight sides lie on the pixel edges
+    (outline,) = _trace_outlines(mask)
+    assert outline.tolist() == [
+        [1.5, 2.0],
+        [1.0, 2.5],
+        [1.0, 7.5],
+        [1.5, 8.0],
+        [8.5, 8.0],
+        [9.0, 7.5],
+        [9.0, 2.5],
+        [8.5, 2.0],
+    ]
+
+
+def test_trace_outlines_of_separate_areas_and_holes() -> None:
+    mask = np.zeros((12, 24), dtype=bool)
+    mask[1:3, 1:3] = True
+    mask[2:10, 10:20] = True
+    mask[4:6, 13:15] = False  # Hole in the largest region
+    largest, smaller, hole = _trace_outlines(mask)
+
+    # The largest area first, then the smaller one, then the hole
+    assert largest[:, 0].min() == 10.0 and largest[:, 0].max() == 20.0
+    assert largest[:, 1].min() == 2.0 and largest[:, 1].max() == 10.0
+    assert smaller[:, 0].min() == 1.0 and smaller[:, 0].max() == 3.0
+    assert hole[:, 0].min() == 13.0 and hole[:, 0].max() == 15.0
+
+    # Holes run the other way round
+    area = lambda points: np.sum(
+        points[:, 0] * np.roll(points[:, 1], -1) - np.roll(points[:, 0], -1) * points[:, 1]
+    )
+    assert area(largest) * area(hole) < 0 < area(largest) * area(smaller)
+
+
+def test_trace_outlines_of_an_empty_mask() -> None:
+    assert _trace_outlines(np.zeros((4, 4), dtype=bool)) == []
+
+
+def test_sample_label_map() -> None:
+    labels = np.arange(64, dtype=np.uint8).reshape(8, 8)
+
+    # Same grid as the source image: the cropped view
+    sampled = _sample_label_map(labels, (8, 8), (2, 3), 1, (4, 2))
+    assert sampled.tolist() == labels[3:5, 2:6].tolist()
+
+    # Half resolution map, output downscaled by 2: one map pixel per output pixel
+    sampled = _sample_label_map(labels, (16, 16), (4, 0), 2, (3, 2))
+    assert sampled.tolist() == labels[0:2, 2:5].tolist()
+
+
+def test_segmentation_region_contours_in_output_coordinates() -> None:
+    labels = np.zeros((100, 100), dtype=np.uint8)
+    labels[20:60, 30:70] = 1
+    labels[70:80, 40:50] = 2
+    contours = segmentation_region_contours(
+        create_label_map_base64(labels),
+        {"skin": 1, "hair": 2, "beard": 3},
+        (100, 100),
+        (10, 10),
+        1,
+        (80, 80),
+    )
+    assert [name for name, _ in contours] == ["skin", "hair"]
+    (skin,) = contours[0][1]
+    assert min(point["x"] for point in skin) == 20.0
+    assert max(point["y"] for point in skin) == 50.0
+
+
+@pytest.mark.parametrize("backend", list(IMAGE_PROCESSOR_BACKEND_MODULES))
+def test_segmentation_regions_are_appended_to_the_mask_contours(backend) -> None:
+    image_processor = pytest.importorskip(IMAGE_PROCESSOR_BACKEND_MODULES[backend])
+    from exlib.py import image_processor as py_image_processor
+
+    # Quarter resolution map of a 400x400 photo
+    labels = np.zeros((100, 100), dtype=np.uint8)
+    labels[25:75, 30:70] = 7
+    options = {
+        "segmentation_map_base64_bytes": create_label_map_base64(labels),
+        "segmentation_labels": {"skin": 7},
+        "coordinate_precision": 2,
+    }
+    landmarks = {
+        "landmarks": [[{"x": 150, "y": 150}, {"x": 250, "y": 150}, {"x": 200, "y": 250}]]
+    }
+    img_b64 = create_test_image_base64(400, 400)
+
+    svg_b64, contours = image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    assert [contour["name"] for contour in contours] == [
+        "right_cheek",
+        "segmentation_skin",
+    ]
+    assert 'id="mask_segmentation_skin"' in base64.b64decode(svg_b64).decode("utf-8")
+
+    expected = py_image_processor.process_image_data_intensive(
+        True, landmarks, img_b64, **options
+    )
+    assert (svg_b64, repr(contours)) == (expected[0], repr(expected[1]))
+
+
+def test_separate_areas_of_a_label_are_all_drawn() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    # Two cheeks of the same label, the second with a hole, cut by the nose
+    labels = np.zeros((100, 100), dtype=np.uint8)
+    labels[20:80, 10:40] = 1
+    labels[20:80, 60:90] = 1
+    labels[40:50, 70:80] = 0
+    _, contours = py_image_processor.process_image_data_intensive(
+        True,
+        {"landmarks": [[], [], [], [{"x": 30, "y": 30}, {"x": 70, "y": 30}, {"x": 50, "y": 60}]]},
+        create_test_image_base64(100, 100),
+        segmentation_map_base64_bytes=create_label_map_base64(labels),
+        segmentation_labels={"skin": 1},
+        region_exclusions={"segmentation_skin": ["nose"]},
+    )
+    nose, skin = contours
+    assert skin["name"] == "segmentation_skin"
+    # Both areas and the hole, each cut where the nose covers it
+    assert skin["path_d"].count("M") == 3
+    assert "Q" not in skin["path_d"]
+    assert set(skin) == {"name", "path_d", "points"}
+
+    # Without exclusions the outlines are smooth subpaths of one path
+    _, contours = py_image_processor.process_image_data_intensive(
+        True,
+        {"landmarks": []},
+        create_test_image_base64(100, 100),
+        segmentation_map_base64_bytes=create_label_map_base64(labels),
+        segmentation_labels={"skin": 1},
+    )
+    (skin,) = contours
+    assert skin["path_d"].count("M") == 3 and skin["path_d"].count("Z") == 3
+    assert set(skin) == {"name", "path_d", "points"}
+
+
+def test_unreadable_segmentation_map_keeps_the_landmark_regions() -> None:
+    from exlib.py import image_processor as py_image_processor
+
+    _, contours = py_image_processor.process_image_data_intensive(
+        True,
+        {"landmarks": [[{"x": 10, "y": 10}]]},
+        create_test_image_base64(40, 40),
+        segmentation_map_base64_bytes=b"bm90IGFuIGltYWdl",
+        segmentation_labels={"skin": 1},
+    )
+    assert [contour["name"] for contour in contours] == ["right_cheek"]
@@ -1,8 +1,11 @@
 import os
 import uvicorn
+import argparse
 from routers import frontal
 from dotenv import load_dotenv
 from services.logger import console
+from drivers.database import engine
+from services.job_notifier import job_notifier
 from fastapi import FastAPI, Request
 from prometheus_client import generate_latest
 from services.worker import startup_db_and_worker, shutdown_worker
@@ -28,6 +31,9 @@ else:
         "[dim cyan]Load testing mode is DISABLED: Processing delay will be active.[/dim cyan]"
     )
 
+# Check if the background worker runs inside the API process (disable with --no-worker)
+RUN_WORKER_ENABLED = os.getenv("RUN_WORKER", "true").lower() == "true"
+
 # Initialize FastAPI application with title, description, and version
 app = FastAPI(
     title="Crop Submission API",
@@ -55,7 +61,9 @@ async def metrics() -> str:
 @app.on_event("startup")
 async def startup_event() -> None:
     console.log("[bold green]Application startup initiated.[/bold green]")
-    await startup_db_and_worker(app, LOADTEST_MODE_ENABLED)
+    await startup_db_and_worker(app, LOADTEST_MODE_ENABLED, RUN_WORKER_ENABLED)
+    # Wake waiting status requests when workers on other processes finish a job
+    job_notifier.start_listener(engine)
     console.log("[bold green]Application startup complete.[/bold green]")
 
 
@@ -64,6 +72,7 @@ async def startup_event() -> None:
 async def shutdown_event() -> None:
     console.log("[bold red]Application shutdown initiated.[/bold red]")
     await shutdown_worker(app)
+    job_notifier.stop_listener()
     console.log("[bold red]Application shutdown complete.[/bold red]")
 
 
@@ -83,4 +92,12 @@ async def read_root(request: Request) -> dict:
 
 # Main entry point to run the FastAPI application using Uvicorn
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the frontal crop API.")
+    parser.add_argument(
+        "--no-worker",
+        action="store_true",
+        help="Serve the API only, jobs are processed by `python -m services.worker`.",
+    )
+    if parser.parse_args().no_worker:
+        RUN_WORKER_ENABLED = False
     uvicorn.run(app, host=os.getenv("APP_HOST"), port=int(os.getenv("APP_PORT")))
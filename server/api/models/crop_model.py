@@ -1,8 +1,14 @@
+import os
 from datetime import datetime
+from sqlalchemy.orm import deferred
 from drivers.database import Base
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from typing import List, Optional
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index, LargeBinary
+
+
+# Largest number of jobs accepted by one batch submission or batch status request
+JOB_BATCH_MAX_ITEMS = int(os.getenv("JOB_BATCH_MAX_ITEMS", "500"))
 
 
 # Pydantic models for the crop job submission and response structures
@@ -59,8 +65,8 @@ class JobStatusResponse(JobResponse):
     svg: Optional[str] = Field(
         None, description="Base64 encoded SVG string, if job is completed."
     )
-    mask_contours: Optional[Dict[str, List[List[float]]]] = Field(
-        None, description="Dictionary of mask contours, if job is completed."
+    mask_contours: Optional[List[MaskContourDetail]] = Field(
+        None, description="List of detailed mask contours, if job is completed."
     )
     error: Optional[str] = Field(None, description="Error message if job failed.")
 
@@ -68,22 +74,107 @@ class JobStatusResponse(JobResponse):
         orm_mode = True
 
 
+# Pydantic model for a batch of crop job submissions
+class BatchSubmitPayload(BaseModel):
+    items: List[SubmitPayload] = Field(
+        ...,
+        min_items=1,
+        max_items=JOB_BATCH_MAX_ITEMS,
+        description="Crop jobs to submit, validated and stored together.",
+    )
+
+
+# Pydantic model for the batch submission response, one job per item in request order
+class BatchJobResponse(BaseModel):
+    jobs: List[JobResponse] = Field(
+        ..., description="Job of every submitted item, in the order of the items."
+    )
+
+
+# Pydantic model for a batch status request
+class BatchStatusPayload(BaseModel):
+    ids: List[str] = Field(
+        ...,
+        min_items=1,
+        max_items=JOB_BATCH_MAX_ITEMS,
+        description="IDs of the jobs to look up.",
+    )
+
+
+# Pydantic model for the batch status response
+class BatchStatusResponse(BaseModel):
+    jobs: List[JobStatusResponse] = Field(
+        ..., description="Status of every job found, in the order of the requested IDs."
+    )
+    missing: List[str] = Field(
+        [], description="Requested IDs that do not match any job."
+    )
+
+
+# Statuses of jobs that are queued or being processed
+IN_FLIGHT_JOB_STATUSES = ("pending", "processing")
+
+
 # This class represents the database model for crop jobs
 class DBCropJob(Base):
     __tablename__ = "crop_jobs"
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(String, unique=True, index=True, nullable=False)
 
-    image_base64 = Column(Text, nullable=False)
+    # Base64 documents of jobs created before the blob store, deferred: they are only
+    # loaded when accessed. New jobs leave them empty and reference blobs by hash.
+    image_base64 = deferred(Column(Text, nullable=True))
     landmarks_json = Column(JSON, nullable=False)
-    segmentation_map_base64 = Column(Text, nullable=False)
+    segmentation_map_base64 = deferred(Column(Text, nullable=True))
+
+    # Content hashes of the image and landmarks, computed on submit.
+    # The image and segmentation map hashes are also their blob store keys.
+    image_sha256 = Column(String(64), nullable=True)
+    landmarks_sha256 = Column(String(64), nullable=True)
+    segmentation_map_sha256 = Column(String(64), nullable=True)
 
     status = Column(String, default="pending", nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     completed_at = Column(DateTime, nullable=True)
 
-    svg_base64 = Column(Text, nullable=True)
+    # Lease taken by the worker processing the job, and number of claims so far
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+
+    svg_base64 = deferred(Column(Text, nullable=True))
     mask_contours_json = Column(JSON, nullable=True)
 
+    # SHA-256 of the SVG document (its ETag and blob key) and the blob keys of its
+    # copies compressed at completion
+    svg_sha256 = Column(String(64), nullable=True)
+    svg_gzip_sha256 = Column(String(64), nullable=True)
+    svg_br_sha256 = Column(String(64), nullable=True)
+
+    __table_args__ = (
+        # Dedup lookups probe this index instead of comparing image_base64 values
+        Index("idx_crop_jobs_dedup", "image_sha256", "landmarks_sha256", "status"),
+        # At most one in-flight job per image and landmarks, across all replicas
+        Index(
+            "uq_crop_jobs_inflight",
+            "image_sha256",
+            "landmarks_sha256",
+            unique=True,
+            postgresql_where=status.in_(IN_FLIGHT_JOB_STATUSES),
+            sqlite_where=status.in_(IN_FLIGHT_JOB_STATUSES),
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"<DBCropJob(job_id='{self.job_id}', status='{self.status}')>"
+
+
+# Content-addressed blobs of the database blob store, shared by every job referencing them
+class DBBlob(Base):
+    __tablename__ = "crop_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    data = deferred(Column(LargeBinary, nullable=False))
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<DBBlob(sha256='{self.sha256}', size={self.size})>"
@@ -1,50 +1,348 @@
+import os
+import json
 import uuid
+import base64
+import hashlib
 import asyncio
-from typing import Dict
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
 from datetime import datetime
-from functools import lru_cache
+from sqlalchemy import case
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from services.logger import console
+from services.job_queue import create_job_queue
+from services.content_hash import decode_base64_content, hash_landmarks
+from services.blob_store import create_blob_store, blob_key
+from services.metrics import job_rejected_counter, job_coalesced_counter
+from services.job_notifier import job_notifier
+from services.svg_result import (
+    SVG_RESULT_CACHE_MAX_AGE_SECONDS,
+    svg_result_etag,
+    if_none_match_matches,
+    negotiate_encoding,
+)
+from services.result_cache import (
+    job_result_cache,
+    build_job_data,
+    TERMINAL_JOB_STATUSES,
+)
 from drivers.database import get_db, SessionLocal
-from fastapi import APIRouter, HTTPException, status, Depends
-from models.crop_model import SubmitPayload, JobResponse, JobStatusResponse, DBCropJob
+from pydantic import ValidationError, parse_obj_as
+from starlette.concurrency import run_in_threadpool
+from fastapi import APIRouter, HTTPException, Query, Request, status, Depends
+from fastapi.responses import Response, StreamingResponse
+from services.multipart_upload import (
+    read_multipart_upload,
+    MultipartUploadError,
+    UploadTooLargeError,
+)
+from models.crop_model import (
+    Point,
+    SubmitPayload,
+    JobResponse,
+    JobStatusResponse,
+    BatchSubmitPayload,
+    BatchJobResponse,
+    BatchStatusPayload,
+    BatchStatusResponse,
+    DBCropJob,
+    DBBlob,
+    IN_FLIGHT_JOB_STATUSES,
+)
 
 # This module handles the API endpoints for submitting and checking the status of frontal crop processing jobs.
 router = APIRouter(
     tags=["Frontal Crop Processing"],
 )
 
-# A queue to manage crop processing jobs asynchronously
-job_queue: asyncio.Queue = asyncio.Queue()
+# Maximum number of jobs waiting in the queue before submissions are rejected
+JOB_QUEUE_MAXSIZE = int(os.getenv("JOB_QUEUE_MAXSIZE", "1000"))
+
+# Seconds a client is asked to wait before retrying a rejected submission
+JOB_QUEUE_RETRY_AFTER_SECONDS = int(os.getenv("JOB_QUEUE_RETRY_AFTER_SECONDS", "5"))
+
+# Longest ?wait= a status request may hold the connection open, in seconds
+JOB_STATUS_WAIT_MAX_SECONDS = float(os.getenv("JOB_STATUS_WAIT_MAX_SECONDS", "60"))
+
+# Seconds between keep-alive comments (and status re-checks) on a job event stream
+JOB_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("JOB_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# A bounded queue to manage crop processing jobs asynchronously.
+# The backend (durable database queue or in-memory queue) is set by JOB_QUEUE_BACKEND.
+job_queue = create_job_queue(SessionLocal, DBCropJob, maxsize=JOB_QUEUE_MAXSIZE)
+
+# Store of the job images, segmentation maps and SVG results, set by BLOB_STORE_BACKEND.
+# Job rows only keep the SHA-256 keys of their blobs.
+blob_store = create_blob_store(DBBlob)
+
+# Fields of JobStatusResponse a client can select with ?fields= (the id and status are always included)
+JOB_STATUS_FIELDS = frozenset(("status", "svg", "mask_contours", "error"))
+
+
+# Parse a ?fields= value, e.g. "status" or "status,mask_contours"; None selects every field
+def _parse_status_fields(fields: Optional[str]) -> FrozenSet[str]:
+    if fields is None:
+        return JOB_STATUS_FIELDS
+    selected = frozenset(field.strip() for field in fields.split(",") if field.strip())
+    unknown = selected - JOB_STATUS_FIELDS
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid fields: {', '.join(sorted(unknown)) or fields!r}. "
+            f"Expected a comma separated list of {', '.join(sorted(JOB_STATUS_FIELDS))}.",
+        )
+    return selected
+
+
+# Columns to read for the selected fields: the status (the error derives from it)
+# and only the result columns asked for, never the image blobs
+def _job_status_columns(fields: FrozenSet[str]) -> List[Any]:
+    columns = [DBCropJob.job_id, DBCropJob.status]
+    if "svg" in fields:
+        # The base64 column is only filled for jobs completed before the blob store
+        columns.extend((DBCropJob.svg_base64, DBCropJob.svg_sha256))
+    if "mask_contours" in fields:
+        columns.append(DBCropJob.mask_contours_json)
+    return columns
+
+
+# Job data of rows read with _job_status_columns by job ID, cached when nothing is left out
+def _job_data_from_rows(
+    db: Session, db_jobs: List[Any], fields: FrozenSet[str]
+) -> Dict[str, Dict[str, Any]]:
+
+    # SVG results in the blob store are fetched together and sent as base64
+    svg_blobs = {}
+    if "svg" in fields:
+        svg_blobs = blob_store.get_many(
+            db,
+            [
+                db_job.svg_sha256
+                for db_job in db_jobs
+                if db_job.svg_base64 is None and db_job.svg_sha256 is not None
+            ],
+        )
+
+    job_data_by_id = {}
+    for db_job in db_jobs:
+        svg = None
+        if "svg" in fields:
+            svg = db_job.svg_base64
+            if svg is None and db_job.svg_sha256 in svg_blobs:
+                svg = base64.b64encode(svg_blobs[db_job.svg_sha256]).decode("ascii")
+        job_data = build_job_data(
+            db_job.job_id,
+            db_job.status,
+            svg,
+            db_job.mask_contours_json if "mask_contours" in fields else None,
+        )
+        # Only completed jobs have results, the data of any other job is complete
+        if fields >= {"svg", "mask_contours"} or db_job.status != "completed":
+            job_result_cache.set(db_job.job_id, job_data)
+        job_data_by_id[db_job.job_id] = job_data
+    return job_data_by_id
+
 
-# Maximum size for the LRU cache to store job data
-LRU_CACHE_MAXSIZE = 128
+# Restrict job data to the id, the status and the selected fields
+def _select_status_fields(
+    job_data: Dict[str, Any], fields: FrozenSet[str]
+) -> Dict[str, Any]:
+    if fields == JOB_STATUS_FIELDS:
+        return job_data
+    return {
+        key: value
+        for key, value in job_data.items()
+        if key in ("id", "status") or key in fields
+    }
 
 
-# Helper function to get job data from DB, intended to be cached with background task.
-@lru_cache(maxsize=LRU_CACHE_MAXSIZE)
-def _get_job_data_from_db_cached(job_id: str) -> Dict[str, str]:
+# Helper function to get job data, served from the job result cache when possible.
+# Only the columns of the selected fields are read, the other fields may be left empty.
+def _get_job_data_from_db_cached(
+    job_id: str, fields: FrozenSet[str] = JOB_STATUS_FIELDS
+) -> Optional[Dict[str, Any]]:
 
-    db = SessionLocal()  # Create a new session for this cached call
+    # Serve the cached result if present and still fresh
+    job_data = job_result_cache.get(job_id)
+    if job_data is not None:
+        return job_data
+
+    db = SessionLocal()  # Create a new session for this lookup
     try:
-        # Query the database for the job with the given job_id
-        db_job = db.query(DBCropJob).filter(DBCropJob.job_id == job_id).first()
+        db_job = (
+            db.query(*_job_status_columns(fields))
+            .filter(DBCropJob.job_id == job_id)
+            .first()
+        )
         if db_job:
             # Prepare a dictionary that can be used to construct the Pydantic model
-            return {
-                "id": db_job.job_id,
-                "status": db_job.status,
-                "svg": db_job.svg_base64,
-                "mask_contours": db_job.mask_contours_json,
-                "error": (
-                    None if db_job.status != "failed" else "Job processing failed."
-                ),  # Dummy error msg
-            }
+            return _job_data_from_rows(db, [db_job], fields)[job_id]
         return None
     finally:
         db.close()
 
 
+# Find a completed or in-flight job for the same image and landmarks, completed first
+def _find_existing_job(db: Session, image_sha256: str, landmarks_sha256: str):
+    return (
+        db.query(DBCropJob.job_id, DBCropJob.status)
+        .filter(
+            DBCropJob.image_sha256 == image_sha256,
+            DBCropJob.landmarks_sha256 == landmarks_sha256,
+            DBCropJob.status.in_(("completed",) + IN_FLIGHT_JOB_STATUSES),
+        )
+        .order_by(case((DBCropJob.status == "completed", 0), else_=1))
+        .first()
+    )
+
+
+# Find the completed or in-flight jobs of many (image, landmarks) hash pairs in one query
+def _find_existing_jobs(
+    db: Session, keys: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Any]:
+
+    existing_jobs = {}
+    if not keys:
+        return existing_jobs
+    rows = (
+        db.query(
+            DBCropJob.job_id,
+            DBCropJob.status,
+            DBCropJob.image_sha256,
+            DBCropJob.landmarks_sha256,
+        )
+        .filter(
+            DBCropJob.image_sha256.in_({image_sha256 for image_sha256, _ in keys}),
+            DBCropJob.status.in_(("completed",) + IN_FLIGHT_JOB_STATUSES),
+        )
+        .order_by(case((DBCropJob.status == "completed", 0), else_=1))
+        .all()
+    )
+    wanted = set(keys)
+    for row in rows:
+        key = (row.image_sha256, row.landmarks_sha256)
+        # Completed jobs come first, as in _find_existing_job
+        if key in wanted and key not in existing_jobs:
+            existing_jobs[key] = row
+    return existing_jobs
+
+
+# Decode the image of a submission and hash it with the landmarks, so dedup is an index
+# probe, not a TEXT comparison; the image hash is also its blob store key
+def _hash_submission(
+    payload: SubmitPayload,
+) -> Tuple[List[Dict[str, Any]], bytes, str, str]:
+    landmarks_json = [p.dict() for p in payload.landmarks]
+    image_bytes = decode_base64_content(payload.image)
+    return (
+        landmarks_json,
+        image_bytes,
+        blob_key(image_bytes),
+        hash_landmarks(landmarks_json),
+    )
+
+
+# New job row referencing its image and segmentation map blobs
+def _new_crop_job(
+    image_sha256: str,
+    landmarks_sha256: str,
+    landmarks_json: List[Dict[str, Any]],
+    segmentation_map_sha256: str,
+    created_at: datetime,
+) -> DBCropJob:
+    return DBCropJob(
+        job_id=str(uuid.uuid4()),
+        landmarks_json=landmarks_json,
+        image_sha256=image_sha256,
+        landmarks_sha256=landmarks_sha256,
+        segmentation_map_sha256=segmentation_map_sha256,
+        status="pending",
+        created_at=created_at,
+    )
+
+
+# Build the submission response for a job found by _find_existing_job
+def _existing_job_response(existing_job) -> JobResponse:
+    if existing_job.status == "completed":
+        console.log(
+            f"[success]Identical image already processed (Job ID: {existing_job.job_id}). Returning cached result.[/success]"
+        )
+    else:
+        job_coalesced_counter.inc()
+        console.log(
+            f"[success]Identical job already {existing_job.status} (Job ID: {existing_job.job_id}). Coalescing submission.[/success]"
+        )
+    return JobResponse(id=existing_job.job_id, status=existing_job.status)
+
+
+# Check whether count more jobs overflow the job queue (a query with the database queue)
+def _queue_is_full(count: int) -> bool:
+
+    # A batch is only accepted when every one of its jobs fits in the queue
+    if count > 1:
+        return job_queue.qsize() + count > job_queue.maxsize
+    return job_queue.full()
+
+
+# Reject new submissions when the job queue is full, instead of letting the backlog grow without limit
+async def _check_queue_capacity(count: int = 1) -> None:
+
+    # An unbounded queue is never full: skip counting its pending jobs
+    if job_queue.maxsize <= 0:
+        return
+    if await run_in_threadpool(_queue_is_full, count):
+        job_rejected_counter.inc()
+        console.log("[warning]Job queue is full, rejecting submission.[/warning]")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The job queue is full. Please retry later.",
+            headers={"Retry-After": str(JOB_QUEUE_RETRY_AFTER_SECONDS)},
+        )
+
+
+# Store a new pending job and add it to the job queue
+async def _create_crop_job(
+    db: Session,
+    image_sha256: str,
+    landmarks_sha256: str,
+    landmarks_json: List[Dict[str, Any]],
+    image_bytes: bytes,
+    segmentation_map_bytes: bytes,
+) -> JobResponse:
+
+    # Store the image and segmentation map (once per content) and the job row referencing them
+    segmentation_map_sha256 = blob_key(segmentation_map_bytes)
+    blob_store.put_many(
+        db, {image_sha256: image_bytes, segmentation_map_sha256: segmentation_map_bytes}
+    )
+    db_job = _new_crop_job(
+        image_sha256,
+        landmarks_sha256,
+        landmarks_json,
+        segmentation_map_sha256,
+        datetime.utcnow(),
+    )
+    new_job_id = db_job.job_id
+    db.add(db_job)
+    try:
+        db.commit()  # Commit the new job to the database
+    except IntegrityError:
+        # Another request or replica queued the same job in the meantime
+        db.rollback()
+        existing_job = _find_existing_job(db, image_sha256, landmarks_sha256)
+        if existing_job is None:
+            raise
+        return _existing_job_response(existing_job)
+
+    # Add the new job ID to the job queue for processing.
+    # There is no await since the full() check, so this cannot block.
+    await job_queue.put(new_job_id)
+    console.log(f"[info]Job {new_job_id} submitted and added to queue.[/info]")
+
+    # Return the job response with the new job ID
+    return JobResponse(id=new_job_id, status="pending")
+
+
 # crop submission endpoint
 @router.post(
     "/crop/submit",
@@ -55,71 +353,307 @@ async def submit_frontal_crop(
     payload: SubmitPayload, db: Session = Depends(get_db)
 ) -> JobResponse:
     try:
-        # Clear the LRU cache to ensure fresh data
-        _get_job_data_from_db_cached.cache_clear()
-        console.log("[info]LRU cache for job status cleared.[/info]")
-
-        # Check if the image is already processed and cached
-        existing_completed_job = (
-            db.query(DBCropJob)
-            .filter(
-                DBCropJob.image_base64 == payload.image, DBCropJob.status == "completed"
-            )
-            .first()
+        # Hash the image and landmarks so dedup is an index probe, not a TEXT comparison.
+        # Decoding and hashing a multi-MB image runs off the event loop.
+        (
+            landmarks_json,
+            image_bytes,
+            image_sha256,
+            landmarks_sha256,
+        ) = await run_in_threadpool(_hash_submission, payload)
+
+        # Check if the image is already processed, queued or being processed
+        existing_job = _find_existing_job(db, image_sha256, landmarks_sha256)
+
+        # If an identical job exists, return its job ID instead of creating a new one
+        if existing_job:
+            return _existing_job_response(existing_job)
+
+        # If the image is not cached, create a new job
+        await _check_queue_capacity()
+        return await _create_crop_job(
+            db,
+            image_sha256,
+            landmarks_sha256,
+            landmarks_json,
+            image_bytes,
+            decode_base64_content(payload.segmentation_map),
         )
 
-        # If an identical image has been processed, return the cached job ID
-        if existing_completed_job:
-            console.log(
-                f"[success]Identical image already processed (Job ID: {existing_completed_job.job_id}). Returning cached result.[/success]"
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Rollback the database session in case of an error
+        db.rollback()
+        console.log(f"[error]An error occurred during job submission: {e}[/error]")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred during job submission: {str(e)}",
+        )
+
+
+# Binary crop submission endpoint: the same job as /crop/submit, sent as multipart/form-data
+# with `image` and `segmentation_map` file parts and a `landmarks` JSON text part.
+# The files are hashed and spooled while they stream in, so nothing is JSON parsed or
+# base64 decoded, and their bytes go to the blob store as they are.
+@router.post(
+    "/crop/submit/upload",
+    response_model=JobResponse,
+    summary="Submit a frontal crop as a multipart/form-data upload",
+)
+async def submit_frontal_crop_upload(
+    request: Request, db: Session = Depends(get_db)
+) -> JobResponse:
+    try:
+        fields, uploads = await read_multipart_upload(request)
+    except UploadTooLargeError as e:
+        console.log(f"[warning]Rejected upload: {e}[/warning]")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e)
+        )
+    except MultipartUploadError as e:
+        console.log(f"[warning]Rejected upload: {e}[/warning]")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        # Validate the parts the same way SubmitPayload validates the JSON body
+        image = uploads.get("image")
+        segmentation_map = uploads.get("segmentation_map")
+        if image is None or segmentation_map is None or "landmarks" not in fields:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="The upload needs `image` and `segmentation_map` files and a `landmarks` field.",
+            )
+        try:
+            landmarks = parse_obj_as(List[Point], json.loads(fields["landmarks"]))
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Invalid landmarks: {e}",
             )
-            return JobResponse(id=existing_completed_job.job_id, status="completed")
 
-        # If the image is not cached, create a new job
-        new_job_id = str(uuid.uuid4())
-
-        # Create a new crop job entry in the database
-        db_job = DBCropJob(
-            job_id=new_job_id,
-            image_base64=payload.image,
-            landmarks_json=[p.dict() for p in payload.landmarks],
-            segmentation_map_base64=payload.segmentation_map,
-            status="pending",
-            created_at=datetime.utcnow(),
-        )
-        db.add(db_job)
-        db.commit()  # Commit the new job to the database
-        db.refresh(db_job)  # Refresh the job to get the latest state
+        try:
+            # The image hash was computed while streaming, over the same decoded
+            # bytes hash_image_base64 hashes, so uploads dedup against JSON submissions
+            landmarks_json = [p.dict() for p in landmarks]
+            landmarks_sha256 = hash_landmarks(landmarks_json)
+            existing_job = _find_existing_job(db, image.sha256, landmarks_sha256)
+            if existing_job:
+                return _existing_job_response(existing_job)
+
+            # Only a new job reads the spooled files back
+            image_bytes = await run_in_threadpool(image.read)
+            segmentation_map_bytes = await run_in_threadpool(segmentation_map.read)
+            await _check_queue_capacity()
+            return await _create_crop_job(
+                db,
+                image.sha256,
+                landmarks_sha256,
+                landmarks_json,
+                image_bytes,
+                segmentation_map_bytes,
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            # Rollback the database session in case of an error
+            db.rollback()
+            console.log(f"[error]An error occurred during job submission: {e}[/error]")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"An error occurred during job submission: {str(e)}",
+            )
+    finally:
+        for upload in uploads.values():
+            upload.close()
+
 
-        # Add the new job ID to the job queue for processing
-        await job_queue.put(new_job_id)
-        console.log(f"[info]Job {new_job_id} submitted and added to queue.[/info]")
+# Batch crop submission endpoint: validates every item, dedups them within the batch and
+# against the database, inserts the new jobs in one transaction and enqueues them together
+@router.post(
+    "/crop/submit:batch",
+    response_model=BatchJobResponse,
+    summary="Submit a batch of frontal crops for asynchronous processing",
+)
+async def submit_frontal_crop_batch(
+    payload: BatchSubmitPayload, db: Session = Depends(get_db)
+) -> BatchJobResponse:
+    try:
+        # Decoding and hashing hundreds of multi-MB images would stall the event loop, use a thread
+        hashed_items = await run_in_threadpool(
+            lambda: [_hash_submission(item) for item in payload.items]
+        )
+        item_keys = [
+            (image_sha256, landmarks_sha256)
+            for _, _, image_sha256, landmarks_sha256 in hashed_items
+        ]
 
-        # Return the job response with the new job ID
-        return JobResponse(id=new_job_id, status="pending")
+        # Identical items share one job; jobs already known are returned as they are
+        existing_jobs = _find_existing_jobs(db, item_keys)
+        responses: Dict[Tuple[str, str], JobResponse] = {
+            key: _existing_job_response(existing_job)
+            for key, existing_job in existing_jobs.items()
+        }
+        new_items: Dict[Tuple[str, str], Tuple[SubmitPayload, List[Dict[str, Any]], bytes]] = {}
+        for item, (landmarks_json, image_bytes, _, _), key in zip(
+            payload.items, hashed_items, item_keys
+        ):
+            if key not in responses and key not in new_items:
+                new_items[key] = (item, landmarks_json, image_bytes)
 
+        if new_items:
+            # Only the segmentation maps of new jobs are decoded
+            segmentation_maps = await run_in_threadpool(
+                lambda: {
+                    key: decode_base64_content(item.segmentation_map)
+                    for key, (item, _, _) in new_items.items()
+                }
+            )
+            await _check_queue_capacity(len(new_items))
+
+            # Store every blob once and insert every new job, in one transaction
+            blobs: Dict[str, bytes] = {}
+            new_jobs: Dict[Tuple[str, str], DBCropJob] = {}
+            created_at = datetime.utcnow()
+            for key, (_, landmarks_json, image_bytes) in new_items.items():
+                segmentation_map_sha256 = blob_key(segmentation_maps[key])
+                blobs[key[0]] = image_bytes
+                blobs[segmentation_map_sha256] = segmentation_maps[key]
+                new_jobs[key] = _new_crop_job(
+                    key[0], key[1], landmarks_json, segmentation_map_sha256, created_at
+                )
+            blob_store.put_many(db, blobs)
+            db.add_all(list(new_jobs.values()))
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent submission queued some of the same jobs:
+                # fall back to creating the jobs of this batch one by one
+                db.rollback()
+                console.log(
+                    "[warning]Batch insert conflicted with concurrent submissions, inserting jobs one by one.[/warning]"
+                )
+                for key, (_, landmarks_json, image_bytes) in new_items.items():
+                    existing_job = _find_existing_job(db, *key)
+                    if existing_job:
+                        responses[key] = _existing_job_response(existing_job)
+                        continue
+                    responses[key] = await _create_crop_job(
+                        db,
+                        key[0],
+                        key[1],
+                        landmarks_json,
+                        image_bytes,
+                        segmentation_maps[key],
+                    )
+            else:
+                # There is no await since the capacity check, so this cannot block
+                await job_queue.put_many([db_job.job_id for db_job in new_jobs.values()])
+                for key, db_job in new_jobs.items():
+                    responses[key] = JobResponse(id=db_job.job_id, status="pending")
+                console.log(
+                    f"[info]Batch of {len(payload.items)} item(s) submitted, {len(new_jobs)} new job(s) added to queue.[/info]"
+                )
+
+        # One job per item, in the order of the items
+        return BatchJobResponse(jobs=[responses[key] for key in item_keys])
+
+    except HTTPException:
+        raise
     except Exception as e:
         # Rollback the database session in case of an error
         db.rollback()
-        console.log(f"[error]An error occurred during job submission: {e}[/error]")
+        console.log(f"[error]An error occurred during batch submission: {e}[/error]")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred during job submission: {str(e)}",
+            detail=f"An error occurred during batch submission: {str(e)}",
         )
 
 
+# Job data once the job reaches a final status or the timeout elapses, whichever comes first
+async def _wait_for_job_data(
+    job_id: str, timeout: float, fields: FrozenSet[str] = JOB_STATUS_FIELDS
+) -> Optional[Dict[str, Any]]:
+
+    # Subscribe before reading, a job finishing in between still wakes this request
+    with job_notifier.subscribe(job_id) as finished:
+        job_data = _get_job_data_from_db_cached(job_id, fields)
+        if job_data is None or job_data["status"] in TERMINAL_JOB_STATUSES:
+            return job_data
+        try:
+            await asyncio.wait_for(finished.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    return _get_job_data_from_db_cached(job_id, fields)
+
+
+# Server-Sent Events of a job: its status now, then on every change until it is final
+async def _job_status_events(job_id: str) -> AsyncIterator[str]:
+
+    # Subscribe before reading, as for the long-poll status request
+    with job_notifier.subscribe(job_id) as finished:
+        job_data = _get_job_data_from_db_cached(job_id)
+        last_status = None
+        while job_data is not None:
+            if job_data["status"] != last_status:
+                last_status = job_data["status"]
+                # A status that cannot be serialized ends the stream with an error event
+                # instead of an empty response
+                try:
+                    event_data = JobStatusResponse(**job_data).json()
+                except ValidationError as e:
+                    console.log(
+                        f"[error]Could not serialize the status of job '{job_id}': {e}[/error]"
+                    )
+                    error_data = JobStatusResponse(
+                        id=job_id, status=last_status, error="Job status could not be serialized."
+                    ).json(exclude_unset=True)
+                    yield f"event: error\ndata: {error_data}\n\n"
+                    return
+                yield f"event: status\ndata: {event_data}\n\n"
+            if last_status in TERMINAL_JOB_STATUSES:
+                return
+
+            # A quiet stream still re-checks the status, in case a notification was lost
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=JOB_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+            finished.clear()
+            job_data = _get_job_data_from_db_cached(job_id)
+
+
 # get crop status endpoint
 @router.get(
     "/crop/status/{job_id}",
     response_model=JobStatusResponse,
+    response_model_exclude_unset=True,
     summary="Retrieve the status and results of a crop processing job",
 )
 async def get_crop_job_status(
-    job_id: str, db: Session = Depends(get_db)
+    job_id: str,
+    wait: float = Query(
+        0,
+        ge=0,
+        description="Seconds to wait for the job to finish before answering (long-poll).",
+    ),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields to return, e.g. `status` or `status,mask_contours`. All by default.",
+    ),
+    db: Session = Depends(get_db),
 ) -> JobStatusResponse:
+    selected_fields = _parse_status_fields(fields)
 
-    # Attempt to retrieve job data using the LRU cached helper function
-    job_data_dict = _get_job_data_from_db_cached(job_id)
+    # Attempt to retrieve job data using the cached helper function,
+    # holding the request until the job finishes when the client asked to wait
+    if wait > 0:
+        job_data_dict = await _wait_for_job_data(
+            job_id, min(wait, JOB_STATUS_WAIT_MAX_SECONDS), selected_fields
+        )
+    else:
+        job_data_dict = _get_job_data_from_db_cached(job_id, selected_fields)
 
     # If the job data is not found in the cache, query the database directly
     if not job_data_dict:
@@ -133,4 +667,198 @@ async def get_crop_job_status(
     console.log(
         f"[info]Retrieving status for job {job_id}. Status: {job_data_dict['status']}[/info]"
     )
-    return JobStatusResponse(**job_data_dict)
+    # Fields left out are unset, so they are left out of the response too
+    return JobStatusResponse(**_select_status_fields(job_data_dict, selected_fields))
+
+
+# batch crop status endpoint: cached jobs are served from the result cache,
+# the others are read in one query that never loads the image blobs
+@router.post(
+    "/crop/status:batch",
+    response_model=BatchStatusResponse,
+    response_model_exclude_unset=True,
+    summary="Retrieve the status and results of many crop processing jobs",
+)
+async def get_crop_job_status_batch(
+    payload: BatchStatusPayload,
+    fields: Optional[str] = Query(
+        None,
+        description="Comma separated fields to return for every job. All by default.",
+    ),
+) -> BatchStatusResponse:
+    selected_fields = _parse_status_fields(fields)
+
+    job_data_by_id: Dict[str, Dict[str, Any]] = {}
+    for job_id in payload.ids:
+        job_data = job_result_cache.get(job_id)
+        if job_data is not None:
+            job_data_by_id[job_id] = job_data
+
+    uncached_job_ids = {job_id for job_id in payload.ids if job_id not in job_data_by_id}
+    if uncached_job_ids:
+        db = SessionLocal()
+        try:
+            db_jobs = (
+                db.query(*_job_status_columns(selected_fields))
+                .filter(DBCropJob.job_id.in_(uncached_job_ids))
+                .all()
+            )
+            job_data_by_id.update(_job_data_from_rows(db, db_jobs, selected_fields))
+        finally:
+            db.close()
+
+    console.log(
+        f"[info]Retrieving status for {len(payload.ids)} job(s), {len(uncached_job_ids)} from the database.[/info]"
+    )
+    return BatchStatusResponse(
+        jobs=[
+            JobStatusResponse(
+                **_select_status_fields(job_data_by_id[job_id], selected_fields)
+            )
+            for job_id in payload.ids
+            if job_id in job_data_by_id
+        ],
+        missing=[job_id for job_id in payload.ids if job_id not in job_data_by_id],
+    )
+
+
+# job status event stream endpoint
+@router.get(
+    "/crop/events/{job_id}",
+    summary="Stream the status of a crop processing job as Server-Sent Events",
+    response_class=StreamingResponse,
+)
+async def stream_crop_job_status(job_id: str) -> StreamingResponse:
+
+    job_data_dict = _get_job_data_from_db_cached(job_id)
+    if not job_data_dict:
+        console.log(f"[warning]Job with ID '{job_id}' not found.[/warning]")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID '{job_id}' not found.",
+        )
+
+    console.log(f"[info]Streaming status events for job {job_id}.[/info]")
+    return StreamingResponse(
+        _job_status_events(job_id),
+        media_type="text/event-stream",
+        # Keep proxies from caching or buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Read the status and blob keys of a job result, never the documents themselves
+def _lookup_svg_result(job_id: str):
+    db = SessionLocal()  # Create a new session for this lookup
+    try:
+        return (
+            db.query(
+                DBCropJob.status,
+                DBCropJob.svg_sha256,
+                DBCropJob.svg_gzip_sha256,
+                DBCropJob.svg_br_sha256,
+            )
+            .filter(DBCropJob.job_id == job_id)
+            .first()
+        )
+    finally:
+        db.close()
+
+
+# Load the SVG copy for the negotiated encoding and return it with the encoding served:
+# a compressed copy missing from the blob store falls back to the document itself
+def _load_svg_result(
+    job_id: str,
+    svg_sha256: Optional[str],
+    encoding: str,
+    compressed_keys: Dict[str, str],
+) -> Tuple[bytes, str]:
+    db = SessionLocal()
+    try:
+        if encoding != "identity":
+            content = blob_store.get(db, compressed_keys[encoding])
+            if content is not None:
+                return content, encoding
+            console.log(
+                f"[warning]Blob '{compressed_keys[encoding]}' is missing from the blob store, serving job {job_id} uncompressed.[/warning]"
+            )
+
+        # The document is a blob, or base64 text for jobs completed before the blob store
+        content = blob_store.get(db, svg_sha256) if svg_sha256 is not None else None
+        if content is None:
+            content = base64.b64decode(
+                db.query(DBCropJob.svg_base64).filter(DBCropJob.job_id == job_id).scalar()
+            )
+        return content, "identity"
+    finally:
+        db.close()
+
+
+# raw SVG result endpoint: the SVG document itself, compressed and cacheable
+@router.get(
+    "/crop/result/{job_id}.svg",
+    response_class=Response,
+    summary="Retrieve the SVG result of a completed crop processing job",
+    responses={
+        200: {"content": {"image/svg+xml": {}}},
+        304: {"description": "The cached copy identified by If-None-Match is current."},
+    },
+)
+async def get_crop_job_result_svg(job_id: str, request: Request) -> Response:
+
+    # The lookups are blocking DB/filesystem I/O, run them off the event loop
+    db_job = await run_in_threadpool(_lookup_svg_result, job_id)
+    if not db_job:
+        console.log(f"[warning]Job with ID '{job_id}' not found.[/warning]")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID '{job_id}' not found.",
+        )
+    if db_job.status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job with ID '{job_id}' has no result (status: {db_job.status}).",
+        )
+
+    # Blob keys of the precompressed copies
+    compressed_keys = {
+        encoding: key
+        for encoding, key in (("br", db_job.svg_br_sha256), ("gzip", db_job.svg_gzip_sha256))
+        if key is not None
+    }
+    available = list(compressed_keys)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), available)
+
+    # Results completed before precompression have no stored hash: serve them as they are
+    svg_sha256 = db_job.svg_sha256
+    content = None
+    if svg_sha256 is None:
+        content, encoding = await run_in_threadpool(
+            _load_svg_result, job_id, None, "identity", compressed_keys
+        )
+        svg_sha256 = hashlib.sha256(content).hexdigest()
+
+    # A completed result never changes
+    headers = {
+        "ETag": svg_result_etag(svg_sha256, encoding),
+        "Cache-Control": f"public, max-age={SVG_RESULT_CACHE_MAX_AGE_SECONDS}, immutable",
+        "Vary": "Accept-Encoding",
+    }
+    if if_none_match_matches(request.headers.get("if-none-match"), svg_sha256):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Load the one copy being served, the document itself if its compressed copy is missing
+    if content is None:
+        content, served_encoding = await run_in_threadpool(
+            _load_svg_result, job_id, svg_sha256, encoding, compressed_keys
+        )
+        if served_encoding != encoding:
+            encoding = served_encoding
+            headers["ETag"] = svg_result_etag(svg_sha256, encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    console.log(
+        f"[info]Serving the SVG result of job {job_id} ({encoding}, {len(content)} bytes).[/info]"
+    )
+    return Response(content=content, media_type="image/svg+xml", headers=headers)
@@ -1,18 +1,55 @@
+import base64
+import hashlib
+import json
+import types
+import asyncio
+import functools
 import pytest
 from fastapi import FastAPI
 from typing import Generator
 from datetime import datetime
 from server.api.routers import frontal
 from fastapi.testclient import TestClient
-from models.crop_model import SubmitPayload
+from models.crop_model import SubmitPayload, DBCropJob, DBBlob
+from services.svg_result import compress_svg_result, svg_result_blobs
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from drivers.database import Base, engine, get_db, SessionLocal
 from unittest.mock import patch, MagicMock, AsyncMock
 
 
+# Mask contours of a completed job, as the worker stores them
+MASK_CONTOURS = [
+    {
+        "name": "right_cheek",
+        "path_d": "M 1.0 2.0 L 3.0 4.0 L 1.0 4.0 Z",
+        "points": [[1.0, 2.0], [3.0, 4.0], [1.0, 4.0]],
+    }
+]
+
+# Create the tables in the test database used by the job queue
+@pytest.fixture(autouse=True)
+def tables() -> Generator[None, None, None]:
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
 # Patch dependencies and FastAPI app for testing
 @pytest.fixture
 def client() -> TestClient:
     app = FastAPI()
     app.include_router(frontal.router)
+
+    # Resolve get_db at request time so tests can patch frontal.get_db
+    def override_get_db():
+        db = frontal.get_db()
+        if isinstance(db, types.GeneratorType):
+            yield from db
+        else:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
     return TestClient(app)
 
 
@@ -43,7 +80,7 @@ def sample_db_job() -> MagicMock:
     mock_job.job_id = "test-job-id"
     mock_job.status = "completed"
     mock_job.svg_base64 = "svgdata"
-    mock_job.mask_contours_json = "contours"
+    mock_job.mask_contours_json = MASK_CONTOURS
     mock_job.image_base64 = "base64image"
     mock_job.landmarks_json = [{"x": 1, "y": 2}]
     mock_job.segmentation_map_base64 = "base64seg"
@@ -54,7 +91,7 @@ def sample_db_job() -> MagicMock:
 def test_submit_frontal_crop_new_job(client, mock_db, sample_payload) -> None:
     # Simulate no existing job
     db = MagicMock()
-    db.query().filter().first.return_value = None
+    db.query().filter().order_by().first.return_value = None
     db.add = MagicMock()
     db.commit = MagicMock()
     db.refresh = MagicMock()
@@ -74,7 +111,7 @@ def test_submit_frontal_crop_existing_job(
 ) -> None:
     # Simulate existing completed job
     db = MagicMock()
-    db.query().filter().first.return_value = sample_db_job
+    db.query().filter().order_by().first.return_value = sample_db_job
     mock_db.return_value = db
 
     response = client.post("/crop/submit", json=sample_payload)
@@ -113,7 +150,7 @@ def test_get_crop_job_status_found(client, sample_db_job) -> None:
         assert data["id"] == sample_db_job.job_id
         assert data["status"] == "completed"
         assert data["svg"] == "svgdata"
-        assert data["mask_contours"] == "contours"
+        assert data["mask_contours"] == MASK_CONTOURS
         assert data["error"] is None
 
 
@@ -124,3 +161,485 @@ def test_get_crop_job_status_not_found(client) -> None:
         response = client.get("/crop/status/nonexistent-job")
         assert response.status_code == 404
         assert "not found" in response.text.lower()
+
+
+def test_submit_frontal_crop_queue_full(client, mock_db, sample_payload) -> None:
+    # Simulate no existing job and a full bounded queue
+    db = MagicMock()
+    db.query().filter().order_by().first.return_value = None
+    mock_db.return_value = db
+    full_queue = MagicMock(maxsize=1)
+    full_queue.full.return_value = True
+    with patch("server.api.routers.frontal.job_queue", full_queue):
+        response = client.post("/crop/submit", json=sample_payload)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(
+            frontal.JOB_QUEUE_RETRY_AFTER_SECONDS
+        )
+        assert not full_queue.put.called
+
+
+def test_submit_frontal_crop_coalesces_in_flight_job(
+    client, mock_db, sample_payload, sample_db_job
+) -> None:
+    # Simulate an identical job that is still being processed
+    sample_db_job.status = "processing"
+    db = MagicMock()
+    db.query().filter().order_by().first.return_value = sample_db_job
+    mock_db.return_value = db
+
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock) as put:
+        response = client.post("/crop/submit", json=sample_payload)
+        assert response.status_code == 200
+        assert response.json() == {"id": "test-job-id", "status": "processing"}
+        assert not db.add.called
+        assert not put.called
+
+
+def test_submit_frontal_crop_coalesces_concurrent_insert(
+    client, mock_db, sample_payload, sample_db_job
+) -> None:
+    # Another replica inserts the same job between the lookup and the commit
+    sample_db_job.status = "pending"
+    db = MagicMock()
+    db.query().filter().order_by().first.side_effect = [None, sample_db_job]
+    db.commit.side_effect = IntegrityError("INSERT", {}, Exception("duplicate"))
+    mock_db.return_value = db
+
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock) as put:
+        response = client.post("/crop/submit", json=sample_payload)
+        assert response.status_code == 200
+        assert response.json() == {"id": "test-job-id", "status": "pending"}
+        assert db.rollback.called
+        assert not put.called
+
+
+def test_submit_frontal_crop_coalesces_in_database(client, sample_payload) -> None:
+    # Two submissions of the same image against the real test database
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock) as put:
+        first = client.post("/crop/submit", json=sample_payload).json()
+        second = client.post("/crop/submit", json=sample_payload).json()
+        assert first["status"] == "pending"
+        assert second == first
+        assert put.call_count == 1
+
+
+def test_get_job_data_does_not_load_blobs() -> None:
+    db = SessionLocal()
+    db.add(
+        DBCropJob(
+            job_id="blob-job",
+            image_base64="i" * 1000,
+            landmarks_json=[],
+            segmentation_map_base64="s" * 1000,
+            status="completed",
+            svg_base64="svgdata",
+            mask_contours_json=[],
+        )
+    )
+    db.commit()
+    db.close()
+    frontal.job_result_cache.invalidate("blob-job")
+
+    # Record every SELECT sent to the database
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        job_data = frontal._get_job_data_from_db_cached("blob-job")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        frontal.job_result_cache.invalidate("blob-job")
+
+    assert job_data["svg"] == "svgdata"
+    assert statements
+    assert all("image_base64" not in statement for statement in statements)
+    assert all("segmentation_map_base64" not in statement for statement in statements)
+
+
+def upload_parts(image: bytes, landmarks: str = '[{"x": 1, "y": 2}, {"x": 3, "y": 4}]') -> dict:
+    return {
+        "files": {
+            "image": ("face.jpg", image, "image/jpeg"),
+            "segmentation_map": ("map.png", b"segmentation", "image/png"),
+        },
+        "data": {"landmarks": landmarks},
+    }
+
+
+def test_submit_upload_stores_the_job_blobs(client) -> None:
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock) as put:
+        response = client.post("/crop/submit/upload", **upload_parts(b"\xff\xd8image"))
+        assert response.status_code == 200
+        assert response.json()["status"] == "pending"
+        assert put.call_count == 1
+
+    # The row references the uploaded bytes, stored as they are
+    db = SessionLocal()
+    try:
+        db_job = db.query(DBCropJob).filter(DBCropJob.job_id == response.json()["id"]).one()
+        assert db_job.image_base64 is None and db_job.segmentation_map_base64 is None
+        assert frontal.blob_store.get(db, db_job.image_sha256) == b"\xff\xd8image"
+        assert frontal.blob_store.get(db, db_job.segmentation_map_sha256) == b"segmentation"
+        assert db_job.landmarks_json == [{"x": 1, "y": 2}, {"x": 3, "y": 4}]
+    finally:
+        db.close()
+
+
+def test_submit_upload_coalesces_with_json_submission(client, sample_payload) -> None:
+    # The same image uploaded as bytes and as base64 JSON is the same job
+    image = b"\xff\xd8image"
+    sample_payload["image"] = base64.b64encode(image).decode("ascii")
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock) as put:
+        first = client.post("/crop/submit", json=sample_payload).json()
+        second = client.post("/crop/submit/upload", **upload_parts(image)).json()
+        assert second == first
+        assert put.call_count == 1
+
+
+def test_submit_upload_too_large(client) -> None:
+    # The body is rejected while it streams in, past a 64 byte limit
+    limited = functools.partial(frontal.read_multipart_upload, max_bytes=64)
+    with patch("server.api.routers.frontal.read_multipart_upload", limited):
+        response = client.post("/crop/submit/upload", **upload_parts(b"x" * 1024))
+    assert response.status_code == 413
+
+
+def test_submit_upload_invalid_parts(client) -> None:
+    response = client.post("/crop/submit/upload", **upload_parts(b"image", "not json"))
+    assert response.status_code == 422
+
+    response = client.post(
+        "/crop/submit/upload", files={"image": ("face.jpg", b"image", "image/jpeg")}
+    )
+    assert response.status_code == 422
+
+    response = client.post("/crop/submit/upload", json={"image": "base64image"})
+    assert response.status_code == 400
+
+    # A repeated file part is rejected
+    response = client.post(
+        "/crop/submit/upload",
+        files=[
+            ("image", ("face.jpg", b"image", "image/jpeg")),
+            ("image", ("other.jpg", b"other", "image/jpeg")),
+        ],
+        data={"landmarks": "[]"},
+    )
+    assert response.status_code == 400
+
+
+def add_job(job_id: str, job_status: str) -> None:
+    db = SessionLocal()
+    db.add(
+        DBCropJob(
+            job_id=job_id,
+            image_base64="image",
+            landmarks_json=[],
+            segmentation_map_base64="seg",
+            status=job_status,
+            svg_base64="svgdata" if job_status == "completed" else None,
+            mask_contours_json=MASK_CONTOURS if job_status == "completed" else None,
+        )
+    )
+    db.commit()
+    db.close()
+    frontal.job_result_cache.invalidate(job_id)
+
+
+@pytest.mark.asyncio
+async def test_wait_for_job_data_wakes_on_completion() -> None:
+    job_data = {"id": "job1", "status": "pending"}
+
+    def get_job_data(job_id, fields=None):
+        return dict(job_data)
+
+    with patch("server.api.routers.frontal._get_job_data_from_db_cached", get_job_data):
+        waiting = asyncio.ensure_future(frontal._wait_for_job_data("job1", 30))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        job_data["status"] = "completed"
+        frontal.job_notifier.notify("job1", "completed")
+        assert (await asyncio.wait_for(waiting, timeout=1))["status"] == "completed"
+
+
+def test_get_crop_job_status_wait_times_out(client) -> None:
+    add_job("pending-job", "pending")
+    with patch("server.api.routers.frontal.JOB_STATUS_WAIT_MAX_SECONDS", 0.05):
+        response = client.get("/crop/status/pending-job?wait=30")
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert frontal.job_notifier.waiter_count("pending-job") == 0
+
+
+def test_stream_crop_job_status_ends_with_the_final_status(client) -> None:
+    add_job("done-job", "completed")
+    with client.stream("GET", "/crop/events/done-job") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+    assert body.startswith("event: status\ndata: ")
+    assert json.loads(body.split("data: ", 1)[1])["status"] == "completed"
+
+    assert client.get("/crop/events/missing-job").status_code == 404
+
+
+def test_stream_crop_job_status_reports_serialization_errors(client) -> None:
+    job_data = {"id": "bad-job", "status": "completed", "mask_contours": [{"name": 1}]}
+    with patch(
+        "server.api.routers.frontal._get_job_data_from_db_cached", return_value=job_data
+    ):
+        with client.stream("GET", "/crop/events/bad-job") as response:
+            body = "".join(response.iter_text())
+    assert body.startswith("event: error\ndata: ")
+    assert json.loads(body.split("data: ", 1)[1]) == {
+        "id": "bad-job",
+        "status": "completed",
+        "error": "Job status could not be serialized.",
+    }
+
+
+def test_submit_frontal_crop_batch(client, sample_payload) -> None:
+    other_payload = dict(sample_payload, image="b3RoZXJpbWFnZQ==")
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock):
+        single = client.post("/crop/submit", json=sample_payload).json()
+
+    # Duplicates within the batch and jobs already in the database share their job
+    batch = {"items": [other_payload, sample_payload, other_payload]}
+    with patch(
+        "server.api.routers.frontal.job_queue.put_many", new_callable=AsyncMock
+    ) as put_many:
+        response = client.post("/crop/submit:batch", json=batch)
+        assert response.status_code == 200
+        jobs = response.json()["jobs"]
+        assert jobs[1] == single
+        assert jobs[0] == jobs[2]
+        assert jobs[0]["status"] == "pending" and jobs[0]["id"] != single["id"]
+        put_many.assert_called_once_with([jobs[0]["id"]])
+
+        # Submitting the batch again creates nothing
+        assert client.post("/crop/submit:batch", json=batch).json()["jobs"] == jobs
+        assert put_many.call_count == 1
+
+
+def test_submit_frontal_crop_batch_validation_and_backpressure(
+    client, sample_payload
+) -> None:
+    invalid_item = dict(sample_payload, landmarks=[{"x": 1}])
+    response = client.post("/crop/submit:batch", json={"items": [sample_payload, invalid_item]})
+    assert response.status_code == 422
+    assert client.post("/crop/submit:batch", json={"items": []}).status_code == 422
+
+    # Two new jobs do not fit in a queue with one free slot
+    small_queue = MagicMock(maxsize=2)
+    small_queue.qsize.return_value = 1
+    other_payload = dict(sample_payload, image="b3RoZXJpbWFnZQ==")
+    with patch("server.api.routers.frontal.job_queue", small_queue):
+        response = client.post(
+            "/crop/submit:batch", json={"items": [sample_payload, other_payload]}
+        )
+    assert response.status_code == 503
+    assert not small_queue.put_many.called
+    db = SessionLocal()
+    assert db.query(DBCropJob).count() == 0
+    db.close()
+
+
+def test_get_crop_job_status_batch(client) -> None:
+    add_job("done-job", "completed")
+    add_job("pending-job", "pending")
+    response = client.post(
+        "/crop/status:batch", json={"ids": ["pending-job", "missing-job", "done-job"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [(job["id"], job["status"]) for job in data["jobs"]] == [
+        ("pending-job", "pending"),
+        ("done-job", "completed"),
+    ]
+    assert data["jobs"][1]["svg"] == "svgdata"
+    assert data["jobs"][1]["mask_contours"] == MASK_CONTOURS
+    assert data["missing"] == ["missing-job"]
+    frontal.job_result_cache.invalidate("done-job")
+    frontal.job_result_cache.invalidate("pending-job")
+
+    # Completed jobs read from the database with only the contours selected
+    response = client.post(
+        "/crop/status:batch?fields=mask_contours", json={"ids": ["done-job", "pending-job"]}
+    )
+    assert response.status_code == 200
+    assert response.json()["jobs"] == [
+        {"id": "done-job", "status": "completed", "mask_contours": MASK_CONTOURS},
+        {"id": "pending-job", "status": "pending", "mask_contours": None},
+    ]
+    frontal.job_result_cache.invalidate("pending-job")
+
+
+def test_get_crop_job_result_svg(client) -> None:
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+    compressed = compress_svg_result(base64.b64encode(svg).decode("ascii"))
+    db = SessionLocal()
+    # A result completed before the blob store, with its gzip copy already a blob
+    frontal.blob_store.put(db, compressed.gzip)
+    db.add(
+        DBCropJob(
+            job_id="svg-job",
+            image_base64="image",
+            landmarks_json=[],
+            segmentation_map_base64="seg",
+            status="completed",
+            svg_base64=base64.b64encode(svg).decode("ascii"),
+            svg_sha256=compressed.sha256,
+            svg_gzip_sha256=compressed.gzip_sha256,
+        )
+    )
+    db.commit()
+    db.close()
+
+    response = client.get("/crop/result/svg-job.svg", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == svg
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert response.headers["etag"] == f'"{compressed.sha256}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert "content-encoding" not in response.headers
+
+    # The stored gzip copy is sent as it is (the client decompresses it)
+    response = client.get("/crop/result/svg-job.svg", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == f'"{compressed.sha256}-gzip"'
+    assert response.content == svg
+
+    response = client.get(
+        "/crop/result/svg-job.svg",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_get_crop_job_result_svg_missing_compressed_copy(client) -> None:
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><g/></svg>'
+    compressed = compress_svg_result(base64.b64encode(svg).decode("ascii"))
+    db = SessionLocal()
+    # Only the document is stored, its gzip copy is missing from the blob store
+    frontal.blob_store.put(db, compressed.svg)
+    db.add(
+        DBCropJob(
+            job_id="partial-svg-job",
+            landmarks_json=[],
+            status="completed",
+            svg_sha256=compressed.sha256,
+            svg_gzip_sha256=compressed.gzip_sha256,
+        )
+    )
+    db.commit()
+    db.close()
+
+    # The document is served uncompressed instead of failing
+    response = client.get("/crop/result/partial-svg-job.svg", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.content == svg
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == f'"{compressed.sha256}"'
+
+
+def test_get_crop_job_result_svg_without_result(client) -> None:
+    add_job("pending-job", "pending")
+    assert client.get("/crop/result/pending-job.svg").status_code == 409
+    assert client.get("/crop/result/missing-job.svg").status_code == 404
+
+
+def test_get_crop_job_status_fields(client) -> None:
+    add_job("done-job", "completed")
+
+    # Statements sent to the database while serving a status-only request
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/crop/status/done-job?fields=status")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.json() == {"id": "done-job", "status": "completed"}
+    assert statements
+    assert all("svg_base64" not in statement for statement in statements)
+    assert all("mask_contours_json" not in statement for statement in statements)
+
+    # The partial row was not cached: the full response still has the results
+    response = client.get("/crop/status/done-job?fields=mask_contours")
+    assert response.json() == {
+        "id": "done-job",
+        "status": "completed",
+        "mask_contours": MASK_CONTOURS,
+    }
+    response = client.get("/crop/status/done-job")
+    assert response.json()["svg"] == "svgdata"
+    assert response.json()["error"] is None
+
+    response = client.post("/crop/status:batch?fields=status", json={"ids": ["done-job"]})
+    assert response.json() == {
+        "jobs": [{"id": "done-job", "status": "completed"}],
+        "missing": [],
+    }
+    frontal.job_result_cache.invalidate("done-job")
+
+    assert client.get("/crop/status/done-job?fields=status,image").status_code == 422
+    assert client.get("/crop/status/done-job?fields=").status_code == 422
+
+
+def test_identical_images_are_stored_once(client, sample_payload) -> None:
+    # Two jobs of the same image with different landmarks share its blob
+    sample_payload["image"] = base64.b64encode(b"same image").decode("ascii")
+    other_landmarks = dict(sample_payload, landmarks=[{"x": 5, "y": 6}])
+    with patch("server.api.routers.frontal.job_queue.put", new_callable=AsyncMock):
+        first = client.post("/crop/submit", json=sample_payload).json()
+        second = client.post("/crop/submit", json=other_landmarks).json()
+    assert first["id"] != second["id"]
+
+    db = SessionLocal()
+    try:
+        assert db.query(DBBlob).count() == 2  # The image and the segmentation map
+        assert {job.image_sha256 for job in db.query(DBCropJob)} == {
+            hashlib.sha256(b"same image").hexdigest()
+        }
+    finally:
+        db.close()
+
+
+def test_completed_svg_blob_is_served(client) -> None:
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"></svg>'
+    compressed = compress_svg_result(base64.b64encode(svg).decode("ascii"))
+    db = SessionLocal()
+    frontal.blob_store.put_many(db, svg_result_blobs(compressed))
+    db.add(
+        DBCropJob(
+            job_id="blob-svg-job",
+            landmarks_json=[],
+            status="completed",
+            svg_sha256=compressed.sha256,
+            svg_gzip_sha256=compressed.gzip_sha256,
+            svg_br_sha256=compressed.br_sha256,
+            mask_contours_json=MASK_CONTOURS,
+        )
+    )
+    db.commit()
+    db.close()
+
+    response = client.get("/crop/status/blob-svg-job")
+    assert base64.b64decode(response.json()["svg"]) == svg
+    frontal.job_result_cache.invalidate("blob-svg-job")
+
+    response = client.get("/crop/result/blob-svg-job.svg", headers={"Accept-Encoding": "identity"})
+    assert response.content == svg
+
+    # The compressed copies are blobs too, the row only references them
+    response = client.get("/crop/result/blob-svg-job.svg", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == svg
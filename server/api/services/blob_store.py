@@ -0,0 +1,163 @@
+import os
+import re
+import base64
+import hashlib
+import tempfile
+from typing import Dict, Iterable, Optional
+from services.logger import console
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+# Store for the images, segmentation maps and SVG results of the jobs: "database"
+# (a bytea table) or "filesystem" (a directory shared by every replica)
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "database").lower()
+
+# Root directory of the filesystem blob store
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "./blobs")
+
+# Blobs are content-addressed: the key is the SHA-256 of the raw bytes, so a
+# document submitted many times is stored once and a key never changes meaning.
+BLOB_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+# Key of a blob: the hex SHA-256 of its bytes
+def blob_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# Blob store keeping the blobs in the crop_blobs table, in the transaction of the job row
+class DatabaseBlobStore:
+
+    def __init__(self, db_blob_model):
+        self.db_blob_model = db_blob_model
+
+    # Store blobs by key in the caller's transaction, existing keys are left as they are
+    def put_many(self, db, blobs: Dict[str, bytes]) -> None:
+        if not blobs:
+            return
+        rows = [
+            {"sha256": key, "data": data, "size": len(data)}
+            for key, data in blobs.items()
+        ]
+
+        # INSERT ... ON CONFLICT DO NOTHING also holds against concurrent inserts
+        dialect_name = db.get_bind().dialect.name
+        if dialect_name in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect_name == "postgresql" else sqlite_insert
+            db.execute(
+                insert(self.db_blob_model)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["sha256"])
+            )
+            return
+
+        existing_keys = {
+            row.sha256
+            for row in db.query(self.db_blob_model.sha256).filter(
+                self.db_blob_model.sha256.in_(list(blobs))
+            )
+        }
+        db.add_all(
+            self.db_blob_model(**row) for row in rows if row["sha256"] not in existing_keys
+        )
+
+    # Store one blob and return its key (computed unless the caller already has it)
+    def put(self, db, data: bytes, key: Optional[str] = None) -> str:
+        key = key or blob_key(data)
+        self.put_many(db, {key: data})
+        return key
+
+    # Blobs of the given keys that exist, in one query
+    def get_many(self, db, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        return {
+            row.sha256: row.data
+            for row in db.query(self.db_blob_model.sha256, self.db_blob_model.data)
+            .filter(self.db_blob_model.sha256.in_(keys))
+            .all()
+        }
+
+    def get(self, db, key: str) -> Optional[bytes]:
+        return self.get_many(db, [key]).get(key)
+
+
+# Blob store keeping every blob in a file named by its key under a shared directory.
+# Files are written to a temporary name and renamed, so readers never see a partial blob;
+# the database session is accepted for a common interface and not used.
+class FilesystemBlobStore:
+
+    def __init__(self, root: str = BLOB_STORE_PATH):
+        self.root = root
+
+    # Two levels of fan-out keep directories small: ab/cd/abcd...
+    def _path(self, key: str) -> str:
+        if not BLOB_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid blob key '{key}'.")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def put_many(self, db, blobs: Dict[str, bytes]) -> None:
+        for key, data in blobs.items():
+            path = self._path(key)
+            if os.path.exists(path):
+                continue
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(file_descriptor, "wb") as blob_file:
+                    blob_file.write(data)
+                    blob_file.flush()
+                    os.fsync(blob_file.fileno())
+                os.replace(temporary_path, path)
+            except BaseException:
+                os.unlink(temporary_path)
+                raise
+
+    def put(self, db, data: bytes, key: Optional[str] = None) -> str:
+        key = key or blob_key(data)
+        self.put_many(db, {key: data})
+        return key
+
+    def get_many(self, db, keys: Iterable[str]) -> Dict[str, bytes]:
+        blobs = {}
+        for key in set(keys):
+            try:
+                with open(self._path(key), "rb") as blob_file:
+                    blobs[key] = blob_file.read()
+            except FileNotFoundError:
+                continue
+        return blobs
+
+    def get(self, db, key: str) -> Optional[bytes]:
+        return self.get_many(db, [key]).get(key)
+
+
+# Create the blob store for the configured backend
+def create_blob_store(
+    db_blob_model, backend: str = BLOB_STORE_BACKEND, root: str = BLOB_STORE_PATH
+):
+    if backend == "database":
+        return DatabaseBlobStore(db_blob_model)
+    if backend == "filesystem":
+        console.log(f"[info]Storing job blobs under '{root}'.[/info]")
+        return FilesystemBlobStore(root)
+    raise ValueError(
+        f"Unknown BLOB_STORE_BACKEND '{backend}'. Expected 'database' or 'filesystem'."
+    )
+
+
+# A stored document as the base64 bytes the image processors take: the base64 column
+# of a job created before the blob store, else the blob of the key (None without either)
+def load_base64_bytes(
+    db, blob_store, legacy_base64: Optional[str], key: Optional[str]
+) -> Optional[bytes]:
+    if legacy_base64 is not None:
+        return legacy_base64.encode("utf-8")
+    if key is None:
+        return None
+    data = blob_store.get(db, key)
+    if data is None:
+        raise LookupError(f"Blob '{key}' is missing from the blob store.")
+    return base64.b64encode(data)
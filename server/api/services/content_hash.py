@@ -0,0 +1,25 @@
+import json
+import base64
+import hashlib
+import binascii
+from typing import Any
+
+
+# Bytes of a base64 document as submitted, the bytes that are hashed and stored
+def decode_base64_content(content_base64: str) -> bytes:
+    try:
+        return base64.b64decode(content_base64, validate=True)
+    except (binascii.Error, ValueError):
+        # Not valid base64: keep the text itself so the value is still deterministic
+        return content_base64.encode("utf-8")
+
+
+# SHA-256 of the decoded image bytes, so the same image hashes the same however it is uploaded
+def hash_image_base64(image_base64: str) -> str:
+    return hashlib.sha256(decode_base64_content(image_base64)).hexdigest()
+
+
+# SHA-256 of the landmarks serialized as canonical (sorted, compact) JSON
+def hash_landmarks(landmarks: Any) -> str:
+    canonical_json = json.dumps(landmarks, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical_json.encode("utf-8")).hexdigest()
@@ -0,0 +1,109 @@
+import os
+import threading
+import multiprocessing
+from typing import Optional
+from services.logger import console
+from services.image_backends import get_image_processor, use_image_processor_backend
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Number of worker processes used for image processing.
+# Defaults to the number of CPU cores; set to 0 to process images inline on the event loop.
+IMAGE_PROCESSING_POOL_SIZE = int(
+    os.getenv("IMAGE_PROCESSING_POOL_SIZE", str(os.cpu_count() or 1))
+)
+
+
+# Initializer executed once in every pool process to pre-import the image processor.
+# The backend selected by the parent is reused, so the children never re-run the benchmark.
+def _warm_up_image_processor(image_processor_backend: Optional[str] = None) -> None:
+    if image_processor_backend is not None:
+        use_image_processor_backend(image_processor_backend)
+    else:
+        get_image_processor()
+
+
+# No-op task used to force every pool process to start and run its initializer
+def _ping() -> int:
+    return os.getpid()
+
+
+# Start the worker processes and pre-warm them, so the first jobs do not pay the
+# process start-up cost
+def _start_process_pool(
+    pool_size: int, image_processor_backend: Optional[str]
+) -> ProcessPoolExecutor:
+
+    # Use "spawn" so the children do not inherit the event loop, DB connections or threads
+    process_pool = ProcessPoolExecutor(
+        max_workers=pool_size,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_up_image_processor,
+        initargs=(image_processor_backend,),
+    )
+    wait([process_pool.submit(_ping) for _ in range(pool_size)])
+    return process_pool
+
+
+# Process pool that can be started again after one of its processes died (OOM kill,
+# crash in a native backend): a broken ProcessPoolExecutor rejects every later job
+class ImageProcessingPool(Executor):
+
+    def __init__(self, pool_size: int, image_processor_backend: Optional[str] = None):
+        self.pool_size = pool_size
+        self.image_processor_backend = image_processor_backend
+        self._lock = threading.Lock()
+        self._process_pool = _start_process_pool(pool_size, image_processor_backend)
+
+    def submit(self, fn, /, *args, **kwargs):
+        return self._process_pool.submit(fn, *args, **kwargs)
+
+    # Replace the process pool if it is broken, True if it was. Every job running when
+    # a process died fails at once: the first caller restarts the pool, the others
+    # find it working again.
+    def restart_if_broken(self) -> bool:
+        with self._lock:
+            try:
+                self._process_pool.submit(_ping)
+                return False
+            except BrokenProcessPool:
+                pass
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = _start_process_pool(
+                self.pool_size, self.image_processor_backend
+            )
+        console.log(
+            f"[warning]Image processing pool was broken and restarted with {self.pool_size} process(es).[/warning]"
+        )
+        return True
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._process_pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+# Create the process pool used to run process_image_data_intensive off the event loop
+def create_image_processing_pool(
+    pool_size: int = IMAGE_PROCESSING_POOL_SIZE,
+    image_processor_backend: Optional[str] = None,
+) -> Optional[ImageProcessingPool]:
+
+    # A pool size of 0 (or less) keeps the processing inline
+    if pool_size <= 0:
+        console.log(
+            "[bold yellow]Image processing pool disabled: processing inline on the event loop.[/bold yellow]"
+        )
+        return None
+
+    executor = ImageProcessingPool(pool_size, image_processor_backend)
+    console.log(
+        f"[success]Image processing pool started with {pool_size} process(es).[/success]"
+    )
+    return executor
+
+
+# Shutdown the process pool, cancelling any job that has not started yet
+def shutdown_image_processing_pool(executor: Optional[Executor]) -> None:
+    if executor is None:
+        return
+    executor.shutdown(wait=True, cancel_futures=True)
+    console.log("[info]Image processing pool stopped.[/info]")
@@ -0,0 +1,204 @@
+import os
+import time
+import base64
+import random
+import functools
+import importlib
+from io import BytesIO
+from PIL import Image, ImageDraw
+from services.logger import console
+from typing import Any, Callable, Dict, Optional, Tuple
+from services.metrics import image_processor_backend_info
+from services.processing_options import IMAGE_PROCESSING_OPTIONS
+
+# Image processor backend: "py", "pyc", "npy", or "auto" to benchmark the available ones
+IMAGE_PROCESSOR_BACKEND = os.getenv("IMAGE_PROCESSOR_BACKEND", "auto").lower()
+
+# Number of timed runs per backend in the startup benchmark, the fastest run counts
+IMAGE_PROCESSOR_BENCHMARK_ROUNDS = int(
+    os.getenv("IMAGE_PROCESSOR_BENCHMARK_ROUNDS", "3")
+)
+
+# Modules implementing process_image_data_intensive, in order of preference
+IMAGE_PROCESSOR_BACKEND_MODULES = {
+    "pyc": "exlib.pyc.image_processor",
+    "npy": "exlib.npy.image_processor",
+    "py": "exlib.py.image_processor",
+}
+
+# Backend used by this process: (name, process_image_data_intensive)
+_selected_backend: Optional[Tuple[str, Callable[..., Any]]] = None
+
+
+# Import a backend and return its process_image_data_intensive
+def load_image_processor_backend(name: str) -> Callable[..., Any]:
+    if name not in IMAGE_PROCESSOR_BACKEND_MODULES:
+        raise ValueError(
+            f"Unknown IMAGE_PROCESSOR_BACKEND '{name}'. Expected 'auto' or one of {tuple(IMAGE_PROCESSOR_BACKEND_MODULES)}."
+        )
+    module = importlib.import_module(IMAGE_PROCESSOR_BACKEND_MODULES[name])
+    return module.process_image_data_intensive
+
+
+# Backends importable in this environment (pyc needs compiling, npy needs NumPy)
+def available_image_processor_backends() -> Dict[str, Callable[..., Any]]:
+    backends = {}
+    for name in IMAGE_PROCESSOR_BACKEND_MODULES:
+        try:
+            backends[name] = load_image_processor_backend(name)
+        except ImportError:
+            console.log(
+                f"[bold yellow]Image processor backend '{name}' is not available.[/bold yellow]"
+            )
+    return backends
+
+
+# Representative job: a 640x480 JPEG, four face contours of float landmarks and, when
+# segmentation labels are configured, a label map with an area per label
+def _benchmark_payload(
+    processing_options: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], bytes, Optional[bytes]]:
+    rng = random.Random(0)
+    img = Image.new("RGB", (640, 480), (200, 150, 120))
+    buffered = BytesIO()
+    img.save(buffered, format="JPEG")
+
+    landmarks = []
+    for center_x, center_y, radius, point_count in (
+        (260, 260, 80, 120),
+        (270, 200, 40, 40),
+        (380, 260, 80, 120),
+        (320, 250, 30, 60),
+    ):
+        landmarks.append(
+            [
+                {
+                    "x": center_x + rng.uniform(-radius, radius),
+                    "y": center_y + rng.uniform(-radius, radius),
+                }
+                for _ in range(point_count)
+            ]
+        )
+
+    segmentation_map_base64_bytes = None
+    segmentation_labels = (processing_options or {}).get("segmentation_labels")
+    if segmentation_labels:
+        label_map = Image.new("L", img.size, 0)
+        draw = ImageDraw.Draw(label_map)
+        for index, label in enumerate(segmentation_labels.values()):
+            left = 180 + 40 * index
+            draw.ellipse((left, 160, left + 200, 360), fill=label)
+        label_buffered = BytesIO()
+        label_map.save(label_buffered, format="PNG")
+        segmentation_map_base64_bytes = base64.b64encode(label_buffered.getvalue())
+
+    return (
+        {"landmarks": landmarks},
+        base64.b64encode(buffered.getvalue()),
+        segmentation_map_base64_bytes,
+    )
+
+
+# Fastest of `rounds` runs of a backend on the payload with the processing options
+# the workers use, in seconds
+def benchmark_image_processor_backend(
+    process_image: Callable[..., Any],
+    payload: Tuple[Dict[str, Any], bytes, Optional[bytes]],
+    rounds: int = IMAGE_PROCESSOR_BENCHMARK_ROUNDS,
+    processing_options: Optional[Dict[str, Any]] = None,
+) -> float:
+    landmarks_data, image_base64_bytes, segmentation_map_base64_bytes = payload
+    process_image_call = functools.partial(
+        process_image,
+        True,
+        landmarks_data,
+        image_base64_bytes,
+        segmentation_map_base64_bytes=segmentation_map_base64_bytes,
+        **(processing_options or {}),
+    )
+
+    # The first run is a warm-up (imports, caches) and is not timed
+    process_image_call()
+    best = float("inf")
+    for _ in range(max(1, rounds)):
+        start = time.perf_counter()
+        process_image_call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Use the given backend in this process and publish it as a metric
+def use_image_processor_backend(
+    name: str,
+    process_image: Optional[Callable[..., Any]] = None,
+    selection: str = "env",
+) -> str:
+    global _selected_backend
+
+    if process_image is None:
+        process_image = load_image_processor_backend(name)
+    _selected_backend = (name, process_image)
+    image_processor_backend_info.info({"backend": name, "selection": selection})
+    return name
+
+
+# Select the backend from IMAGE_PROCESSOR_BACKEND, benchmarking them on "auto"
+def select_image_processor_backend(
+    backend: str = IMAGE_PROCESSOR_BACKEND,
+    rounds: int = IMAGE_PROCESSOR_BENCHMARK_ROUNDS,
+    processing_options: Dict[str, Any] = IMAGE_PROCESSING_OPTIONS,
+) -> str:
+
+    if backend != "auto":
+        use_image_processor_backend(backend)
+        console.log(
+            f"[success]Image processor backend '{backend}' selected by IMAGE_PROCESSOR_BACKEND.[/success]"
+        )
+        return backend
+
+    # Time the configured code path (exclusions, simplification, output encoding...)
+    payload = _benchmark_payload(processing_options)
+    timings = {}
+    backends = available_image_processor_backends()
+    for name, process_image in backends.items():
+        try:
+            timings[name] = benchmark_image_processor_backend(
+                process_image, payload, rounds, processing_options
+            )
+        except Exception as e:
+            console.log(
+                f"[warning]Image processor backend '{name}' failed the benchmark: {e}[/warning]"
+            )
+
+    # exlib.py is always importable and is the last resort
+    if not timings:
+        return use_image_processor_backend("py", selection="fallback")
+
+    fastest = min(timings, key=timings.get)
+    use_image_processor_backend(fastest, backends[fastest], selection="benchmark")
+    console.log(
+        "[success]Image processor backend '{}' selected by benchmark ({}).[/success]".format(
+            fastest,
+            ", ".join(
+                f"{name}: {seconds * 1000:.2f} ms" for name, seconds in timings.items()
+            ),
+        )
+    )
+    return fastest
+
+
+# Name of the backend used by this process, None until one is selected
+def get_image_processor_backend_name() -> Optional[str]:
+    return _selected_backend[0] if _selected_backend is not None else None
+
+
+# process_image_data_intensive of the selected backend, selecting it on first use
+def get_image_processor() -> Callable[..., Any]:
+    if _selected_backend is None:
+        select_image_processor_backend()
+    return _selected_backend[1]
+
+
+# Entry point used by the workers; picklable, so process pools run the same backend
+def process_image_data_intensive(*args, **kwargs) -> Tuple[str, Any]:
+    return get_image_processor()(*args, **kwargs)
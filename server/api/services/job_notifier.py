@@ -0,0 +1,150 @@
+import os
+import json
+import select
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Set
+from sqlalchemy import text
+from services.logger import console
+from services.result_cache import job_result_cache, TERMINAL_JOB_STATUSES
+from services.metrics import job_status_waiters_gauge
+
+# Postgres NOTIFY channel used to announce finished jobs to every API replica
+JOB_NOTIFY_CHANNEL = os.getenv("JOB_NOTIFY_CHANNEL", "crop_job_status")
+
+# Seconds the LISTEN connection waits for a notification before checking for shutdown
+JOB_NOTIFY_LISTEN_POLL_SECONDS = float(os.getenv("JOB_NOTIFY_LISTEN_POLL_SECONDS", "1.0"))
+
+# Seconds before a lost LISTEN connection is opened again
+JOB_NOTIFY_RECONNECT_SECONDS = float(os.getenv("JOB_NOTIFY_RECONNECT_SECONDS", "5.0"))
+
+
+# Ask Postgres to announce a job status change once the caller's transaction commits.
+# Other databases have no NOTIFY, there only the in-process notifier wakes waiters.
+def queue_job_status_notification(db, job_id: str, job_status: str) -> None:
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {
+            "channel": JOB_NOTIFY_CHANNEL,
+            "payload": json.dumps({"id": job_id, "status": job_status}),
+        },
+    )
+
+
+# Wakes the requests waiting for a job to finish (long-poll status and event streams).
+# In-process workers call notify() directly; jobs finished by workers on other processes
+# or replicas arrive through a Postgres LISTEN connection running in a background thread.
+class JobNotifier:
+
+    def __init__(self, channel: str = JOB_NOTIFY_CHANNEL):
+        self.channel = channel
+        # job_id -> events of the requests waiting for it, only used on the event loop
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stop_listening = threading.Event()
+
+    # Register interest in a job before reading its status, so no completion is missed
+    # between the read and the wait. The event is set when the job reaches a final status.
+    @contextmanager
+    def subscribe(self, job_id: str) -> Iterator[asyncio.Event]:
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, set()).add(event)
+        job_status_waiters_gauge.inc()
+        try:
+            yield event
+        finally:
+            job_status_waiters_gauge.dec()
+            waiters = self._waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    # Number of requests currently waiting for a job
+    def waiter_count(self, job_id: str) -> int:
+        return len(self._waiters.get(job_id, ()))
+
+    # Wake the requests waiting for a job, on the event loop thread
+    def notify(self, job_id: str, job_status: str) -> None:
+        if job_status not in TERMINAL_JOB_STATUSES:
+            return
+        for event in self._waiters.get(job_id, ()):
+            event.set()
+
+    # A notification from another process: the cached status may be stale
+    def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            job_id, job_status = message["id"], message["status"]
+        except (ValueError, KeyError, TypeError):
+            console.log(f"[warning]Ignoring malformed job notification: {payload!r}[/warning]")
+            return
+        job_result_cache.invalidate(job_id)
+        self.notify(job_id, job_status)
+
+    # Start listening for notifications of other processes, on Postgres only
+    def start_listener(self, engine) -> None:
+        if engine.dialect.name != "postgresql" or self._listener is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop_listening.clear()
+        self._listener = threading.Thread(
+            target=self._listen, args=(engine,), name="job-notify-listener", daemon=True
+        )
+        self._listener.start()
+        console.log(
+            f"[info]Listening for job notifications on channel '{self.channel}'.[/info]"
+        )
+
+    # Stop the listener thread and close its connection
+    def stop_listener(self, timeout: float = 5.0) -> None:
+        if self._listener is None:
+            return
+        self._stop_listening.set()
+        self._listener.join(timeout)
+        self._listener = None
+
+    # Listener thread: LISTEN on a dedicated connection and hand payloads to the loop
+    def _listen(self, engine) -> None:
+        while not self._stop_listening.is_set():
+            connection = None
+            try:
+                # Taken out of the pool, a LISTENing connection is never handed to a request
+                connection = engine.raw_connection()
+                connection.detach()
+                dbapi_connection = connection.dbapi_connection
+                dbapi_connection.autocommit = True
+                cursor = dbapi_connection.cursor()
+                cursor.execute(f'LISTEN "{self.channel}"')
+
+                while not self._stop_listening.is_set():
+                    readable, _, _ = select.select(
+                        [dbapi_connection], [], [], JOB_NOTIFY_LISTEN_POLL_SECONDS
+                    )
+                    if not readable:
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notification = dbapi_connection.notifies.pop(0)
+                        self._loop.call_soon_threadsafe(
+                            self._receive, notification.payload
+                        )
+            except Exception as e:
+                console.log(
+                    f"[error]Job notification listener failed, reconnecting: {e}[/error]"
+                )
+                self._stop_listening.wait(JOB_NOTIFY_RECONNECT_SECONDS)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+
+# Process-wide notifier shared by the status endpoints and the in-process workers
+job_notifier = JobNotifier()
@@ -0,0 +1,327 @@
+import os
+import asyncio
+from typing import List, Optional
+from services.logger import console
+from sqlalchemy import and_, func, or_
+from datetime import datetime, timedelta
+
+# Queue backend used to hand jobs to the workers: "database" (durable) or "memory"
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "database").lower()
+
+# Seconds a claimed job stays invisible to other workers before it can be reclaimed
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+
+# Seconds between two claim attempts when the database queue is empty
+JOB_QUEUE_POLL_INTERVAL_SECONDS = float(
+    os.getenv("JOB_QUEUE_POLL_INTERVAL_SECONDS", "1.0")
+)
+
+# Number of times a job can be claimed before it is marked as failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Seconds between two lease renewals of a running job (heartbeat), well below the lease
+JOB_LEASE_RENEW_INTERVAL_SECONDS = float(
+    os.getenv("JOB_LEASE_RENEW_INTERVAL_SECONDS", str(JOB_LEASE_SECONDS / 3))
+)
+
+# Seconds between two sweeps of the expired leases by every worker fleet
+JOB_STALE_SWEEP_INTERVAL_SECONDS = float(
+    os.getenv("JOB_STALE_SWEEP_INTERVAL_SECONDS", "60")
+)
+
+
+# Claim the oldest available job with FOR UPDATE SKIP LOCKED and lease it to the caller
+def claim_next_job(
+    db,
+    db_crop_job_model,
+    lease_seconds: int = JOB_LEASE_SECONDS,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> Optional[str]:
+
+    now = datetime.utcnow()
+
+    # Pending jobs and jobs whose lease expired (the worker holding them died)
+    claimable = or_(
+        db_crop_job_model.status == "pending",
+        and_(
+            db_crop_job_model.status == "processing",
+            db_crop_job_model.lease_expires_at < now,
+            db_crop_job_model.attempts < max_attempts,
+        ),
+    )
+
+    # SKIP LOCKED lets concurrent replicas claim different rows without blocking.
+    # SQLite ignores the locking clause, the guarded UPDATE below keeps it safe.
+    candidate = (
+        db.query(db_crop_job_model.id, db_crop_job_model.job_id)
+        .filter(claimable)
+        .order_by(db_crop_job_model.created_at, db_crop_job_model.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if candidate is None:
+        db.rollback()
+        return None
+
+    # Only take the lease if the row is still claimable
+    claimed_rows = (
+        db.query(db_crop_job_model)
+        .filter(db_crop_job_model.id == candidate.id, claimable)
+        .update(
+            {
+                db_crop_job_model.status: "processing",
+                db_crop_job_model.lease_expires_at: now
+                + timedelta(seconds=lease_seconds),
+                db_crop_job_model.attempts: db_crop_job_model.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return candidate.job_id if claimed_rows == 1 else None
+
+
+# Extend the lease of a job still being processed, False if the job was taken away from
+# the worker (its lease expired and it was requeued, failed, completed or claimed again
+# meanwhile). A claim counts an attempt: another claim of the same job has a new count.
+def renew_job_lease(
+    db,
+    db_crop_job_model,
+    job_id: str,
+    attempts: Optional[int] = None,
+    lease_seconds: int = JOB_LEASE_SECONDS,
+) -> bool:
+
+    held = [
+        db_crop_job_model.job_id == job_id,
+        db_crop_job_model.status == "processing",
+    ]
+    if attempts is not None:
+        held.append(db_crop_job_model.attempts == attempts)
+    renewed_rows = (
+        db.query(db_crop_job_model)
+        .filter(*held)
+        .update(
+            {
+                db_crop_job_model.lease_expires_at: datetime.utcnow()
+                + timedelta(seconds=lease_seconds)
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return renewed_rows == 1
+
+
+# Requeue jobs left in "processing" by a crashed worker, failing the ones out of attempts
+def requeue_stale_jobs(
+    db, db_crop_job_model, max_attempts: int = JOB_MAX_ATTEMPTS
+) -> int:
+
+    now = datetime.utcnow()
+    stale = and_(
+        db_crop_job_model.status == "processing",
+        or_(
+            db_crop_job_model.lease_expires_at.is_(None),
+            db_crop_job_model.lease_expires_at < now,
+        ),
+    )
+
+    # Jobs that already used all their attempts are not retried again
+    failed_count = (
+        db.query(db_crop_job_model)
+        .filter(stale, db_crop_job_model.attempts >= max_attempts)
+        .update(
+            {
+                db_crop_job_model.status: "failed",
+                db_crop_job_model.lease_expires_at: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    requeued_count = (
+        db.query(db_crop_job_model)
+        .filter(stale)
+        .update(
+            {
+                db_crop_job_model.status: "pending",
+                db_crop_job_model.lease_expires_at: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+
+    if failed_count or requeued_count:
+        console.log(
+            f"[warning]Recovered stale jobs: {requeued_count} requeued, {failed_count} failed.[/warning]"
+        )
+    return requeued_count
+
+
+# In-process queue backend, pending rows are re-enqueued on startup
+class MemoryJobQueue(asyncio.Queue):
+
+    def __init__(self, db_session_factory, db_crop_job_model, maxsize: int = 0):
+        super().__init__(maxsize=maxsize)
+        self.db_session_factory = db_session_factory
+        self.db_crop_job_model = db_crop_job_model
+
+    # Requeue stale jobs and put every pending job back into the in-memory queue
+    def recover(self) -> None:
+        db = self.db_session_factory()
+        try:
+            requeue_stale_jobs(db, self.db_crop_job_model)
+            pending_job_ids: List[str] = [
+                row.job_id
+                for row in db.query(self.db_crop_job_model.job_id)
+                .filter(self.db_crop_job_model.status == "pending")
+                .order_by(self.db_crop_job_model.created_at)
+                .all()
+            ]
+        finally:
+            db.close()
+
+        for job_id in pending_job_ids:
+            if self.full():
+                break
+            self.put_nowait(job_id)
+        console.log(
+            f"[info]Re-enqueued {self.qsize()} pending job(s) into the memory queue.[/info]"
+        )
+
+    # Enqueue the jobs of a batch submission, the caller checked there is room for all of them
+    async def put_many(self, job_ids: List[str]) -> None:
+        for job_id in job_ids:
+            self.put_nowait(job_id)
+
+    # Jobs taken from memory are not leased: nothing to renew or sweep
+    def renew_lease(self, job_id: str, attempts: Optional[int] = None) -> bool:
+        return True
+
+    def sweep_stale_jobs(self) -> None:
+        pass
+
+
+# Durable queue backend claiming work straight from the crop_jobs table
+class DatabaseJobQueue:
+
+    def __init__(
+        self,
+        db_session_factory,
+        db_crop_job_model,
+        maxsize: int = 0,
+        poll_interval: float = JOB_QUEUE_POLL_INTERVAL_SECONDS,
+    ):
+        self.db_session_factory = db_session_factory
+        self.db_crop_job_model = db_crop_job_model
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # Created lazily so the event binds to the running loop
+    def _get_wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    # Number of jobs waiting to be claimed, counting at most limit rows: checking
+    # capacity stops at maxsize instead of counting the whole backlog
+    def _pending_count(self, limit: Optional[int] = None) -> int:
+        db = self.db_session_factory()
+        try:
+            pending = db.query(self.db_crop_job_model.id).filter(
+                self.db_crop_job_model.status == "pending"
+            )
+            if limit is not None:
+                pending = pending.limit(limit)
+            return db.query(func.count()).select_from(pending.subquery()).scalar()
+        finally:
+            db.close()
+
+    def qsize(self) -> int:
+        return self._pending_count()
+
+    def full(self) -> bool:
+        return self.maxsize > 0 and self._pending_count(self.maxsize) >= self.maxsize
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    # The row committed by the caller is the queue entry, only wake local workers
+    async def put(self, job_id: str) -> None:
+        self.put_nowait(job_id)
+
+    def put_nowait(self, job_id: str) -> None:
+        self._get_wakeup().set()
+
+    # The rows of a batch are committed together, one wakeup covers all of them
+    async def put_many(self, job_ids: List[str]) -> None:
+        if job_ids:
+            self._get_wakeup().set()
+
+    def _claim_next_job(self) -> Optional[str]:
+        db = self.db_session_factory()
+        try:
+            return claim_next_job(db, self.db_crop_job_model)
+        finally:
+            db.close()
+
+    # Wait until a job can be claimed and return its job_id
+    async def get(self) -> str:
+        wakeup = self._get_wakeup()
+        while True:
+            # The claim is a blocking query, run it off the event loop
+            job_id = await asyncio.get_running_loop().run_in_executor(
+                None, self._claim_next_job
+            )
+            if job_id is not None:
+                return job_id
+
+            # Sleep until a local submit wakes us up or the poll interval elapses
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # Completion is recorded on the row itself
+    def task_done(self) -> None:
+        pass
+
+    # Put jobs left in "processing" by a crashed worker back in the queue
+    def recover(self) -> None:
+        self.sweep_stale_jobs()
+
+    # Requeue the jobs whose lease expired and fail the ones out of attempts, run
+    # periodically: a claim never takes a job that has no attempt left
+    def sweep_stale_jobs(self) -> None:
+        db = self.db_session_factory()
+        try:
+            requeue_stale_jobs(db, self.db_crop_job_model)
+        finally:
+            db.close()
+
+    # Heartbeat of a running job, so a job outliving its lease is not claimed again
+    def renew_lease(self, job_id: str, attempts: Optional[int] = None) -> bool:
+        db = self.db_session_factory()
+        try:
+            return renew_job_lease(db, self.db_crop_job_model, job_id, attempts)
+        finally:
+            db.close()
+
+
+# Create the job queue for the configured backend
+def create_job_queue(
+    db_session_factory,
+    db_crop_job_model,
+    maxsize: int = 0,
+    backend: str = JOB_QUEUE_BACKEND,
+):
+    if backend == "memory":
+        return MemoryJobQueue(db_session_factory, db_crop_job_model, maxsize=maxsize)
+    if backend == "database":
+        return DatabaseJobQueue(db_session_factory, db_crop_job_model, maxsize=maxsize)
+    raise ValueError(
+        f"Unknown JOB_QUEUE_BACKEND '{backend}'. Expected 'database' or 'memory'."
+    )
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram, Info
 
 # Counters for crop processing jobs
 job_total_counter = Counter(
@@ -16,9 +16,71 @@ job_failed_counter = Counter(
     "crop_jobs_failed_total", "Total number of crop processing jobs that failed."
 )
 
+# Counter for submissions rejected because the job queue was full
+job_rejected_counter = Counter(
+    "crop_jobs_rejected_total",
+    "Total number of crop job submissions rejected because the job queue was full.",
+)
+
+# Counter for submissions coalesced onto an identical pending or processing job
+job_coalesced_counter = Counter(
+    "crop_jobs_coalesced_total",
+    "Total number of crop job submissions coalesced onto an identical in-flight job.",
+)
+
 # Histogram for job processing duration
 job_processing_duration_seconds = Histogram(
     "crop_job_processing_duration_seconds",
     "Histogram of crop job processing durations in seconds.",
     buckets=(5, 10, 15, 20, 25, 30, 45, 60, float("inf")),  # Example buckets
 )
+
+# Histogram for the size of the image embedded in each generated SVG
+job_embedded_image_bytes = Histogram(
+    "crop_job_embedded_image_bytes",
+    "Histogram of the encoded size in bytes of the image embedded in each job's SVG.",
+    ["mime_type"],
+    buckets=(
+        16 * 1024,
+        64 * 1024,
+        256 * 1024,
+        1024 * 1024,
+        4 * 1024 * 1024,
+        16 * 1024 * 1024,
+        float("inf"),
+    ),
+)
+
+# Counters for the job result cache used by the status endpoint
+job_result_cache_hits_counter = Counter(
+    "crop_job_result_cache_hits_total",
+    "Total number of job status lookups served from the result cache.",
+)
+
+job_result_cache_misses_counter = Counter(
+    "crop_job_result_cache_misses_total",
+    "Total number of job status lookups that missed the result cache.",
+)
+
+job_result_cache_evictions_counter = Counter(
+    "crop_job_result_cache_evictions_total",
+    "Total number of entries evicted from the result cache to respect its byte budget.",
+)
+
+# Gauge for the memory used by the job result cache
+job_result_cache_bytes_gauge = Gauge(
+    "crop_job_result_cache_bytes",
+    "Approximate number of bytes held by the job result cache.",
+)
+
+# Gauge for the requests waiting for a job to finish (long-poll status and event streams)
+job_status_waiters_gauge = Gauge(
+    "crop_job_status_waiters",
+    "Number of status requests and event streams waiting for a job to finish.",
+)
+
+# Info metric for the image processor backend selected by this process
+image_processor_backend_info = Info(
+    "crop_image_processor_backend",
+    "Image processor backend (py, pyc or npy) used by this process and how it was selected.",
+)
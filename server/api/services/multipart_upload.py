@@ -0,0 +1,183 @@
+import os
+import hashlib
+from tempfile import SpooledTemporaryFile
+from typing import Dict, List, Optional, Tuple
+from starlette.requests import Request
+from starlette.concurrency import run_in_threadpool
+
+# python-multipart (also used by Starlette for form parsing) provides the streaming parser
+try:
+    import multipart
+    from multipart.multipart import parse_options_header
+except ModuleNotFoundError:
+    multipart = None
+    parse_options_header = None
+
+# Streaming multipart/form-data reader for binary submissions.
+# File parts are hashed and written to spooled temporary files while the request
+# body arrives, so a multi-MB upload is never held as one string, JSON parsed or
+# base64 decoded; the other parts are small text fields (e.g. the landmarks JSON).
+
+# Bytes of an uploaded file kept in memory before it spills to a temporary file
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(1024 * 1024)))
+
+# Largest multipart request body accepted, files and fields included
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+# Raised for a request body that is not a readable multipart/form-data upload
+class MultipartUploadError(ValueError):
+    pass
+
+
+# Raised once the request body grows past the upload limit
+class UploadTooLargeError(MultipartUploadError):
+    pass
+
+
+# An uploaded file: spooled to memory or disk, with its SHA-256 and size
+class StreamedUpload:
+
+    def __init__(
+        self,
+        filename: str,
+        content_type: str,
+        spool_max_bytes: int = UPLOAD_SPOOL_MAX_BYTES,
+    ):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.spool_max_bytes = spool_max_bytes
+        self.file = SpooledTemporaryFile(max_size=spool_max_bytes)
+        self._sha256 = hashlib.sha256()
+
+    # Hash the chunk and append it. Once the upload outgrows the spool the file is on
+    # disk: that write, and the rollover to disk it triggers, run off the event loop.
+    async def write(self, data: bytes) -> None:
+        self._sha256.update(data)
+        spilled = self.size + len(data) > self.spool_max_bytes
+        self.size += len(data)
+        if spilled:
+            await run_in_threadpool(self.file.write, data)
+        else:
+            self.file.write(data)
+
+    # SHA-256 of the uploaded bytes, as hash_image_base64 gives for the base64 upload
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    # The uploaded bytes, read back from memory or disk
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+# Read a multipart/form-data request body as it streams in.
+# Return the text fields and the uploaded files by part name; the caller closes the files.
+async def read_multipart_upload(
+    request: Request, max_bytes: int = UPLOAD_MAX_BYTES
+) -> Tuple[Dict[str, str], Dict[str, StreamedUpload]]:
+
+    if multipart is None:
+        raise MultipartUploadError(
+            "The `python-multipart` library must be installed to accept uploads."
+        )
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise MultipartUploadError("Expected a multipart/form-data request body.")
+
+    fields: Dict[str, str] = {}
+    uploads: Dict[str, StreamedUpload] = {}
+
+    # Parser callbacks only record what they see, the data is handled between writes
+    part_headers: Dict[bytes, bytes] = {}
+    header_field: List[bytes] = []
+    header_value: List[bytes] = []
+    current_part: Dict[str, Optional[object]] = {"name": None, "upload": None}
+    field_data: List[bytes] = []
+    pending_writes: List[Tuple[StreamedUpload, bytes]] = []
+
+    def on_part_begin() -> None:
+        part_headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.append(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.append(data[start:end])
+
+    def on_header_end() -> None:
+        part_headers[b"".join(header_field).lower()] = b"".join(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        _, disposition = parse_options_header(part_headers.get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        # A repeated part would replace (and leak) the spooled file of the first one
+        if name in uploads or name in fields:
+            raise MultipartUploadError(f"The part '{name}' is sent more than once.")
+        current_part["name"] = name
+        current_part["upload"] = None
+        field_data.clear()
+        if b"filename" in disposition:
+            upload = StreamedUpload(
+                disposition[b"filename"].decode("utf-8", "replace"),
+                part_headers.get(b"content-type", b"").decode("latin-1"),
+            )
+            uploads[name] = upload
+            current_part["upload"] = upload
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if current_part["upload"] is not None:
+            pending_writes.append((current_part["upload"], data[start:end]))
+        else:
+            field_data.append(data[start:end])
+
+    def on_part_end() -> None:
+        if current_part["upload"] is None:
+            fields[current_part["name"]] = b"".join(field_data).decode("utf-8", "replace")
+
+    parser = multipart.MultipartParser(
+        params[b"boundary"],
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise UploadTooLargeError(
+                    f"The upload is larger than the limit of {max_bytes} bytes."
+                )
+            parser.write(chunk)
+
+            # Hash and spool the file data of this chunk
+            for upload, data in pending_writes:
+                await upload.write(data)
+            pending_writes.clear()
+        parser.finalize()
+    except MultipartUploadError:
+        for upload in uploads.values():
+            upload.close()
+        raise
+    except Exception as e:
+        for upload in uploads.values():
+            upload.close()
+        raise MultipartUploadError(f"Malformed multipart upload: {e}")
+
+    return fields, uploads
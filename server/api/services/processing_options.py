@@ -0,0 +1,68 @@
+import os
+from typing import Any, Dict, List
+from exlib.py.image_processor import IMAGE_OUTPUT_FORMATS
+
+
+# Parse "name:value,name:value" into {name: label value}
+def _parse_segmentation_labels(value: str) -> Dict[str, int]:
+    labels = {}
+    for entry in value.split(","):
+        if entry.strip():
+            name, label = entry.split(":")
+            labels[name.strip()] = int(label)
+    return labels
+
+
+# Parse "region:excluded,region:excluded" into {region: [excluded regions]}
+def _parse_region_exclusions(value: str) -> Dict[str, List[str]]:
+    exclusions: Dict[str, List[str]] = {}
+    for entry in value.split(","):
+        if entry.strip():
+            region_name, excluded_name = entry.split(":")
+            exclusions.setdefault(region_name.strip(), []).append(excluded_name.strip())
+    return exclusions
+
+
+# Keyword arguments passed to process_image_data_intensive, read from the environment
+IMAGE_PROCESSING_OPTIONS: Dict[str, Any] = {
+    # How the cropped image is embedded in the SVG: "defs" (<use> per region) or "union"
+    "svg_image_embed_mode": os.getenv("SVG_IMAGE_EMBED_MODE", "defs"),
+    # Rotate and crop JPEGs losslessly with jpegtran (crop origin aligned to MCUs)
+    "jpeg_lossless_transform": os.getenv("JPEG_LOSSLESS_TRANSFORM", "false").lower()
+    == "true",
+    # Longest side of the cropped output in pixels, reached by power-of-two reduced
+    # decoding (JPEG draft); 0 keeps the full resolution
+    "max_output_dimension": int(os.getenv("MAX_OUTPUT_DIMENSION", "0") or "0"),
+    # Encoding of the embedded image: "source" keeps the input format, "jpeg" or "webp"
+    # re-encode it (quality 1-100, JPEG subsampling 0/1/2 or -1 for the default,
+    # WebP method 0-6 trading encoding time for size)
+    "image_encoding": {
+        "format": os.getenv("IMAGE_OUTPUT_FORMAT", "source").lower(),
+        "quality": int(os.getenv("IMAGE_OUTPUT_QUALITY", "80")),
+        "progressive": os.getenv("IMAGE_OUTPUT_JPEG_PROGRESSIVE", "true").lower()
+        == "true",
+        "optimize": os.getenv("IMAGE_OUTPUT_JPEG_OPTIMIZE", "true").lower() == "true",
+        "subsampling": int(os.getenv("IMAGE_OUTPUT_JPEG_SUBSAMPLING", "-1")),
+        "method": int(os.getenv("IMAGE_OUTPUT_WEBP_METHOD", "4")),
+    },
+    # Ramer-Douglas-Peucker tolerance in pixels for every region contour, 0 disables
+    "path_simplify_tolerance": float(os.getenv("PATH_SIMPLIFY_TOLERANCE", "0")),
+    # Decimals of the path_d and points coordinates (0-15), -1 keeps full precision
+    "coordinate_precision": int(os.getenv("COORDINATE_PRECISION", "-1")),
+    # Segmentation map label values traced into mask regions, e.g. "skin:1,hair:2";
+    # empty skips the segmentation map
+    "segmentation_labels": _parse_segmentation_labels(
+        os.getenv("SEGMENTATION_LABELS", "")
+    ),
+    # Regions cut out of other regions' clip paths (polygon difference), as
+    # "region:excluded" pairs, e.g. "right_cheek:nose,left_cheek:nose"; empty disables
+    "region_exclusions": _parse_region_exclusions(
+        os.getenv("REGION_EXCLUSIONS", "right_cheek:nose")
+    ),
+}
+
+# An unknown output format would otherwise only fail inside every job
+if IMAGE_PROCESSING_OPTIONS["image_encoding"]["format"] not in IMAGE_OUTPUT_FORMATS:
+    raise ValueError(
+        f"Unknown IMAGE_OUTPUT_FORMAT '{IMAGE_PROCESSING_OPTIONS['image_encoding']['format']}'. Expected one of {IMAGE_OUTPUT_FORMATS}."
+    )
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from services.metrics import (
+    job_result_cache_hits_counter,
+    job_result_cache_misses_counter,
+    job_result_cache_evictions_counter,
+    job_result_cache_bytes_gauge,
+)
+
+# Byte budget for cached job results
+JOB_RESULT_CACHE_MAX_BYTES = int(
+    os.getenv("JOB_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+# Seconds a pending/processing status may be served from the cache
+JOB_RESULT_CACHE_PENDING_TTL_SECONDS = float(
+    os.getenv("JOB_RESULT_CACHE_PENDING_TTL_SECONDS", "1.0")
+)
+
+# Statuses that never change again once reached
+TERMINAL_JOB_STATUSES = ("completed", "failed")
+
+
+# Build the job data dictionary used to construct JobStatusResponse
+def build_job_data(
+    job_id: str, job_status: str, svg: Optional[str], mask_contours: Any
+) -> Dict[str, Any]:
+    return {
+        "id": job_id,
+        "status": job_status,
+        "svg": svg,
+        "mask_contours": mask_contours,
+        "error": (
+            None if job_status != "failed" else "Job processing failed."
+        ),  # Dummy error msg
+    }
+
+
+# Fixed per-entry overhead, so entries without results still count against the budget
+ENTRY_OVERHEAD_BYTES = 256
+
+
+# Approximate memory footprint of a job data entry, dominated by the SVG
+def _estimate_entry_size(job_data: Dict[str, Any]) -> int:
+    size = ENTRY_OVERHEAD_BYTES + len(job_data.get("svg") or "")
+    if job_data.get("mask_contours") is not None:
+        size += len(json.dumps(job_data["mask_contours"], default=str))
+    return size
+
+
+# Job result cache: LRU with a byte budget, short TTL for jobs still in progress
+class JobResultCache:
+
+    def __init__(
+        self,
+        max_bytes: int = JOB_RESULT_CACHE_MAX_BYTES,
+        pending_ttl_seconds: float = JOB_RESULT_CACHE_PENDING_TTL_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.pending_ttl_seconds = pending_ttl_seconds
+        self.current_bytes = 0
+        # job_id -> (job data, size in bytes, expiry time or None for terminal jobs)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int, Optional[float]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Return the cached job data, or None on a miss or an expired pending entry
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if (
+                entry is not None
+                and entry[2] is not None
+                and entry[2] <= time.monotonic()
+            ):
+                self._remove(job_id)
+                entry = None
+
+            if entry is None:
+                job_result_cache_misses_counter.inc()
+                return None
+
+            self._entries.move_to_end(job_id)
+            job_result_cache_hits_counter.inc()
+            return entry[0]
+
+    # Cache the job data, only non-terminal jobs expire
+    def set(self, job_id: str, job_data: Dict[str, Any]) -> None:
+        size = _estimate_entry_size(job_data)
+        expires_at = (
+            None
+            if job_data["status"] in TERMINAL_JOB_STATUSES
+            else time.monotonic() + self.pending_ttl_seconds
+        )
+
+        with self._lock:
+            self._remove(job_id)
+
+            # Results larger than the whole budget are not cached
+            if size > self.max_bytes:
+                return
+
+            self._entries[job_id] = (job_data, size, expires_at)
+            self.current_bytes += size
+
+            # Evict least recently used entries until the budget is respected
+            while self.current_bytes > self.max_bytes:
+                evicted_job_id = next(iter(self._entries))
+                self._remove(evicted_job_id)
+                job_result_cache_evictions_counter.inc()
+
+            job_result_cache_bytes_gauge.set(self.current_bytes)
+
+    # Drop a single job, e.g. when its status changed
+    def invalidate(self, job_id: str) -> None:
+        with self._lock:
+            self._remove(job_id)
+            job_result_cache_bytes_gauge.set(self.current_bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            job_result_cache_bytes_gauge.set(0)
+
+    # Remove an entry, the caller holds the lock
+    def _remove(self, job_id: str) -> None:
+        entry = self._entries.pop(job_id, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+
+# Process-wide cache shared by the status endpoint and the in-process workers
+job_result_cache = JobResultCache()
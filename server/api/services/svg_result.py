@@ -0,0 +1,131 @@
+import os
+import gzip
+import base64
+import hashlib
+from typing import Dict, List, NamedTuple, Optional
+
+# Brotli is optional: without it the SVG results are served with gzip only
+try:
+    import brotli
+except ModuleNotFoundError:
+    brotli = None
+
+# SVG results served by GET /crop/result/{job_id}.svg.
+# A completed result never changes, so it is compressed once when the job completes
+# and identified by the SHA-256 of the SVG document.
+
+# gzip level of the precompressed SVG result (1-9)
+SVG_RESULT_GZIP_LEVEL = int(os.getenv("SVG_RESULT_GZIP_LEVEL", "9"))
+
+# Brotli quality of the precompressed SVG result (0-11)
+SVG_RESULT_BROTLI_QUALITY = int(os.getenv("SVG_RESULT_BROTLI_QUALITY", "9"))
+
+# Seconds browsers and CDNs may cache a completed result (it is immutable)
+SVG_RESULT_CACHE_MAX_AGE_SECONDS = int(
+    os.getenv("SVG_RESULT_CACHE_MAX_AGE_SECONDS", str(365 * 24 * 3600))
+)
+
+# Content codings the result can be served with, preferred first on equal q-values
+SVG_RESULT_ENCODINGS = ("br", "gzip", "identity")
+
+
+# An SVG result: the document, its precompressed copies and the SHA-256 of each,
+# which are also their blob store keys
+class CompressedSvgResult(NamedTuple):
+    svg: bytes
+    sha256: str
+    gzip: bytes
+    br: Optional[bytes]
+    gzip_sha256: str
+    br_sha256: Optional[str]
+
+
+# Hash and compress the SVG document of a completed job (the worker stores base64)
+def compress_svg_result(svg_base64: str) -> CompressedSvgResult:
+    svg_bytes = base64.b64decode(svg_base64, validate=True)
+    # mtime=0 keeps the gzip bytes a pure function of the SVG
+    gzip_bytes = gzip.compress(svg_bytes, compresslevel=SVG_RESULT_GZIP_LEVEL, mtime=0)
+    br_bytes = (
+        brotli.compress(svg_bytes, quality=SVG_RESULT_BROTLI_QUALITY)
+        if brotli is not None
+        else None
+    )
+    return CompressedSvgResult(
+        svg=svg_bytes,
+        sha256=hashlib.sha256(svg_bytes).hexdigest(),
+        gzip=gzip_bytes,
+        br=br_bytes,
+        gzip_sha256=hashlib.sha256(gzip_bytes).hexdigest(),
+        br_sha256=hashlib.sha256(br_bytes).hexdigest() if br_bytes is not None else None,
+    )
+
+
+# Blobs of an SVG result by key: the document and its compressed copies
+def svg_result_blobs(result: CompressedSvgResult) -> Dict[str, bytes]:
+    blobs = {result.sha256: result.svg, result.gzip_sha256: result.gzip}
+    if result.br is not None:
+        blobs[result.br_sha256] = result.br
+    return blobs
+
+
+# Strong ETag of one encoding of the result: the bytes differ per coding, so the tag does
+def svg_result_etag(svg_sha256: str, encoding: str) -> str:
+    if encoding == "identity":
+        return f'"{svg_sha256}"'
+    return f'"{svg_sha256}-{encoding}"'
+
+
+# Whether an If-None-Match header matches any encoding of the result (weak comparison)
+def if_none_match_matches(if_none_match: Optional[str], svg_sha256: str) -> bool:
+    if not if_none_match:
+        return False
+    etags = {svg_result_etag(svg_sha256, encoding) for encoding in SVG_RESULT_ENCODINGS}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+
+# Parse an Accept-Encoding header into {coding: q-value}
+def _parse_accept_encoding(accept_encoding: str) -> Dict[str, float]:
+    q_values = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q_value = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q_value = float(value)
+                except ValueError:
+                    q_value = 0.0
+        q_values[coding] = q_value
+    return q_values
+
+
+# Pick the content coding for a response among the available ones (RFC 9110 12.5.3)
+def negotiate_encoding(accept_encoding: Optional[str], available: List[str]) -> str:
+    if not accept_encoding:
+        return "identity"
+    q_values = _parse_accept_encoding(accept_encoding)
+    default_q = q_values.get("*", None)
+
+    best_encoding, best_q = None, 0.0
+    for encoding in SVG_RESULT_ENCODINGS:
+        if encoding != "identity" and encoding not in available:
+            continue
+        q_value = q_values.get(encoding, default_q)
+        if q_value is None:
+            # identity is acceptable unless excluded, other codings only when listed
+            q_value = 0.001 if encoding == "identity" else 0.0
+        if q_value > best_q:
+            best_encoding, best_q = encoding, q_value
+    return best_encoding or "identity"
@@ -0,0 +1,85 @@
+import base64
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from drivers.database import Base
+from models.crop_model import DBBlob
+from server.api.services import blob_store
+from server.api.services.blob_store import (
+    DatabaseBlobStore,
+    FilesystemBlobStore,
+    blob_key,
+    create_blob_store,
+    load_base64_bytes,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(params=["database", "filesystem"])
+def store(request, tmp_path):
+    if request.param == "database":
+        return DatabaseBlobStore(DBBlob)
+    return FilesystemBlobStore(str(tmp_path))
+
+
+def test_put_and_get(db, store) -> None:
+    key = store.put(db, b"image bytes")
+    assert key == blob_key(b"image bytes")
+    db.commit()
+    assert store.get(db, key) == b"image bytes"
+    assert store.get(db, blob_key(b"missing")) is None
+
+
+def test_identical_blobs_are_stored_once(db, store) -> None:
+    store.put_many(db, {blob_key(b"a"): b"a", blob_key(b"b"): b"b"})
+    db.commit()
+    # Storing known content again is a no-op, in a later transaction too
+    store.put_many(db, {blob_key(b"a"): b"a"})
+    db.commit()
+    assert store.get_many(db, [blob_key(b"a"), blob_key(b"b"), blob_key(b"c")]) == {
+        blob_key(b"a"): b"a",
+        blob_key(b"b"): b"b",
+    }
+    if isinstance(store, DatabaseBlobStore):
+        assert db.query(DBBlob).count() == 2
+
+
+def test_filesystem_store_layout(db, tmp_path) -> None:
+    store = FilesystemBlobStore(str(tmp_path))
+    key = store.put(db, b"svg")
+    assert (tmp_path / key[:2] / key[2:4] / key).read_bytes() == b"svg"
+    # No temporary files are left behind
+    assert [path.name for path in (tmp_path / key[:2] / key[2:4]).iterdir()] == [key]
+    with pytest.raises(ValueError):
+        store.get(db, "../../etc/passwd")
+
+
+def test_load_base64_bytes(db) -> None:
+    store = DatabaseBlobStore(DBBlob)
+    key = store.put(db, b"image")
+    # Jobs created before the blob store keep their base64 column
+    assert load_base64_bytes(db, store, "bGVnYWN5", key) == b"bGVnYWN5"
+    assert load_base64_bytes(db, store, None, key) == base64.b64encode(b"image")
+    assert load_base64_bytes(db, store, None, None) is None
+    with pytest.raises(LookupError):
+        load_base64_bytes(db, store, None, blob_key(b"missing"))
+
+
+def test_create_blob_store(tmp_path) -> None:
+    assert isinstance(create_blob_store(DBBlob, "database"), DatabaseBlobStore)
+    assert isinstance(
+        create_blob_store(DBBlob, "filesystem", str(tmp_path)), FilesystemBlobStore
+    )
+    with pytest.raises(ValueError):
+        create_blob_store(DBBlob, "s3")
@@ -0,0 +1,31 @@
+import base64
+import hashlib
+from server.api.services import content_hash
+
+
+def test_hash_image_base64_hashes_decoded_bytes() -> None:
+    image_bytes = b"\xff\xd8\xff\xe0 not really a jpeg"
+    image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+    assert (
+        content_hash.hash_image_base64(image_base64)
+        == hashlib.sha256(image_bytes).hexdigest()
+    )
+
+
+def test_hash_image_base64_invalid_base64() -> None:
+    # Invalid base64 still yields a deterministic hash of the text
+    assert (
+        content_hash.hash_image_base64("not base64!")
+        == hashlib.sha256(b"not base64!").hexdigest()
+    )
+
+
+def test_hash_landmarks_is_canonical() -> None:
+    first = [{"x": 1.0, "y": 2.0}, {"x": 3.0, "y": 4.0}]
+    reordered_keys = [{"y": 2.0, "x": 1.0}, {"y": 4.0, "x": 3.0}]
+    assert content_hash.hash_landmarks(first) == content_hash.hash_landmarks(
+        reordered_keys
+    )
+    assert content_hash.hash_landmarks(first) != content_hash.hash_landmarks(
+        list(reversed(first))
+    )
@@ -0,0 +1,39 @@
+import os
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from server.api.services import executor
+
+
+def test_create_image_processing_pool_disabled() -> None:
+    # A pool size of 0 keeps the processing inline
+    assert executor.create_image_processing_pool(0) is None
+
+
+def test_create_image_processing_pool_runs_jobs() -> None:
+    pool = executor.create_image_processing_pool(1)
+    try:
+        assert pool is not None
+        # The warmed-up process must be able to run work
+        assert isinstance(pool.submit(executor._ping).result(timeout=30), int)
+    finally:
+        executor.shutdown_image_processing_pool(pool)
+
+
+def test_shutdown_image_processing_pool_none() -> None:
+    # Shutting down a disabled pool is a no-op
+    executor.shutdown_image_processing_pool(None)
+
+
+def test_image_processing_pool_restarts_when_broken() -> None:
+    pool = executor.create_image_processing_pool(1)
+    try:
+        # A working pool is left alone
+        assert not pool.restart_if_broken()
+
+        # A process dying breaks the pool, every later job would fail
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(os._exit, 1).result(timeout=30)
+        assert pool.restart_if_broken()
+        assert isinstance(pool.submit(executor._ping).result(timeout=30), int)
+    finally:
+        executor.shutdown_image_processing_pool(pool)
@@ -0,0 +1,116 @@
+import time
+import pytest
+from prometheus_client import REGISTRY
+from server.api.services import image_backends
+
+
+@pytest.fixture(autouse=True)
+def reset_selected_backend(monkeypatch):
+    # Every test starts without a selected backend
+    monkeypatch.setattr(image_backends, "_selected_backend", None)
+
+
+def backend_info_value(backend: str, selection: str):
+    return REGISTRY.get_sample_value(
+        "crop_image_processor_backend_info",
+        {"backend": backend, "selection": selection},
+    )
+
+
+def test_load_unknown_backend() -> None:
+    with pytest.raises(ValueError):
+        image_backends.load_image_processor_backend("rust")
+
+
+def test_pure_python_backend_is_always_available() -> None:
+    assert "py" in image_backends.available_image_processor_backends()
+
+
+def test_select_backend_from_env() -> None:
+    assert image_backends.select_image_processor_backend("py") == "py"
+    assert image_backends.get_image_processor_backend_name() == "py"
+    assert backend_info_value("py", "env") == 1
+
+
+def test_select_backend_by_benchmark(monkeypatch) -> None:
+    def slow_backend(*args, **kwargs):
+        time.sleep(0.01)
+        return "slow", []
+
+    def fast_backend(*args, **kwargs):
+        return "fast", []
+
+    def broken_backend(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(
+        image_backends,
+        "available_image_processor_backends",
+        lambda: {"py": slow_backend, "pyc": broken_backend, "npy": fast_backend},
+    )
+
+    assert image_backends.select_image_processor_backend("auto", rounds=2) == "npy"
+    assert backend_info_value("npy", "benchmark") == 1
+
+    # The worker entry point dispatches to the selected backend
+    assert image_backends.process_image_data_intensive(True, {}, b"") == ("fast", [])
+
+
+def test_benchmark_runs_real_backend() -> None:
+    process_image = image_backends.load_image_processor_backend("py")
+    seconds = image_backends.benchmark_image_processor_backend(
+        process_image, image_backends._benchmark_payload(), rounds=1
+    )
+    assert 0 < seconds < 10
+
+
+def test_benchmark_uses_processing_options(monkeypatch) -> None:
+    calls = []
+
+    def recording_backend(*args, **kwargs):
+        calls.append(kwargs)
+        return "svg", []
+
+    monkeypatch.setattr(
+        image_backends,
+        "available_image_processor_backends",
+        lambda: {"py": recording_backend},
+    )
+    options = {
+        "coordinate_precision": 2,
+        "region_exclusions": {"right_cheek": ["nose"]},
+        "segmentation_labels": {"skin": 1},
+    }
+    image_backends.select_image_processor_backend(
+        "auto", rounds=1, processing_options=options
+    )
+
+    # Every run measures the configured code path, segmentation map included
+    assert calls
+    assert all(call["coordinate_precision"] == 2 for call in calls)
+    assert all(call["region_exclusions"] == {"right_cheek": ["nose"]} for call in calls)
+    assert all(call["segmentation_map_base64_bytes"] for call in calls)
+
+
+def test_benchmark_runs_real_backend_with_segmentation_map() -> None:
+    process_image = image_backends.load_image_processor_backend("py")
+    options = dict(
+        image_backends.IMAGE_PROCESSING_OPTIONS, segmentation_labels={"skin": 1, "hair": 2}
+    )
+    payload = image_backends._benchmark_payload(options)
+    _, mask_contours = process_image(
+        True, payload[0], payload[1], segmentation_map_base64_bytes=payload[2], **options
+    )
+    names = [mask_contour["name"] for mask_contour in mask_contours]
+    assert "segmentation_skin" in names and "segmentation_hair" in names
+
+
+def test_process_image_selects_backend_on_first_use(monkeypatch) -> None:
+    monkeypatch.setattr(
+        image_backends,
+        "select_image_processor_backend",
+        lambda: image_backends.use_image_processor_backend("py"),
+    )
+    assert image_backends.get_image_processor_backend_name() is None
+    image_backends.get_image_processor()
+    assert image_backends.get_image_processor_backend_name() == "py"
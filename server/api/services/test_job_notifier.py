@@ -0,0 +1,67 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from server.api.services import job_notifier
+from server.api.services.job_notifier import JobNotifier
+from server.api.services.result_cache import build_job_data
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_the_subscribers_of_the_job() -> None:
+    notifier = JobNotifier()
+    with notifier.subscribe("job1") as first, notifier.subscribe("job1") as second:
+        with notifier.subscribe("job2") as other:
+            assert notifier.waiter_count("job1") == 2
+            notifier.notify("job1", "completed")
+            await asyncio.wait_for(first.wait(), timeout=1)
+            assert second.is_set()
+            assert not other.is_set()
+
+    # Leaving the subscription forgets the waiters
+    assert notifier.waiter_count("job1") == 0
+    assert notifier.waiter_count("job2") == 0
+
+
+@pytest.mark.asyncio
+async def test_only_final_statuses_wake_subscribers() -> None:
+    notifier = JobNotifier()
+    with notifier.subscribe("job1") as finished:
+        notifier.notify("job1", "processing")
+        assert not finished.is_set()
+        notifier.notify("job1", "failed")
+        assert finished.is_set()
+
+
+@pytest.mark.asyncio
+async def test_remote_notification_invalidates_the_cached_status() -> None:
+    notifier = JobNotifier()
+    job_notifier.job_result_cache.set("job1", build_job_data("job1", "pending", None, None))
+    with notifier.subscribe("job1") as finished:
+        notifier._receive('{"id": "job1", "status": "completed"}')
+        assert finished.is_set()
+    assert job_notifier.job_result_cache.get("job1") is None
+
+    # A malformed payload is ignored
+    notifier._receive("not json")
+
+
+def test_notification_is_only_queued_on_postgres() -> None:
+    db = MagicMock()
+    db.get_bind.return_value.dialect.name = "sqlite"
+    job_notifier.queue_job_status_notification(db, "job1", "completed")
+    assert not db.execute.called
+
+    db.get_bind.return_value.dialect.name = "postgresql"
+    job_notifier.queue_job_status_notification(db, "job1", "completed")
+    statement, parameters = db.execute.call_args.args
+    assert "pg_notify" in str(statement)
+    assert parameters["payload"] == '{"id": "job1", "status": "completed"}'
+
+
+def test_listener_is_not_started_without_postgres() -> None:
+    notifier = JobNotifier()
+    engine = MagicMock()
+    engine.dialect.name = "sqlite"
+    notifier.start_listener(engine)
+    assert notifier._listener is None
+    notifier.stop_listener()
@@ -0,0 +1,208 @@
+import pytest
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.orm import sessionmaker
+from drivers.database import Base
+from models.crop_model import DBCropJob
+from server.api.services import job_queue
+
+
+@pytest.fixture
+def session_factory() -> sessionmaker:
+    # Use a private in-memory SQLite database for every test
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def add_job(session_factory, job_id: str, **columns) -> None:
+    db = session_factory()
+    db.add(
+        DBCropJob(
+            job_id=job_id,
+            image_base64="img",
+            landmarks_json=[],
+            segmentation_map_base64="seg",
+            **columns,
+        )
+    )
+    db.commit()
+    db.close()
+
+
+def get_job(session_factory, job_id: str) -> DBCropJob:
+    db = session_factory()
+    try:
+        return db.query(DBCropJob).filter(DBCropJob.job_id == job_id).first()
+    finally:
+        db.close()
+
+
+def test_claim_next_job_leases_oldest_pending(session_factory) -> None:
+    now = datetime.utcnow()
+    add_job(session_factory, "old", created_at=now - timedelta(seconds=10))
+    add_job(session_factory, "new", created_at=now)
+
+    db = session_factory()
+    assert job_queue.claim_next_job(db, DBCropJob) == "old"
+    assert job_queue.claim_next_job(db, DBCropJob) == "new"
+    assert job_queue.claim_next_job(db, DBCropJob) is None
+    db.close()
+
+    claimed = get_job(session_factory, "old")
+    assert claimed.status == "processing"
+    assert claimed.attempts == 1
+    assert claimed.lease_expires_at > now
+
+
+def test_claim_next_job_reclaims_expired_lease(session_factory) -> None:
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    add_job(
+        session_factory,
+        "expired",
+        status="processing",
+        lease_expires_at=expired,
+        attempts=1,
+    )
+    add_job(
+        session_factory,
+        "exhausted",
+        status="processing",
+        lease_expires_at=expired,
+        attempts=job_queue.JOB_MAX_ATTEMPTS,
+    )
+
+    db = session_factory()
+    assert job_queue.claim_next_job(db, DBCropJob) == "expired"
+    # A job out of attempts is never claimed again
+    assert job_queue.claim_next_job(db, DBCropJob) is None
+    db.close()
+    assert get_job(session_factory, "expired").attempts == 2
+
+
+def test_requeue_stale_jobs(session_factory) -> None:
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    future = datetime.utcnow() + timedelta(seconds=600)
+    add_job(session_factory, "stale", status="processing", lease_expires_at=expired)
+    add_job(session_factory, "leased", status="processing", lease_expires_at=future)
+    add_job(
+        session_factory,
+        "exhausted",
+        status="processing",
+        lease_expires_at=expired,
+        attempts=job_queue.JOB_MAX_ATTEMPTS,
+    )
+
+    db = session_factory()
+    assert job_queue.requeue_stale_jobs(db, DBCropJob) == 1
+    db.close()
+
+    assert get_job(session_factory, "stale").status == "pending"
+    assert get_job(session_factory, "leased").status == "processing"
+    assert get_job(session_factory, "exhausted").status == "failed"
+
+
+def test_renew_job_lease(session_factory) -> None:
+    soon = datetime.utcnow() + timedelta(seconds=1)
+    add_job(session_factory, "running", status="processing", lease_expires_at=soon)
+    add_job(session_factory, "requeued", status="pending")
+
+    queue = job_queue.DatabaseJobQueue(session_factory, DBCropJob)
+    assert queue.renew_lease("running")
+    assert get_job(session_factory, "running").lease_expires_at > soon + timedelta(
+        seconds=job_queue.JOB_LEASE_SECONDS - 60
+    )
+    # A job taken away from the worker is not leased again
+    assert not queue.renew_lease("requeued")
+    assert get_job(session_factory, "requeued").lease_expires_at is None
+
+    # Neither is a job claimed again by another worker after the lease expired
+    add_job(
+        session_factory,
+        "reclaimed",
+        status="processing",
+        lease_expires_at=soon,
+        attempts=2,
+    )
+    assert not queue.renew_lease("reclaimed", attempts=1)
+    assert get_job(session_factory, "reclaimed").lease_expires_at == soon
+    assert queue.renew_lease("reclaimed", attempts=2)
+
+
+def test_database_job_queue_sweeps_exhausted_jobs(session_factory) -> None:
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    add_job(
+        session_factory,
+        "exhausted",
+        status="processing",
+        lease_expires_at=expired,
+        attempts=job_queue.JOB_MAX_ATTEMPTS,
+    )
+
+    # Never claimable again, the periodic sweep fails it
+    queue = job_queue.DatabaseJobQueue(session_factory, DBCropJob)
+    queue.sweep_stale_jobs()
+    assert get_job(session_factory, "exhausted").status == "failed"
+
+
+@pytest.mark.asyncio
+async def test_database_job_queue_get_and_full(session_factory) -> None:
+    queue = job_queue.DatabaseJobQueue(
+        session_factory, DBCropJob, maxsize=1, poll_interval=0.01
+    )
+    assert not queue.full()
+
+    add_job(session_factory, "job1")
+    assert queue.full()
+
+    await queue.put("job1")
+    assert await asyncio.wait_for(queue.get(), timeout=1) == "job1"
+    assert not queue.full()
+
+    # Capacity checks count at most maxsize rows, qsize counts the whole backlog
+    for index in range(3):
+        add_job(session_factory, f"backlog{index}")
+    assert queue.full()
+    assert queue.qsize() == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_job_queue_recover(session_factory) -> None:
+    add_job(session_factory, "pending")
+    add_job(
+        session_factory,
+        "stale",
+        status="processing",
+        lease_expires_at=datetime.utcnow() - timedelta(seconds=1),
+    )
+    add_job(session_factory, "done", status="completed")
+
+    queue = job_queue.MemoryJobQueue(session_factory, DBCropJob)
+    queue.recover()
+
+    assert sorted([queue.get_nowait(), queue.get_nowait()]) == ["pending", "stale"]
+    assert queue.empty()
+
+
+def test_create_job_queue_unknown_backend(session_factory) -> None:
+    with pytest.raises(ValueError):
+        job_queue.create_job_queue(session_factory, DBCropJob, backend="redis")
+
+
+@pytest.mark.asyncio
+async def test_put_many(session_factory) -> None:
+    memory_queue = job_queue.MemoryJobQueue(session_factory, DBCropJob)
+    await memory_queue.put_many(["job1", "job2"])
+    assert [memory_queue.get_nowait(), memory_queue.get_nowait()] == ["job1", "job2"]
+
+    database_queue = job_queue.DatabaseJobQueue(
+        session_factory, DBCropJob, poll_interval=10
+    )
+    add_job(session_factory, "job1")
+    add_job(session_factory, "job2")
+    await database_queue.put_many(["job1", "job2"])
+    assert await asyncio.wait_for(database_queue.get(), timeout=1) == "job1"
@@ -0,0 +1,70 @@
+import hashlib
+import pytest
+from unittest.mock import patch
+from starlette.requests import Request
+from starlette.concurrency import run_in_threadpool
+from server.api.services import multipart_upload
+from server.api.services.multipart_upload import MultipartUploadError, StreamedUpload
+
+
+def multipart_request(body: bytes, boundary: str = "boundary") -> Request:
+    async def receive() -> dict:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={boundary}".encode())
+        ],
+    }
+    return Request(scope, receive)
+
+
+@pytest.mark.asyncio
+async def test_streamed_upload_spills_to_disk_off_the_event_loop() -> None:
+    upload = StreamedUpload("face.jpg", "image/jpeg", spool_max_bytes=8)
+    with patch(
+        "server.api.services.multipart_upload.run_in_threadpool", wraps=run_in_threadpool
+    ) as threadpool:
+        # Within the spool the chunks are written in memory
+        await upload.write(b"1234")
+        await upload.write(b"5678")
+        assert not threadpool.called
+
+        # The chunk crossing the limit rolls the file over to disk in the threadpool
+        await upload.write(b"9")
+        await upload.write(b"0")
+        assert threadpool.call_count == 2
+
+    assert upload.size == 10
+    assert upload.read() == b"1234567890"
+    assert upload.sha256 == hashlib.sha256(b"1234567890").hexdigest()
+    upload.close()
+
+
+@pytest.mark.asyncio
+async def test_repeated_part_is_rejected_and_its_upload_closed(monkeypatch) -> None:
+    body = (
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="image"; filename="a.jpg"\r\n\r\n'
+        b"first\r\n"
+        b"--boundary\r\n"
+        b'Content-Disposition: form-data; name="image"; filename="b.jpg"\r\n\r\n'
+        b"second\r\n"
+        b"--boundary--\r\n"
+    )
+    created = []
+
+    class RecordingUpload(StreamedUpload):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(multipart_upload, "StreamedUpload", RecordingUpload)
+    with pytest.raises(MultipartUploadError):
+        await multipart_upload.read_multipart_upload(multipart_request(body))
+
+    # The first upload was not replaced: it is closed with the others
+    assert len(created) == 1
+    assert created[0].file.closed
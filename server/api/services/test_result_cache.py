@@ -0,0 +1,73 @@
+import time
+from server.api.services import result_cache
+from server.api.services.result_cache import JobResultCache, build_job_data
+
+
+def completed_job(job_id: str, svg_size: int) -> dict:
+    return build_job_data(job_id, "completed", "s" * svg_size, [])
+
+
+def test_get_miss_and_hit() -> None:
+    cache = JobResultCache(max_bytes=10_000)
+    assert cache.get("job1") is None
+
+    cache.set("job1", completed_job("job1", 10))
+    assert cache.get("job1")["id"] == "job1"
+
+
+def test_failed_job_has_error_message() -> None:
+    job_data = build_job_data("job1", "failed", None, None)
+    assert job_data["error"] == "Job processing failed."
+    assert build_job_data("job2", "completed", "svg", [])["error"] is None
+
+
+def test_pending_entries_expire() -> None:
+    cache = JobResultCache(max_bytes=10_000, pending_ttl_seconds=0.01)
+    cache.set("job1", build_job_data("job1", "pending", None, None))
+    assert cache.get("job1")["status"] == "pending"
+
+    time.sleep(0.02)
+    assert cache.get("job1") is None
+    assert len(cache) == 0
+
+
+def test_completed_entries_do_not_expire() -> None:
+    cache = JobResultCache(max_bytes=10_000, pending_ttl_seconds=0.01)
+    cache.set("job1", completed_job("job1", 10))
+    time.sleep(0.02)
+    assert cache.get("job1") is not None
+
+
+def test_lru_eviction_respects_byte_budget() -> None:
+    entry_size = result_cache.ENTRY_OVERHEAD_BYTES + 100 + len("[]")
+    cache = JobResultCache(max_bytes=entry_size * 2)
+    cache.set("job1", completed_job("job1", 100))
+    cache.set("job2", completed_job("job2", 100))
+
+    # job1 becomes the most recently used entry, so job2 is evicted
+    assert cache.get("job1") is not None
+    cache.set("job3", completed_job("job3", 100))
+
+    assert cache.get("job2") is None
+    assert cache.get("job1") is not None
+    assert cache.get("job3") is not None
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_oversized_entry_is_not_cached() -> None:
+    cache = JobResultCache(max_bytes=100)
+    cache.set("job1", completed_job("job1", 1_000))
+    assert cache.get("job1") is None
+    assert cache.current_bytes == 0
+
+
+def test_set_replaces_and_invalidate_removes_single_key() -> None:
+    cache = JobResultCache(max_bytes=10_000)
+    cache.set("job1", build_job_data("job1", "pending", None, None))
+    cache.set("job1", completed_job("job1", 10))
+    cache.set("job2", completed_job("job2", 10))
+    assert cache.get("job1")["status"] == "completed"
+
+    cache.invalidate("job1")
+    assert cache.get("job1") is None
+    assert cache.get("job2") is not None
@@ -0,0 +1,64 @@
+import gzip
+import base64
+import pytest
+from server.api.services import svg_result
+from server.api.services.svg_result import (
+    compress_svg_result,
+    svg_result_blobs,
+    if_none_match_matches,
+    negotiate_encoding,
+    svg_result_etag,
+)
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b"<path d='M0 0'/>" * 100 + b"</svg>"
+
+
+def test_compress_svg_result() -> None:
+    compressed = compress_svg_result(base64.b64encode(SVG).decode("ascii"))
+    assert len(compressed.sha256) == 64
+    assert gzip.decompress(compressed.gzip) == SVG
+    # Compressing twice gives the same bytes
+    assert compress_svg_result(base64.b64encode(SVG).decode("ascii")) == compressed
+    if svg_result.brotli is None:
+        assert compressed.br is None
+    else:
+        assert svg_result.brotli.decompress(compressed.br) == SVG
+
+
+def test_svg_result_blobs() -> None:
+    compressed = compress_svg_result(base64.b64encode(SVG).decode("ascii"))
+    blobs = svg_result_blobs(compressed)
+    assert blobs[compressed.sha256] == SVG
+    assert blobs[compressed.gzip_sha256] == compressed.gzip
+    assert len(blobs) == (2 if compressed.br is None else 3)
+
+
+def test_compress_svg_result_rejects_invalid_base64() -> None:
+    with pytest.raises(ValueError):
+        compress_svg_result("svgbase64")
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, available, expected",
+    [
+        (None, ["br", "gzip"], "identity"),
+        ("gzip, deflate, br", ["br", "gzip"], "br"),
+        ("gzip, deflate, br", ["gzip"], "gzip"),
+        ("br;q=0.5, gzip", ["br", "gzip"], "gzip"),
+        ("gzip;q=0", ["gzip"], "identity"),
+        ("*", ["gzip"], "gzip"),
+        ("deflate", ["br", "gzip"], "identity"),
+    ],
+)
+def test_negotiate_encoding(accept_encoding, available, expected) -> None:
+    assert negotiate_encoding(accept_encoding, available) == expected
+
+
+def test_if_none_match_matches_every_encoding() -> None:
+    assert svg_result_etag("abc", "identity") == '"abc"'
+    assert svg_result_etag("abc", "gzip") == '"abc-gzip"'
+    assert if_none_match_matches('"abc"', "abc")
+    assert if_none_match_matches('"other", W/"abc-gzip"', "abc")
+    assert if_none_match_matches("*", "abc")
+    assert not if_none_match_matches('"abcd"', "abc")
+    assert not if_none_match_matches(None, "abc")
@@ -1,6 +1,9 @@
 import sys
+import threading
 import pytest
 import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from server.api.services import worker
 from unittest.mock import MagicMock, patch
 
@@ -146,6 +149,292 @@ with patch.dict(
         assert worker.job_completed_counter.inc.called
         # Check that db_job status was set to completed
         assert db_job.status == "completed"
+        # Check that the result cache was populated for this job
+        assert worker.job_result_cache.get("job3")["svg"] == "svgbase64"
+
+    @pytest.mark.asyncio
+    async def test_process_jobs_worker_success_with_executor(monkeypatch) -> None:
+        job_queue = asyncio.Queue()
+        await job_queue.put("job5")
+
+        db_job = MagicMock()
+        db_job.status = "pending"
+        db_job.landmarks_json = {"foo": "bar"}
+        db_job.image_base64 = "abc123"
+        db_session = MagicMock()
+        db_session.query.return_value.filter.return_value.first.return_value = db_job
+        db_session_factory = MagicMock(return_value=db_session)
+        db_crop_job_model = MagicMock()
+
+        monkeypatch.setattr(worker, "job_total_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_failed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_completed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(
+            worker, "job_processing_duration_seconds", MagicMock(observe=MagicMock())
+        )
+        monkeypatch.setattr(worker, "console", MagicMock())
+        process_image_mock = MagicMock(
+            return_value=("svgbase64", ["contour1", "contour2"])
+        )
+        monkeypatch.setattr(worker, "process_image_data_intensive", process_image_mock)
+
+        # Use a thread pool so the mocked function does not need to be pickled
+        executor = ThreadPoolExecutor(max_workers=1)
+        task = asyncio.create_task(
+            worker.process_jobs_worker(
+                job_queue,
+                db_session_factory,
+                db_crop_job_model,
+                loadtest_mode_enabled=True,
+                executor=executor,
+            )
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        executor.shutdown()
+
+        # Check that the processing ran and the result was stored
+        assert process_image_mock.called
+        assert worker.job_completed_counter.inc.called
+        assert db_job.svg_base64 == "svgbase64"
+        assert db_job.status == "completed"
+
+    @pytest.mark.asyncio
+    async def test_process_jobs_worker_restarts_a_broken_pool(monkeypatch) -> None:
+        job_queue = asyncio.Queue()
+        await job_queue.put("job10")
+
+        db_job = MagicMock()
+        db_job.status = "pending"
+        db_job.landmarks_json = {"foo": "bar"}
+        db_job.image_base64 = "abc123"
+        db_session = MagicMock()
+        db_session.query.return_value.filter.return_value.first.return_value = db_job
+        db_session_factory = MagicMock(return_value=db_session)
+
+        monkeypatch.setattr(worker, "job_total_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_failed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_completed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(
+            worker, "job_processing_duration_seconds", MagicMock(observe=MagicMock())
+        )
+        monkeypatch.setattr(worker, "console", MagicMock())
+        monkeypatch.setattr(
+            worker,
+            "process_image_data_intensive",
+            MagicMock(return_value=("svgbase64", ["contour1"])),
+        )
+
+        # A pool whose process died: jobs fail until it is restarted
+        class BrokenPool(ThreadPoolExecutor):
+            broken = True
+            restarts = 0
+
+            def submit(self, fn, *args, **kwargs):
+                if self.broken:
+                    future = Future()
+                    future.set_exception(BrokenProcessPool("process died"))
+                    return future
+                return super().submit(fn, *args, **kwargs)
+
+            def restart_if_broken(self) -> bool:
+                self.restarts += 1
+                self.broken = False
+                return True
+
+        executor = BrokenPool(max_workers=1)
+        task = asyncio.create_task(
+            worker.process_jobs_worker(
+                job_queue,
+                db_session_factory,
+                MagicMock(),
+                loadtest_mode_enabled=True,
+                executor=executor,
+            )
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        executor.shutdown()
+
+        # The pool was restarted and the job retried instead of failed
+        assert executor.restarts == 1
+        assert db_job.status == "completed"
+        assert not worker.job_failed_counter.inc.called
+
+    @pytest.mark.asyncio
+    async def test_run_worker_fleet_processes_all_jobs(monkeypatch) -> None:
+        job_queue = asyncio.Queue()
+        for job_id in ("job6", "job7", "job8"):
+            await job_queue.put(job_id)
+
+        db_job = MagicMock()
+        db_job.status = "pending"
+        db_job.landmarks_json = {"foo": "bar"}
+        db_job.image_base64 = "abc123"
+        db_session = MagicMock()
+        db_session.query.return_value.filter.return_value.first.return_value = db_job
+        db_session_factory = MagicMock(return_value=db_session)
+        db_crop_job_model = MagicMock()
+
+        monkeypatch.setattr(worker, "job_total_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_failed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_completed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(
+            worker, "job_processing_duration_seconds", MagicMock(observe=MagicMock())
+        )
+        monkeypatch.setattr(worker, "console", MagicMock())
+        process_image_mock = MagicMock(
+            return_value=("svgbase64", ["contour1", "contour2"])
+        )
+        monkeypatch.setattr(worker, "process_image_data_intensive", process_image_mock)
+
+        task = asyncio.create_task(
+            worker.run_worker_fleet(
+                job_queue,
+                db_session_factory,
+                db_crop_job_model,
+                loadtest_mode_enabled=True,
+                concurrency=2,
+            )
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # Every queued job must have been picked up by the fleet
+        assert worker.job_total_counter.inc.call_count == 3
+        assert process_image_mock.called
+        assert job_queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_lease_heartbeat_and_stale_job_sweep(monkeypatch) -> None:
+        monkeypatch.setattr(worker, "console", MagicMock())
+        job_queue = MagicMock()
+
+        # The heartbeat stops once the job is no longer leased to the worker
+        job_queue.renew_lease.side_effect = [True, False]
+        assert not await asyncio.wait_for(
+            worker._renew_lease_while_running(job_queue, "job1", 1, 0.01), timeout=1
+        )
+        assert job_queue.renew_lease.call_count == 2
+        job_queue.renew_lease.assert_called_with("job1", 1)
+
+        # The sweep runs every interval until cancelled
+        sweep_task = asyncio.ensure_future(
+            worker._sweep_stale_jobs_periodically(job_queue, 0.01)
+        )
+        await asyncio.sleep(0.1)
+        sweep_task.cancel()
+        assert job_queue.sweep_stale_jobs.call_count >= 2
+
+    @pytest.mark.asyncio
+    async def test_process_jobs_worker_discards_result_after_lease_loss(
+        monkeypatch,
+    ) -> None:
+        # The job was claimed again by another worker while this one processed it
+        class LostLeaseQueue(asyncio.Queue):
+            def renew_lease(self, job_id, attempts=None):
+                return False
+
+        job_queue = LostLeaseQueue()
+        await job_queue.put("job9")
+
+        db_job = MagicMock()
+        db_job.status = "processing"
+        db_job.attempts = 1
+        db_job.landmarks_json = {"foo": "bar"}
+        db_job.image_base64 = "abc123"
+        db_session = MagicMock()
+        db_session.query.return_value.filter.return_value.first.return_value = db_job
+        db_session_factory = MagicMock(return_value=db_session)
+
+        monkeypatch.setattr(worker, "job_total_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_failed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_completed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(
+            worker, "job_processing_duration_seconds", MagicMock(observe=MagicMock())
+        )
+        monkeypatch.setattr(worker, "console", MagicMock())
+        monkeypatch.setattr(
+            worker,
+            "process_image_data_intensive",
+            MagicMock(return_value=("svgbase64", ["contour1"])),
+        )
+
+        task = asyncio.create_task(
+            worker.process_jobs_worker(
+                job_queue, db_session_factory, MagicMock(), loadtest_mode_enabled=True
+            )
+        )
+        await asyncio.sleep(0.1)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # The row of the other worker is neither completed nor committed
+        assert db_job.status == "processing"
+        assert not db_session.commit.called
+        assert db_session.rollback.called
+        assert not worker.job_completed_counter.inc.called
+        assert worker.job_result_cache.get("job9") is None
+
+    @pytest.mark.asyncio
+    async def test_process_jobs_worker_drains_on_stop_event(monkeypatch) -> None:
+        job_queue = asyncio.Queue()
+        await job_queue.put("job9")
+
+        db_job = MagicMock()
+        db_job.status = "pending"
+        db_job.landmarks_json = {"foo": "bar"}
+        db_job.image_base64 = "abc123"
+        db_session = MagicMock()
+        db_session.query.return_value.filter.return_value.first.return_value = db_job
+        db_session_factory = MagicMock(return_value=db_session)
+        db_crop_job_model = MagicMock()
+
+        monkeypatch.setattr(worker, "job_total_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_failed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(worker, "job_completed_counter", MagicMock(inc=MagicMock()))
+        monkeypatch.setattr(
+            worker, "job_processing_duration_seconds", MagicMock(observe=MagicMock())
+        )
+        monkeypatch.setattr(worker, "console", MagicMock())
+        monkeypatch.setattr(
+            worker,
+            "process_image_data_intensive",
+            MagicMock(return_value=("svgbase64", ["contour1"])),
+        )
+
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(
+            worker.process_jobs_worker(
+                job_queue,
+                db_session_factory,
+                db_crop_job_model,
+                loadtest_mode_enabled=True,
+                stop_event=stop_event,
+            )
+        )
+        await asyncio.sleep(0.1)
+
+        # The queued job was processed, the idle worker must exit on its own
+        assert db_job.status == "completed"
+        stop_event.set()
+        await asyncio.wait_for(task, timeout=1)
+        assert task.done() and not task.cancelled()
 
     @pytest.mark.asyncio
     async def test_process_jobs_worker_exception(monkeypatch) -> None:
@@ -208,10 +497,16 @@ with patch.dict(
 
         monkeypatch.setattr(worker, "Base", MagicMock())
         monkeypatch.setattr(worker, "engine", MagicMock())
-        monkeypatch.setattr(worker, "job_queue", asyncio.Queue())
+        monkeypatch.setattr(worker, "job_queue", MagicMock())
         monkeypatch.setattr(worker, "SessionLocal", MagicMock())
         monkeypatch.setattr(worker, "DBCropJob", MagicMock())
         monkeypatch.setattr(worker, "console", MagicMock())
+        monkeypatch.setattr(
+            worker, "create_image_processing_pool", MagicMock(return_value=None)
+        )
+        monkeypatch.setattr(
+            worker, "select_image_processor_backend", MagicMock(return_value="py")
+        )
 
         # Patch asyncio.create_task to return a dummy task
         dummy_task = MagicMock()
@@ -220,9 +515,39 @@ with patch.dict(
         # Test startup
         await worker.startup_db_and_worker(app_instance, loadtest_mode_enabled=True)
         assert hasattr(app_instance.state, "job_processing_task")
+        assert worker.job_queue.recover.called
+        # The pool processes reuse the backend selected at startup
+        worker.create_image_processing_pool.assert_called_once_with(
+            image_processor_backend="py"
+        )
 
         # Test shutdown
         dummy_task.cancel = MagicMock()
         dummy_task.__await__ = lambda s: iter([])
         await worker.shutdown_worker(app_instance)
         assert dummy_task.cancel.called
+
+    @pytest.mark.asyncio
+    async def test_shutdown_worker_stops_the_pool_off_the_event_loop(
+        monkeypatch,
+    ) -> None:
+        class State:
+            pass
+
+        class App:
+            state = State()
+
+        app_instance = App()
+        app_instance.state.image_processing_pool = MagicMock()
+
+        # Record the thread that joins the pool
+        shutdown_threads = []
+        monkeypatch.setattr(
+            worker,
+            "shutdown_image_processing_pool",
+            lambda executor: shutdown_threads.append(threading.get_ident()),
+        )
+
+        await worker.shutdown_worker(app_instance)
+        assert len(shutdown_threads) == 1
+        assert shutdown_threads[0] != threading.get_ident()
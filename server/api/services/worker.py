@@ -1,58 +1,206 @@
+import os
+import signal
 import asyncio
+import argparse
+import functools
+import multiprocessing
 from datetime import datetime
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
 from services.logger import console
-from routers.frontal import job_queue
+from routers.frontal import job_queue, blob_store
 from models.crop_model import DBCropJob
 from drivers.database import engine, Base, SessionLocal
+from services.job_queue import (
+    DatabaseJobQueue,
+    JOB_LEASE_RENEW_INTERVAL_SECONDS,
+    JOB_STALE_SWEEP_INTERVAL_SECONDS,
+)
+from exlib.py.image_processor import embedded_image_info
+from services.processing_options import IMAGE_PROCESSING_OPTIONS
+from services.image_backends import (
+    process_image_data_intensive,
+    select_image_processor_backend,
+)
+from services.result_cache import job_result_cache, build_job_data
+from services.svg_result import (
+    CompressedSvgResult,
+    compress_svg_result,
+    svg_result_blobs,
+)
+from services.blob_store import load_base64_bytes
+from services.job_notifier import job_notifier, queue_job_status_notification
+from services.executor import (
+    IMAGE_PROCESSING_POOL_SIZE,
+    create_image_processing_pool,
+    shutdown_image_processing_pool,
+)
 
 from services.metrics import (
     job_total_counter,
     job_completed_counter,
     job_failed_counter,
     job_processing_duration_seconds,
+    job_embedded_image_bytes,
 )
 
-# Import the image processing function
-# This block attempts to import the compiled Cython module first from the new path.
-# If the Cython module (image_processor.so/.pyd within exlib/pyc) is found and successfully imported,
-# it will use that for performance.
-# If an ImportError occurs, it will fall back to importing the
-# pure Python version of image_processor.py from exlib/py.
-#
-# IMPORTANT: Ensure your project structure includes:
-# - exlib/
-# - exlib/__init__.py (empty file)
-# - exlib/pyc/
-# - exlib/pyc/__init__.py (empty file)
-# - exlib/pyc/image_processor.pyx (your Cython source)
-# - exlib/py/
-# - exlib/py/__init__.py (empty file)
-# - exlib/py/image_processor.py (your pure Python source)
-#
-# After compiling image_processor.pyx, the compiled .so/.pyd file will appear
-# alongside image_processor.pyx in exlib/pyc.
-try:
-    from exlib.pyc.image_processor import process_image_data_intensive
+# Number of concurrent worker tasks pulling jobs from the queue.
+# Defaults to the process pool size so every pool process can be kept busy.
+WORKER_CONCURRENCY = int(
+    os.getenv("WORKER_CONCURRENCY", str(max(1, IMAGE_PROCESSING_POOL_SIZE)))
+)
 
-    console.log(
-        "[bold green]Successfully imported Cythonized image_processor from exlib.pyc.[/bold green]"
+# Number of standalone worker processes started by `python -m services.worker`
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+
+# Seconds a draining standalone worker waits for in-flight jobs before cancelling them
+WORKER_DRAIN_TIMEOUT_SECONDS = float(os.getenv("WORKER_DRAIN_TIMEOUT_SECONDS", "60"))
+
+
+# Wait for the next job, or return None once the stop event is set (drain)
+async def _next_job_id(
+    job_queue: asyncio.Queue, stop_event: Optional[asyncio.Event]
+) -> Optional[str]:
+
+    # Without a stop event the worker only stops when cancelled
+    if stop_event is None:
+        return await job_queue.get()
+    if stop_event.is_set():
+        return None
+
+    get_task = asyncio.ensure_future(job_queue.get())
+    stop_task = asyncio.ensure_future(stop_event.wait())
+    try:
+        await asyncio.wait({get_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stop_task.cancel()
+        if not get_task.done():
+            get_task.cancel()
+
+    # A job claimed at the same time as the stop signal is still processed
+    if get_task.done() and not get_task.cancelled():
+        return get_task.result()
+    return None
+
+
+# Renew the lease of the job claim once, in a thread: True while the worker still holds
+# it (plain asyncio queues lease nothing)
+async def _renew_lease(
+    job_queue: asyncio.Queue, job_id: str, attempts: Optional[int]
+) -> bool:
+
+    renew_lease = getattr(job_queue, "renew_lease", None)
+    if renew_lease is None:
+        return True
+    return await asyncio.get_running_loop().run_in_executor(
+        None, renew_lease, job_id, attempts
     )
-except ImportError:
-    # Fallback to pure Python version if Cython module is not found.
-    from exlib.py.image_processor import process_image_data_intensive
 
+
+# Renew the lease of a running job until cancelled, returning False once it is lost
+async def _renew_lease_while_running(
+    job_queue: asyncio.Queue, job_id: str, attempts: Optional[int], interval: float
+) -> bool:
+
+    if getattr(job_queue, "renew_lease", None) is None:
+        return True
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            renewed = await _renew_lease(job_queue, job_id, attempts)
+        except Exception as e:
+            console.log(
+                f"[warning]Could not renew the lease of job {job_id}: {e}[/warning]"
+            )
+            continue
+        if not renewed:
+            console.log(
+                f"[warning]Job {job_id} is no longer leased to this worker.[/warning]"
+            )
+            return False
+
+
+# Check the worker still holds the lease before recording the job outcome: once it is
+# lost, another worker may have claimed the job again and owns its result
+async def _holds_lease(
+    job_queue: asyncio.Queue,
+    job_id: str,
+    attempts: Optional[int],
+    lease_task: Optional[asyncio.Future],
+) -> bool:
+
+    if lease_task is not None and lease_task.done() and not lease_task.cancelled():
+        if lease_task.exception() is None and lease_task.result() is False:
+            return False
+    try:
+        return await _renew_lease(job_queue, job_id, attempts)
+    except Exception as e:
+        # The outcome is recorded: the lease guards against a second claim, not DB errors
+        console.log(f"[warning]Could not renew the lease of job {job_id}: {e}[/warning]")
+        return True
+
+
+# Requeue or fail the jobs whose lease expired, every interval, until cancelled
+async def _sweep_stale_jobs_periodically(job_queue: asyncio.Queue, interval: float) -> None:
+
+    sweep_stale_jobs = getattr(job_queue, "sweep_stale_jobs", None)
+    if sweep_stale_jobs is None:
+        return
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            sweep_stale_jobs()
+        except Exception as e:
+            console.log(f"[error]Error sweeping stale jobs: {e}[/error]")
+
+
+# Run a job in the image processing pool. A process that died (OOM kill, native crash)
+# breaks the pool and fails every job it was running: the pool is restarted and the job
+# retried once, so only a job that breaks it again fails.
+async def _run_in_image_processing_pool(executor: Executor, process_image_call):
+
+    loop = asyncio.get_running_loop()
+    restart_if_broken = getattr(executor, "restart_if_broken", None)
+    for attempt in range(2):
+        try:
+            return await loop.run_in_executor(executor, process_image_call)
+        except BrokenProcessPool:
+            if restart_if_broken is None:
+                raise
+            console.log(
+                "[warning]Image processing pool broken while running a job.[/warning]"
+            )
+            # Starting processes blocks until they are warm, keep it off the event loop
+            await loop.run_in_executor(None, restart_if_broken)
+            if attempt:
+                raise
+
+
+# Drop the outcome of a job whose lease was lost, the worker holding it records its own
+def _discard_job_outcome(db: Session, job_id: str) -> None:
+    db.rollback()
     console.log(
-        "[bold yellow]Cythonized image_processor not found. Using pure Python version from exlib.py.[/bold yellow]"
+        f"[warning]Lease of job {job_id} lost, discarding this worker's result.[/warning]"
     )
 
 
+# Compress the SVG result and read the embedded image info from the decoded document,
+# both off the event loop
+def _compress_svg_result(svg_base64: str) -> Tuple[CompressedSvgResult, Tuple[str, int]]:
+    compressed_svg = compress_svg_result(svg_base64)
+    return compressed_svg, embedded_image_info(compressed_svg.svg)
+
+
 # Background Job Processing Worker
 async def process_jobs_worker(
     job_queue: asyncio.Queue,
     db_session_factory,
     db_crop_job_model,
     loadtest_mode_enabled: bool,
+    executor: Optional[Executor] = None,
+    stop_event: Optional[asyncio.Event] = None,
 ) -> None:
 
     # Start the worker loop to process jobs from the queue
@@ -60,7 +208,12 @@ async def process_jobs_worker(
 
         try:
             # Wait for a job from the queue
-            job_id = await job_queue.get()
+            job_id = await _next_job_id(job_queue, stop_event)
+
+            # Stop taking new jobs once the worker is asked to drain
+            if job_id is None:
+                console.log("[info]Job processing worker drained.[/info]")
+                break
             console.log(f"[debug]Worker received job: {job_id}[/debug]")
 
             # Increment the total job counter
@@ -69,10 +222,12 @@ async def process_jobs_worker(
             # Create a new database session for this job
             db: Session = db_session_factory()
             db_job = None
+            lease_task = None
             start_time = datetime.utcnow()
 
             try:
-                # Fetch the job from the database using the provided job_id
+                # Fetch the job from the database using the provided job_id.
+                # The image is deferred and loaded on access, the other blobs never are.
                 db_job = (
                     db.query(db_crop_job_model)
                     .filter(db_crop_job_model.job_id == job_id)
@@ -95,6 +250,18 @@ async def process_jobs_worker(
                     job_completed_counter.inc()
                     continue
 
+                # Keep the job leased for as long as it runs. The claim counted an
+                # attempt: the count identifies this claim of the job.
+                claimed_attempts = db_job.attempts
+                lease_task = asyncio.ensure_future(
+                    _renew_lease_while_running(
+                        job_queue,
+                        job_id,
+                        claimed_attempts,
+                        JOB_LEASE_RENEW_INTERVAL_SECONDS,
+                    )
+                )
+
                 # If the job is in progress, log and skip reprocessing
                 if not loadtest_mode_enabled:
                     console.log(
@@ -107,25 +274,95 @@ async def process_jobs_worker(
                         f"[bold magenta]Load testing mode: Skipping artificial delay for job {job_id}.[/bold magenta]"
                     )
 
-                # Process the image data using the imported function
-                generated_svg_base64, generated_mask_contours_list = (
-                    process_image_data_intensive(
-                        loadtest_mode_enabled,
-                        landmarks_data=db_job.landmarks_json,
-                        original_image_base64_bytes=db_job.image_base64.encode("utf-8"),
-                        # ,
-                        # segmentation_map_base64_bytes=db_job.segmentation_map_base64.encode('utf-8')
+                # The image processors take base64: blobs are encoded, jobs created
+                # before the blob store still have their (deferred) base64 columns
+                original_image_base64_bytes = load_base64_bytes(
+                    db, blob_store, db_job.image_base64, db_job.image_sha256
+                )
+
+                # The segmentation map is only loaded when labels are configured
+                segmentation_map_base64_bytes = None
+                if IMAGE_PROCESSING_OPTIONS["segmentation_labels"]:
+                    segmentation_map_base64_bytes = load_base64_bytes(
+                        db,
+                        blob_store,
+                        db_job.segmentation_map_base64,
+                        db_job.segmentation_map_sha256,
                     )
+
+                # Process the image data with the selected image processor backend
+                process_image_call = functools.partial(
+                    process_image_data_intensive,
+                    loadtest_mode_enabled,
+                    landmarks_data=db_job.landmarks_json,
+                    original_image_base64_bytes=original_image_base64_bytes,
+                    segmentation_map_base64_bytes=segmentation_map_base64_bytes,
+                    **IMAGE_PROCESSING_OPTIONS,
                 )
 
+                # Run in the executor (if any) so the event loop keeps serving requests
+                if executor is not None:
+                    generated_svg_base64, generated_mask_contours_list = (
+                        await _run_in_image_processing_pool(
+                            executor, process_image_call
+                        )
+                    )
+                else:
+                    generated_svg_base64, generated_mask_contours_list = (
+                        process_image_call()
+                    )
+
+                # Compress the SVG document once for GET /crop/result/{job_id}.svg
+                # and store it and its copies as blobs. zlib and brotli release the GIL,
+                # a thread keeps the loop responsive.
+                embedded_image = None
+                try:
+                    compressed_svg, embedded_image = (
+                        await asyncio.get_running_loop().run_in_executor(
+                            None, _compress_svg_result, generated_svg_base64
+                        )
+                    )
+                    blob_store.put_many(db, svg_result_blobs(compressed_svg))
+                    db_job.svg_sha256 = compressed_svg.sha256
+                    db_job.svg_gzip_sha256 = compressed_svg.gzip_sha256
+                    db_job.svg_br_sha256 = compressed_svg.br_sha256
+                    db_job.svg_base64 = None
+                except Exception as e:
+                    # The result is still served, as base64 text and uncompressed
+                    console.log(
+                        f"[warning]Could not store the SVG of job {job_id} as a blob: {e}[/warning]"
+                    )
+                    db_job.svg_base64 = generated_svg_base64
+
+                # A job taken away from the worker is not overwritten
+                if not await _holds_lease(
+                    job_queue, job_id, claimed_attempts, lease_task
+                ):
+                    _discard_job_outcome(db, job_id)
+                    continue
+
                 # Convert the mask contours to SVG path format
-                db_job.svg_base64 = generated_svg_base64
                 db_job.mask_contours_json = generated_mask_contours_list
                 db_job.status = "completed"
                 db_job.completed_at = datetime.utcnow()
+                db_job.lease_expires_at = None
                 db.add(db_job)
+                queue_job_status_notification(db, job_id, "completed")
                 db.commit()
-                db.refresh(db_job)
+
+                # Populate the result cache for this job only
+                job_result_cache.set(
+                    job_id,
+                    build_job_data(
+                        job_id,
+                        "completed",
+                        generated_svg_base64,
+                        generated_mask_contours_list,
+                    ),
+                )
+
+                # Wake the status requests of this process waiting for the job
+                job_notifier.notify(job_id, "completed")
 
                 # Log the successful processing of the job
                 console.log(
@@ -135,16 +372,34 @@ async def process_jobs_worker(
                 # Update the LRU cache with the new job data
                 job_completed_counter.inc()
 
+                # Report the encoded size of the embedded image
+                if embedded_image is not None and embedded_image[1]:
+                    mime_type, image_size = embedded_image
+                    job_embedded_image_bytes.labels(mime_type=mime_type).observe(
+                        image_size
+                    )
+
             except Exception as e:
                 # Log the error and update the job status to failed
                 console.log(f"[error]Error processing job {job_id}: {e}[/error]")
+                if lease_task is not None and not await _holds_lease(
+                    job_queue, job_id, claimed_attempts, lease_task
+                ):
+                    _discard_job_outcome(db, job_id)
+                    continue
                 if db_job:
                     db_job.status = "failed"
+                    db_job.lease_expires_at = None
                     db.add(db_job)
+                    queue_job_status_notification(db, job_id, "failed")
                     db.commit()
                 db.rollback()  # Rollback the transaction in case of an error
+                job_result_cache.invalidate(job_id)
+                job_notifier.notify(job_id, "failed")
                 job_failed_counter.inc()  # Update the failed job counter
             finally:
+                if lease_task is not None:
+                    lease_task.cancel()
                 if db:
                     db.close()
                 job_queue.task_done()  # Mark the job as done in the queue
@@ -167,20 +422,84 @@ async def process_jobs_worker(
             await asyncio.sleep(1)
 
 
+# Run a fleet of concurrent workers sharing the same job queue
+async def run_worker_fleet(
+    job_queue: asyncio.Queue,
+    db_session_factory,
+    db_crop_job_model,
+    loadtest_mode_enabled: bool,
+    concurrency: int = WORKER_CONCURRENCY,
+    executor: Optional[Executor] = None,
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+
+    # Every fleet sweeps the expired leases, so jobs out of attempts get failed
+    sweep_task = asyncio.ensure_future(
+        _sweep_stale_jobs_periodically(job_queue, JOB_STALE_SWEEP_INTERVAL_SECONDS)
+    )
+
+    # Cancelling the fleet task cancels every worker gathered here
+    try:
+        await asyncio.gather(
+            *(
+                process_jobs_worker(
+                    job_queue,
+                    db_session_factory,
+                    db_crop_job_model,
+                    loadtest_mode_enabled,
+                    executor=executor,
+                    stop_event=stop_event,
+                )
+                for _ in range(max(1, concurrency))
+            )
+        )
+    finally:
+        sweep_task.cancel()
+
+
 # Startup and Shutdown Functions for the Worker
-async def startup_db_and_worker(app_instance, loadtest_mode_enabled: bool) -> None:
+async def startup_db_and_worker(
+    app_instance, loadtest_mode_enabled: bool, run_worker: bool = True
+) -> None:
 
     console.log("[info]Creating database tables if they don't exist...[/info]")
     # Create the database tables if they do not exist
     Base.metadata.create_all(bind=engine)
     console.log("[success]Database tables checked/created.[/success]")
 
-    # Initialize the job processing worker
+    # Jobs are processed by standalone workers (python -m services.worker)
+    if not run_worker:
+        console.log(
+            "[bold yellow]Background worker disabled: jobs are left to standalone workers.[/bold yellow]"
+        )
+        return
+
+    # Requeue the jobs a previous process left pending or processing
+    job_queue.recover()
+
+    # Pick the image processor backend (env or benchmark) before starting the pool
+    image_processor_backend = select_image_processor_backend()
+
+    # Start the process pool used for the CPU-bound image processing
+    app_instance.state.image_processing_pool = create_image_processing_pool(
+        image_processor_backend=image_processor_backend
+    )
+
+    # Initialize the job processing workers
     app_instance.state.job_processing_task = asyncio.create_task(
-        # Pass the loadtest_mode_enabled flag to the worker
-        process_jobs_worker(job_queue, SessionLocal, DBCropJob, loadtest_mode_enabled)
+        # Pass the loadtest_mode_enabled flag to the workers
+        run_worker_fleet(
+            job_queue,
+            SessionLocal,
+            DBCropJob,
+            loadtest_mode_enabled,
+            concurrency=WORKER_CONCURRENCY,
+            executor=app_instance.state.image_processing_pool,
+        )
+    )
+    console.log(
+        f"[info]Background job processing started with {WORKER_CONCURRENCY} worker(s).[/info]"
     )
-    console.log("[info]Background job processing worker started.[/info]")
 
 
 # Shutdown function to cancel the worker task gracefully
@@ -202,3 +521,140 @@ async def shutdown_worker(app_instance) -> None:
         except Exception as e:
             # Log any error that occurs while stopping the worker
             console.log(f"[error]Error stopping worker: {e}[/error]")
+
+    # Stop the image processing pool once the worker no longer uses it
+    if hasattr(app_instance.state, "image_processing_pool"):
+        # Joining the pool waits for in-flight jobs, so keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            shutdown_image_processing_pool,
+            app_instance.state.image_processing_pool,
+        )
+
+
+# Run the worker fleet until SIGTERM/SIGINT, then drain the in-flight jobs
+async def run_standalone_worker(
+    loadtest_mode_enabled: bool,
+    concurrency: int = WORKER_CONCURRENCY,
+    drain_timeout: float = WORKER_DRAIN_TIMEOUT_SECONDS,
+) -> None:
+
+    # Signals only ask the workers to stop claiming new jobs
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    image_processor_backend = select_image_processor_backend()
+    executor = create_image_processing_pool(
+        image_processor_backend=image_processor_backend
+    )
+    fleet_task = asyncio.create_task(
+        run_worker_fleet(
+            job_queue,
+            SessionLocal,
+            DBCropJob,
+            loadtest_mode_enabled,
+            concurrency=concurrency,
+            executor=executor,
+            stop_event=stop_event,
+        )
+    )
+    console.log(
+        f"[success]Standalone worker {os.getpid()} started with {concurrency} worker(s).[/success]"
+    )
+
+    try:
+        await stop_event.wait()
+        console.log(
+            f"[info]Standalone worker {os.getpid()} draining (timeout {drain_timeout}s)...[/info]"
+        )
+
+        # Cancel whatever is still running once the drain timeout elapses
+        done, _ = await asyncio.wait({fleet_task}, timeout=drain_timeout)
+        if not done:
+            console.log(
+                "[warning]Drain timeout reached, cancelling in-flight jobs.[/warning]"
+            )
+            fleet_task.cancel()
+            try:
+                await fleet_task
+            except asyncio.CancelledError:
+                pass
+    finally:
+        await asyncio.get_running_loop().run_in_executor(
+            None, shutdown_image_processing_pool, executor
+        )
+        console.log(f"[info]Standalone worker {os.getpid()} stopped.[/info]")
+
+
+# Entry point of every spawned standalone worker process
+def _run_worker_process(loadtest_mode_enabled: bool, concurrency: int) -> None:
+    asyncio.run(run_standalone_worker(loadtest_mode_enabled, concurrency=concurrency))
+
+
+# Command line entry point: python -m services.worker [--processes N] [--concurrency M]
+def main(argv: Optional[List[str]] = None) -> None:
+
+    parser = argparse.ArgumentParser(
+        description="Process crop jobs from the shared database without serving the API."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=WORKER_PROCESSES,
+        help="Number of worker processes to start on this node.",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=WORKER_CONCURRENCY,
+        help="Number of concurrent worker tasks in every process.",
+    )
+    args = parser.parse_args(argv)
+
+    # Only the database queue is shared between processes and replicas
+    if not isinstance(job_queue, DatabaseJobQueue):
+        console.log(
+            "[error]Standalone workers require JOB_QUEUE_BACKEND=database.[/error]"
+        )
+        raise SystemExit(1)
+
+    loadtest_mode_enabled = os.getenv("LOADTEST_MODE", "false").lower() == "true"
+
+    # Create the tables and requeue the jobs left behind by crashed workers
+    Base.metadata.create_all(bind=engine)
+    job_queue.recover()
+
+    if args.processes <= 1:
+        _run_worker_process(loadtest_mode_enabled, args.concurrency)
+        return
+
+    # Use "spawn" so every process gets its own DB connections and event loop
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=_run_worker_process,
+            args=(loadtest_mode_enabled, args.concurrency),
+            name=f"crop-worker-{index}",
+        )
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    # Forward SIGTERM/SIGINT so every process drains its in-flight jobs
+    def _forward_signal(signum, frame) -> None:
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, _forward_signal)
+    signal.signal(signal.SIGINT, _forward_signal)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
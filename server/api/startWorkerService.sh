@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+# This script starts standalone crop job workers without the API.
+
+# Start the workers, the API can then run with RUN_WORKER=false (or python main.py --no-worker)
+python -m services.worker --processes ${WORKER_PROCESSES:-1}